@@ -1,8 +1,7 @@
-from user_manager import UserManager, hash_password_and_salt
+from user_manager import UserManager
 from ip_manager import IPManager, IPRecord
 from email_manager import GmailManager
 from crypto_utils import CryptoUtils
-from time_utils import TimeStamp
 from typing import *
 import os
 
@@ -57,13 +56,10 @@ class AccessManager(CryptoUtils):
         if not (self.user_manager.user_exists(username)):
             return self.STATE_LOGIN_NO_USER
 
-        # retrieve hash and salt from user database
-        password_hash, password_salt = self.user_manager.fetch_password_and_salt(username)
-
-        # compare computed hash with target hash, and return status code
+        # verify password (upgrading outdated hashes), and return status code
         #   1. [ 0 ] <=> [ STATE_LOGIN_SUCCESS ]
         #   2. [ 1 ] <=> [ STATE_LOGIN_INVALID ]
-        return (hash_password_and_salt(password, password_salt) != password_hash) * 1
+        return (not self.user_manager.verify_password(username, password)) * 1
 
     def verify_user_privilege(self, login_username : str, search_username : str) -> bool:
 
@@ -72,28 +68,19 @@ class AccessManager(CryptoUtils):
 
     def __create_activation_object(self, username : str, password : str) -> Dict[ str, str ]:
 
-        # pack activation data into dictionary
+        # pack activation data into dictionary (expiry is embedded in the token)
         return {
             "username" : username,
-            "password" : password,
-            "datetime" : TimeStamp.time2string(TimeStamp.current_time())
+            "password" : password
         }
 
-    def __activation_object_expired(self, activation_object : Dict[ str, str ]) -> bool:
-
-        # obtain time difference since creation (in seconds)
-        timelapse = (TimeStamp.current_time() - TimeStamp.string2time(activation_object["datetime"])).total_seconds()
-
-        # whether timelapse exceeded expiration period
-        return (timelapse >= self.ACTIVATION_EXPIRE_TIME)
-
     def _send_activation_link(self, username : str, password : str) -> bool:
 
         # email subject
         subject = "Food-Fellow Account Activation"
 
         # pack activation data then encrypt it
-        success, activation_key = self._encrypt_data(self.__create_activation_object(username, password))
+        success, activation_key = self._encrypt_data(self.__create_activation_object(username, password), self.ACTIVATION_EXPIRE_TIME)
 
         # return (flag == False) if encryption failed
         if not (success):
@@ -126,17 +113,13 @@ class AccessManager(CryptoUtils):
 
     def activate_account(self, activation_key : str) -> int:
 
-        # decrypt activation key
+        # decrypt activation key (fails if past expiration time)
         success, activation_object = self._decrypt_data(activation_key)
 
-        # return STATE_ACTIVATE_FAILURE if decryption failed
+        # return STATE_ACTIVATE_FAILURE if decryption failed or key expired
         if not (success):
             return self.STATE_ACTIVATE_FAILURE 
 
-        # return STATE_ACTIVATE_FAILURE if past expiration time
-        if (self.__activation_object_expired(activation_object)):
-            return self.STATE_ACTIVATE_FAILURE
-
         # return STATE_ACTIVATE_ALREADY if user has already activated
         if (self.user_manager.user_exists(activation_object["username"])):
             return self.STATE_ACTIVATE_ALREADY
@@ -173,7 +156,7 @@ class AccessManager(CryptoUtils):
 
         return login_status
 
-    def trim_ip_history(self) -> None:
+    def trim_ip_history(self) -> int:
 
-        # remove old records
-        self.ip_manager._prune_memory()
\ No newline at end of file
+        # remove old records, returning number of removed records
+        return self.ip_manager._prune_memory()
\ No newline at end of file
@@ -0,0 +1,219 @@
+from pymongo.database import Database
+from pymongo import ASCENDING, UpdateOne, ReplaceOne
+from index_utils import IndexUtils
+from typing import *
+
+class AggregateManager(IndexUtils):
+
+    # aggregate collection name
+    _AGGREGATE_COLLECTION_NAME = "review-aggregates"
+
+    # aggregated review collection name
+    _REVIEW_COLLECTION_NAME = "reviews"
+
+    # rating fields with a histogram (ratings are bounded to 1 ~ 5)
+    _RATING_FIELDS = ( "food_rating", "service_rating", "recommend_rating" )
+
+    # indexes required by aggregate queries
+    #   Note: Restaurant-wide aggregates have "food_name" set to None.
+    _INDEXES = {
+        "collection" : [
+            ( [ ("restaurant_name", ASCENDING), ("food_name", ASCENDING) ], { "unique" : True } )
+        ]
+    }
+
+    def __init__(self, database : Database) -> None:
+
+        # Food-Fellow (MongoDB) database object
+        self.database = database
+
+        # collection containing one aggregate per restaurant and per (restaurant, food)
+        self.collection = getattr(self.database.db, self._AGGREGATE_COLLECTION_NAME)
+
+        # collection containing review information
+        self.reviews = getattr(self.database.db, self._REVIEW_COLLECTION_NAME)
+
+    @staticmethod
+    def _aggregate_keys(review : Dict[ str, Any ]) -> List[ Dict[ str, Any ] ]:
+
+        # every review counts towards its restaurant and its dish
+        return [
+            { "restaurant_name" : review["restaurant_name"], "food_name" : None                },
+            { "restaurant_name" : review["restaurant_name"], "food_name" : review["food_name"] }
+        ]
+
+    def _increments(self, review : Dict[ str, Any ], sign : int) -> Dict[ str, int ]:
+
+        increments = { "count" : sign, "food_price.sum" : sign * review["food_price"] }
+
+        for rating_field in self._RATING_FIELDS:
+            increments[f"{rating_field}.sum"] = sign * review[rating_field]
+            increments[f"{rating_field}.histogram.{review[rating_field]}"] = sign
+
+        return increments
+
+    def add_reviews(self, reviews : List[ Dict[ str, Any ] ]) -> None:
+
+        if (len(reviews) == 0):
+            return
+
+        # update both aggregates of every review in a single round trip
+        self.collection.bulk_write([
+            UpdateOne(
+                filter = aggregate_key,
+                update = {
+                    "$inc" : self._increments(review, 1),
+                    "$min" : { "food_price.min" : review["food_price"] },
+                    "$max" : { "food_price.max" : review["food_price"] }
+                },
+                upsert = True
+            ) for review in reviews for aggregate_key in self._aggregate_keys(review)
+        ], ordered = False)
+
+    def add_review(self, review : Dict[ str, Any ]) -> None:
+
+        self.add_reviews([ review ])
+
+    def remove_review(self, review : Dict[ str, Any ]) -> None:
+
+        aggregate_keys = self._aggregate_keys(review)
+
+        # undo the review's contribution in a single round trip
+        self.collection.bulk_write([
+            UpdateOne(filter = aggregate_key, update = { "$inc" : self._increments(review, -1) })
+                for aggregate_key in aggregate_keys
+        ], ordered = False)
+
+        for aggregate_key in aggregate_keys:
+
+            # drop aggregates without reviews
+            if (self.collection.delete_one({ **aggregate_key, "count" : { "$lte" : 0 } }).deleted_count > 0):
+                continue
+
+            aggregate = self.collection.find_one(aggregate_key, { "food_price" : 1 })
+
+            # extremes cannot be decremented, so recompute them if the removed review held one
+            if ((aggregate is not None) and (review["food_price"] in (aggregate["food_price"]["min"], aggregate["food_price"]["max"]))):
+
+                review_filter = { key : value for key, value in aggregate_key.items() if (value is not None) }
+
+                # computed by the server (the match is served by the restaurant index), so no price is transferred
+                for extremes in self.reviews.aggregate([
+                    { "$match" : review_filter },
+                    { "$group" : { "_id" : None, "min" : { "$min" : "$food_price" }, "max" : { "$max" : "$food_price" } } }
+                ]):
+                    self.collection.update_one(aggregate_key, { "$set" : { "food_price.min" : extremes["min"], "food_price.max" : extremes["max"] } })
+
+    def rebuild(self, batch_size : Optional[ int ] = 1000) -> int:
+
+        # (restaurant, food) => aggregate
+        aggregates = dict()
+
+        # stream reviews (only the aggregated fields)
+        reviews = self.reviews.find({}, {
+            "restaurant_name" : 1, "food_name" : 1, "food_price" : 1, **{ rating_field : 1 for rating_field in self._RATING_FIELDS }
+        }).batch_size(batch_size)
+
+        for review in reviews:
+
+            for aggregate_key in self._aggregate_keys(review):
+
+                aggregate = aggregates.setdefault((aggregate_key["restaurant_name"], aggregate_key["food_name"]), {
+                    **aggregate_key, "count" : 0,
+                    "food_price" : { "sum" : 0, "min" : review["food_price"], "max" : review["food_price"] },
+                    **{ rating_field : { "sum" : 0, "histogram" : dict() } for rating_field in self._RATING_FIELDS }
+                })
+
+                aggregate["count"] += 1
+
+                aggregate["food_price"]["sum"] += review["food_price"]
+                aggregate["food_price"]["min"] = min(aggregate["food_price"]["min"], review["food_price"])
+                aggregate["food_price"]["max"] = max(aggregate["food_price"]["max"], review["food_price"])
+
+                for rating_field in self._RATING_FIELDS:
+                    histogram = aggregate[rating_field]["histogram"]
+                    aggregate[rating_field]["sum"] += review[rating_field]
+                    histogram[str(review[rating_field])] = histogram.get(str(review[rating_field]), 0) + 1
+
+        # replace aggregates in bounded batches
+        replacements = [
+            ReplaceOne(
+                filter = { "restaurant_name" : aggregate["restaurant_name"], "food_name" : aggregate["food_name"] },
+                replacement = aggregate, upsert = True
+            ) for aggregate in aggregates.values()
+        ]
+
+        for batch_start in range(0, len(replacements), batch_size):
+            self.collection.bulk_write(replacements[batch_start:(batch_start + batch_size)], ordered = False)
+
+        # drop aggregates of restaurants and dishes without reviews
+        for stale_aggregate in self.collection.find({}, { "restaurant_name" : 1, "food_name" : 1 }):
+            if ((stale_aggregate["restaurant_name"], stale_aggregate["food_name"]) not in aggregates):
+                self.collection.delete_one({ "_id" : stale_aggregate["_id"] })
+
+        # return number of aggregates
+        return len(aggregates)
+
+    def rebuild_if_empty(self) -> bool:
+
+        # aggregates exist already, or there is nothing to aggregate
+        if ((self.collection.find_one({}, { "_id" : 1 }) is not None) or (self.reviews.find_one({}, { "_id" : 1 }) is None)):
+            return False
+
+        # reviews written before aggregates were introduced (kept up to date incrementally from then on)
+        self.rebuild()
+
+        return True
+
+    def named_counts(self) -> Iterator[ Tuple[ str, str, int ] ]:
+
+        # ("restaurant", restaurant, number of reviews) or ("food", food, number of reviews at one restaurant)
+        for aggregate in self.collection.find({}, { "_id" : 0, "restaurant_name" : 1, "food_name" : 1, "count" : 1 }):
+
+            if (aggregate["food_name"] is None):
+                yield ("restaurant", aggregate["restaurant_name"], aggregate["count"])
+
+            else:
+                yield ("food", aggregate["food_name"], aggregate["count"])
+
+    def fetch_aggregate(self, restaurant_name : str, food_name : Optional[ str ] = None) -> Optional[ Dict[ str, Any ] ]:
+
+        # single indexed lookup
+        aggregate = self.collection.find_one({ "restaurant_name" : restaurant_name, "food_name" : food_name }, { "_id" : 0 })
+
+        # no reviews yet
+        if (aggregate is None):
+            return None
+
+        # derive means from sums
+        aggregate["food_price"]["mean"] = aggregate["food_price"]["sum"] / aggregate["count"]
+
+        for rating_field in self._RATING_FIELDS:
+            aggregate[rating_field]["mean"] = aggregate[rating_field]["sum"] / aggregate["count"]
+
+        return aggregate
+
+if (__name__ == "__main__"):
+
+    # full rebuild (repair) of aggregates from the review collection
+    #   Note: Workers only rebuild on startup when no aggregate exists yet, so run this after restoring or editing reviews directly.
+    from pymongo import MongoClient
+    from types import SimpleNamespace
+    import argparse, sys
+
+    parser = argparse.ArgumentParser(description = "Rebuild restaurant and dish rating aggregates.")
+
+    parser.add_argument("--mongo-uri", default = "mongodb://localhost:27017/food-fellow")
+
+    arguments = parser.parse_args()
+
+    # managers access collections through "database.db" (as with Flask-PyMongo)
+    database = SimpleNamespace(db = MongoClient(arguments.mongo_uri).get_default_database())
+
+    aggregate_manager = AggregateManager(database)
+
+    aggregate_manager.ensure_indexes()
+
+    num_aggregates = aggregate_manager.rebuild()
+
+    print(f"done: rebuilt {num_aggregates} aggregate(s)", file = sys.stderr)
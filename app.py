@@ -1,45 +1,180 @@
-from flask import Flask, session, request, url_for, redirect, render_template
+from flask import Flask, Blueprint, Response, session, request, url_for, redirect, render_template
 from bson.objectid import ObjectId
 from flask_pymongo import PyMongo
-from flask_session import Session
 
 from report_manager import ReportManager
 from access_manager import AccessManager
-from review_manager import ReviewManager, ReviewCondition, Review
-from email_manager import GmailManager
+from review_manager import ReviewManager, ReviewCondition, ReviewPage, Review
+from email_manager import GmailManager, MongoOutbox
+from digest_manager import DigestManager
 from user_manager import UserManager
+from maintenance import MaintenanceScheduler
 from ip_manager import IPManager
+from response_utils import json_response
+from session_backends import create_session_interface, DeferredSessionInterface
+from service_registry import ServiceRegistry, EXTENSION_NAME, current_services, service_proxy
+from list_versions import ListVersions
 
-import json, os
+from typing import *
+import time, os
 
-app = Flask(__name__)
+# settings used unless overridden by "create_app"
+DEFAULT_CONFIG = {
+    "MONGO_URI"            : os.environ.get("MONGO_FOOD_FELLOW", "mongodb://localhost:27017/food-fellow"),
+    # signs session cookies (required, sessions are refused without it)
+    "SECRET_KEY"           : os.environ.get("SESSION_SECRET_KEY", None),
+    # session backend ("mongodb" shares sessions across hosts, "cookie" keeps them client-side, signed)
+    "SESSION_BACKEND"      : os.environ.get("FOOD_FELLOW_SESSION_BACKEND", "mongodb"),
+    # previous backend (e.g. "filesystem") whose sessions are moved on first use, so no one is logged out
+    #   Note: Every request without a current session also opens the previous backend, so set it only
+    #         for one PERMANENT_SESSION_LIFETIME after switching backends.
+    "SESSION_MIGRATE_FROM" : os.environ.get("FOOD_FELLOW_SESSION_MIGRATE_FROM", None),
+    "GMAIL_ACCOUNT"        : os.environ.get("FOOD_FELLOW_USR", "ndhusmartank@gmail.com"),
+    "GMAIL_PASSWORD"       : os.environ.get("FOOD_FELLOW_PWD", "elkperuybhrkqrvt"),
+    # create indexes required by manager queries when a worker starts
+    "ENSURE_INDEXES"       : True,
+    # run periodic background jobs (cleanup, digests, leaderboards) in every worker
+    "MAINTENANCE_ENABLED"  : True
+}
 
-app.config["MONGO_URI"] = "mongodb://localhost:27017/food-fellow"#os.environ["MONGO_FOOD_FELLOW"]
+# period (in seconds) between removals of expired IP records
+IP_HISTORY_TRIM_PERIOD = 600
 
-app.config["SESSION_TYPE"] = "filesystem"
+# period (in seconds) between checks for due recommendation digests
+DIGEST_FLUSH_PERIOD = 60
 
-app.config["SECRET_KEY"] = "super-duper-secret-key"#os.environ["SESSION_SECRET_KEY"]
+# period (in seconds) between reads of reviews changed by other workers (re-indexes only those for search and trending)
+CHANGE_REFRESH_PERIOD = 60
 
-Session(app)
+# period (in seconds) between full search index rebuilds (picks up writes bypassing the change journal, e.g. manual edits)
+SEARCH_REFRESH_PERIOD = 3600
 
-database = PyMongo(app)
+# period (in seconds) between full recomputes of trending leaderboards (restores reviews pushed off boards)
+TRENDING_REFRESH_PERIOD = 3600
 
-review_manager = ReviewManager(database)
+# period (in seconds) between rebuilds (and republishing) of the typeahead index
+TYPEAHEAD_REFRESH_PERIOD = 300
 
-ip_manager = IPManager(database)
+def ensure_indexes(services : ServiceRegistry, manager : Any) -> Any:
 
-gmail_manager = GmailManager("ndhusmartank@gmail.com", "elkperuybhrkqrvt")#(os.environ["FOOD_FELLOW_USR"], os.environ["FOOD_FELLOW_PWD"])
+    # create indexes required by manager queries
+    if (services.app.config["ENSURE_INDEXES"]):
+        manager.ensure_indexes()
 
-user_manager = UserManager(database, gmail_manager)
+    return manager
 
-access_manager = AccessManager(user_manager, gmail_manager, ip_manager)
+def build_review_manager(services : ServiceRegistry) -> ReviewManager:
 
-report_manager = ReportManager(review_manager, gmail_manager)
+    review_manager = ReviewManager(services.database)
+
+    ensure_indexes(services, review_manager.aggregate_manager)
+
+    ensure_indexes(services, review_manager.change_journal)
+
+    # existing reviews are not aggregated yet (e.g. first start after an upgrade), so neither are their names suggested
+    if (review_manager.aggregate_manager.rebuild_if_empty()):
+        review_manager.refresh_typeahead()
+
+    return ensure_indexes(services, review_manager)
+
+def build_user_manager(services : ServiceRegistry) -> UserManager:
+
+    user_manager = ensure_indexes(services, UserManager(services.database, services.gmail_manager, services.digest_manager))
+
+    # expire personal lists holding removed reviews
+    services.review_manager.removal_listeners.append(user_manager.review_removed)
+
+    return user_manager
+
+def build_maintenance_scheduler(services : ServiceRegistry) -> MaintenanceScheduler:
+
+    # runs periodic background jobs (cleanup, digests)
+    maintenance_scheduler = MaintenanceScheduler()
+
+    maintenance_scheduler.register("trim-ip-history",   services.access_manager.trim_ip_history,      IP_HISTORY_TRIM_PERIOD  )
+    maintenance_scheduler.register("flush-digests",     services.digest_manager.flush_due,            DIGEST_FLUSH_PERIOD     )
+    maintenance_scheduler.register("refresh-changes",   services.review_manager.refresh_changes,      CHANGE_REFRESH_PERIOD   )
+    maintenance_scheduler.register("refresh-search",    services.review_manager.refresh_search_index, SEARCH_REFRESH_PERIOD   )
+    maintenance_scheduler.register("refresh-trending",  services.review_manager.refresh_trending,     TRENDING_REFRESH_PERIOD )
+    maintenance_scheduler.register("refresh-typeahead", services.review_manager.refresh_typeahead,    TYPEAHEAD_REFRESH_PERIOD)
+
+    if (services.app.config["MAINTENANCE_ENABLED"]):
+        maintenance_scheduler.start()
+
+    return maintenance_scheduler
+
+# component name => builder, in warm-up order (each is built once per process, on first use)
+SERVICE_BUILDERS = {
+    # MongoDB client (connects on first query)
+    "database"              : lambda services : PyMongo(services.app),
+    "session_interface"     : lambda services : create_session_interface(services.app, services.database),
+    "review_manager"        : build_review_manager,
+    "ip_manager"            : lambda services : ensure_indexes(services, IPManager(services.database)),
+    # persistent queue of outgoing emails (drained by background workers)
+    "email_outbox"          : lambda services : ensure_indexes(services, MongoOutbox(getattr(services.database.db, "email-outbox"))),
+    "gmail_manager"         : lambda services : GmailManager(services.app.config["GMAIL_ACCOUNT"], services.app.config["GMAIL_PASSWORD"], services.email_outbox),
+    # coalesces recommendation notifications into digests
+    "digest_manager"        : lambda services : ensure_indexes(services, DigestManager(services.database, services.gmail_manager, services.review_manager.describe_reviews)),
+    "user_manager"          : build_user_manager,
+    "access_manager"        : lambda services : AccessManager(services.user_manager, services.gmail_manager, services.ip_manager),
+    "report_manager"        : lambda services : ReportManager(services.review_manager, services.gmail_manager),
+    "maintenance_scheduler" : build_maintenance_scheduler
+}
+
+# components of the application handling the current request
+review_manager = service_proxy("review_manager")
+
+user_manager   = service_proxy("user_manager")
+
+access_manager = service_proxy("access_manager")
+
+report_manager = service_proxy("report_manager")
+
+digest_manager = service_proxy("digest_manager")
+
+routes = Blueprint("food-fellow", __name__)
+
+def create_app(config : Optional[ Dict[ str, Any ] ] = None) -> Flask:
+
+    start_time = time.perf_counter()
+
+    app = Flask(__name__)
+
+    app.config.update(DEFAULT_CONFIG)
+
+    app.config.update(config or dict())
+
+    # nothing is connected or started here, so the app may be created before workers fork
+    services = app.extensions[EXTENSION_NAME] = ServiceRegistry(app, SERVICE_BUILDERS)
+
+    app.session_interface = DeferredSessionInterface(lambda : services.session_interface)
+
+    app.register_blueprint(routes)
+
+    services.app_elapsed = time.perf_counter() - start_time
+
+    return app
+
+@routes.before_app_request
+def begin_request() -> None:
+
+    # first request of a worker builds every component (and logs the startup report)
+    current_services().warm_up()
+
+    # start memoizing user documents for this request
+    user_manager.begin_request()
+
+@routes.teardown_app_request
+def end_request(_ : Optional[ BaseException ]) -> None:
+
+    # memoized user documents are not shared with other requests (nothing to clear if the build failed)
+    if ("user_manager" in current_services().components):
+        user_manager.end_request()
 
 def user_logged_in() -> bool:
     return (session.get("username", None) is not None)
 
-@app.route("/")
+@routes.route("/")
 def index():
     # ask the user to login if they have not
     if (session.get("username", None) is None):
@@ -55,7 +190,7 @@ LOGOUT_STATE_LOG_OUT = 1
 
 LOGOUT_RETURN_STATUS = "status"
 
-@app.route("/logout", methods = [ "POST", "GET" ])
+@routes.route("/logout", methods = [ "POST", "GET" ])
 def logout():
 
     response_message = { LOGOUT_RETURN_STATUS : LOGOUT_STRING_STATES[LOGOUT_STATE_SIGN_IN] }
@@ -69,9 +204,9 @@ def logout():
         response_message[LOGOUT_RETURN_STATUS] = LOGOUT_STRING_STATES[LOGOUT_STATE_LOG_OUT]
 
     if (request.method == "POST"):
-        return json.dumps(response_message)
+        return json_response(response_message)
 
-    return redirect(url_for("index"))
+    return redirect(url_for(".index"))
     
 LOGIN_STRING_STATES = ("already-logged-in", "login-success", "incorrect-password", "invalid-username", "access-denied", "internal-error")
 
@@ -89,7 +224,7 @@ LOGIN_STATE_ANOTHER = 5
 
 LOGIN_RETURN_STATUS = "status"
 
-@app.route("/login", methods = [ "POST" ])
+@routes.route("/login", methods = [ "POST" ])
 def login():
 
     # extract username
@@ -99,7 +234,7 @@ def login():
     password = request.get_json().get("password", "")
 
     if ((username == "") or (password == "")):
-        return json.dumps({  REGISTER_RETURN_STATUS : REGISTER_STRING_STATES[REGISTER_STATE_ANOTHER]  })
+        return json_response({  REGISTER_RETURN_STATUS : REGISTER_STRING_STATES[REGISTER_STATE_ANOTHER]  })
         
     # obtain the IP address
     ip_address = request.remote_addr
@@ -108,7 +243,7 @@ def login():
 
     # BRANCH 0 : user already logged in
     if (user_logged_in()):
-        return json.dumps(response_message)
+        return json_response(response_message)
 
     # authenticate user credentials
     login_status = access_manager.authenticate_login(username, password, ip_address)
@@ -137,7 +272,7 @@ def login():
     else:
         response_message[LOGIN_RETURN_STATUS] = LOGIN_STRING_STATES[LOGIN_STATE_ANOTHER]
 
-    return json.dumps(response_message)
+    return json_response(response_message)
 
 REGISTER_STRING_STATES = ("already-logged-in", "register-success", "already-registered", "register-failure", "internal-error")
 
@@ -153,7 +288,7 @@ REGISTER_STATE_ANOTHER = 4
 
 REGISTER_RETURN_STATUS = "status"
 
-@app.route("/register", methods = [ "POST" ])
+@routes.route("/register", methods = [ "POST" ])
 def register():
 
     # extract username
@@ -163,13 +298,13 @@ def register():
     password = request.get_json().get("password", "")
 
     if ((username == "") or (password == "")):
-        return json.dumps({  REGISTER_RETURN_STATUS : REGISTER_STRING_STATES[REGISTER_STATE_ANOTHER]  })
+        return json_response({  REGISTER_RETURN_STATUS : REGISTER_STRING_STATES[REGISTER_STATE_ANOTHER]  })
 
     response_message = {  REGISTER_RETURN_STATUS : REGISTER_STRING_STATES[REGISTER_STATE_SIGN_IN]  }
 
     # BRANCH 0 : user already logged in
     if (user_logged_in()):
-        return json.dumps(response_message)
+        return json_response(response_message)
     
     # register account
     register_status = access_manager.register_account(username, password)
@@ -190,7 +325,7 @@ def register():
     else:
         response_message[REGISTER_RETURN_STATUS] = REGISTER_STRING_STATES[REGISTER_STATE_ANOTHER]
 
-    return json.dumps(response_message)
+    return json_response(response_message)
 
 ACTIVATE_STRING_STATES = ("already-activated", "activation-success", "activation-failure", "internal-error")
 
@@ -204,7 +339,7 @@ ACTIVATE_STATE_ANOTHER = 3
 
 ACTIVATE_RETURN_STATUS = "status"
 
-@app.route("/activate", methods = [ "GET" ])
+@routes.route("/activate", methods = [ "GET" ])
 def activate():
 
     # fetch activation key from argument
@@ -214,7 +349,7 @@ def activate():
 
     # BRANCH 3 : no activation key is found
     if (activation_key is None):
-        return json.dumps(response_message)
+        return json_response(response_message)
 
     activate_status = access_manager.activate_account(activation_key)
 
@@ -230,7 +365,7 @@ def activate():
     elif (activate_status == access_manager.STATE_ACTIVATE_FAILURE):
         response_message[ACTIVATE_RETURN_STATUS] = ACTIVATE_STRING_STATES[ACTIVATE_STATE_FAILURE]
 
-    return json.dumps(response_message)
+    return json_response(response_message)
 
 UPVOTE_STRING_STATES = ("internal-error", "review-not-found", "not-logged-in", "upvote-success")
 
@@ -244,12 +379,12 @@ UPVOTE_STATE_SUCCESS = 3
 
 UPVOTE_RETURN_STATUS = "status"
 
-@app.route("/upvote", methods = [ "POST" ])
+@routes.route("/upvote", methods = [ "POST" ])
 def upvote():
 
     # BRANCH 2 : user not logged in
     if not (user_logged_in()):
-        return json.dumps({ UPVOTE_RETURN_STATUS : UPVOTE_STRING_STATES[UPVOTE_STATE_SIGN_IN] })
+        return json_response({ UPVOTE_RETURN_STATUS : UPVOTE_STRING_STATES[UPVOTE_STATE_SIGN_IN] })
     
     # fetch review ID
     review_id = request.json.get("review-id", None)
@@ -259,20 +394,20 @@ def upvote():
 
     # BRANCH 0 : review ID not provided
     if ((review_id is None) or (username is None)):
-        return json.dumps({ UPVOTE_RETURN_STATUS : UPVOTE_STRING_STATES[UPVOTE_STATE_ANOTHER] })
+        return json_response({ UPVOTE_RETURN_STATUS : UPVOTE_STRING_STATES[UPVOTE_STATE_ANOTHER] })
     
     # convert review ID to ObjectId
     review_id = ObjectId(review_id)
 
     # BRANCH 1 : target review does not exist
     if not (review_manager.review_exists(review_id)):
-        return json.dumps({ UPVOTE_RETURN_STATUS : UPVOTE_STRING_STATES[UPVOTE_STATE_NOEXIST] })
+        return json_response({ UPVOTE_RETURN_STATUS : UPVOTE_STRING_STATES[UPVOTE_STATE_NOEXIST] })
     
     # toggle upvote status
     upvote_state = review_manager.upvote_review(username, review_id)
 
     # BRANCH 3 : upvote (toggle) successful
-    return json.dumps({ UPVOTE_RETURN_STATUS : UPVOTE_STRING_STATES[UPVOTE_STATE_SUCCESS], "upvote-state" : upvote_state })
+    return json_response({ UPVOTE_RETURN_STATUS : UPVOTE_STRING_STATES[UPVOTE_STATE_SUCCESS], "upvote-state" : upvote_state })
 
 BOOKMARK_STRING_STATES = ("internal-error", "not-logged-in", "bookmark-success")
 
@@ -284,12 +419,12 @@ BOOKMARK_STATE_SUCCESS = 2
 
 BOOKMARK_RETURN_STATUS = "status"
 
-@app.route("/bookmark", methods = [ "POST" ])
+@routes.route("/bookmark", methods = [ "POST" ])
 def bookmark():
 
     # BRANCH 1 : user has not logged in
     if not (user_logged_in()):
-        return json.dumps({ BOOKMARK_RETURN_STATUS : BOOKMARK_STRING_STATES[BOOKMARK_STATE_SIGN_IN] })
+        return json_response({ BOOKMARK_RETURN_STATUS : BOOKMARK_STRING_STATES[BOOKMARK_STATE_SIGN_IN] })
 
     # fetch review ID
     review_id = request.json.get("review-id", "")
@@ -299,13 +434,13 @@ def bookmark():
 
     # BRANCH 0 : user not logged in or review not specified
     if ((review_id == "") or (username == "")):
-        return json.dumps({ BOOKMARK_RETURN_STATUS : BOOKMARK_STRING_STATES[BOOKMARK_STATE_ANOTHER] })
+        return json_response({ BOOKMARK_RETURN_STATUS : BOOKMARK_STRING_STATES[BOOKMARK_STATE_ANOTHER] })
 
     # bookmark review to user
     bookmark_state = user_manager.bookmark_to_user(username, ObjectId(review_id))
 
     # BRANCH 2 : bookmark successful
-    return json.dumps({ BOOKMARK_RETURN_STATUS : BOOKMARK_STRING_STATES[BOOKMARK_STATE_SUCCESS], "bookmark-state" : bookmark_state })
+    return json_response({ BOOKMARK_RETURN_STATUS : BOOKMARK_STRING_STATES[BOOKMARK_STATE_SUCCESS], "bookmark-state" : bookmark_state })
 
 RECOMMEND_STRING_STATES = ("not-logged-in", "internal-error", "recommend-success", "invalid-user")
 
@@ -319,12 +454,12 @@ RECOMMEND_STATE_NO_USER = 3
 
 RECOMMEND_RETURN_STATUS = "status"
 
-@app.route("/recommend", methods = [ "POST" ])
+@routes.route("/recommend", methods = [ "POST" ])
 def recommend():
 
     # BRANCH 0 : user has not logged in
     if not (user_logged_in()):
-        return json.dumps({ RECOMMEND_RETURN_STATUS : RECOMMEND_STRING_STATES[RECOMMEND_STATE_SIGN_IN] })
+        return json_response({ RECOMMEND_RETURN_STATUS : RECOMMEND_STRING_STATES[RECOMMEND_STATE_SIGN_IN] })
 
     # fetch recommender username
     recommender = session.get("username", "")
@@ -337,20 +472,20 @@ def recommend():
 
     # BRANCH 1 : any field not specified
     if ((recommender == "") or (username == "") or (review_id == "")):
-        return json.dumps({ RECOMMEND_RETURN_STATUS : RECOMMEND_STRING_STATES[RECOMMEND_STATE_ANOTHER] })
+        return json_response({ RECOMMEND_RETURN_STATUS : RECOMMEND_STRING_STATES[RECOMMEND_STATE_ANOTHER] })
 
     # convert review ID to ObjectId
     review_id = ObjectId(review_id)
 
     # BRANCH 3 : specified user does not exist
     if not (user_manager.user_exists(username)):
-        return json.dumps({ RECOMMEND_RETURN_STATUS : RECOMMEND_STRING_STATES[RECOMMEND_STATE_NO_USER]})
+        return json_response({ RECOMMEND_RETURN_STATUS : RECOMMEND_STRING_STATES[RECOMMEND_STATE_NO_USER]})
 
     # recommend to user
     recommend_state = user_manager.recommend_to_user(username, review_id, recommender)
 
     # BRANCH 2 : recommendation successful
-    return json.dumps({ RECOMMEND_RETURN_STATUS : RECOMMEND_STRING_STATES[RECOMMEND_STATE_SUCCESS], "recommend-state" : recommend_state })
+    return json_response({ RECOMMEND_RETURN_STATUS : RECOMMEND_STRING_STATES[RECOMMEND_STATE_SUCCESS], "recommend-state" : recommend_state })
 
 REPORT_STRING_STATES = ("not-logged-in", "internal-error", "report-failure", "report-success")
 
@@ -364,12 +499,12 @@ REPORT_STATE_SUCCESS = 3
 
 REPORT_RETURN_STATUS = "status"
 
-@app.route("/report", methods = [ "POST" ])
+@routes.route("/report", methods = [ "POST" ])
 def report():
 
     # BRANCH 0 : user not logged in
     if not (user_logged_in()):
-        return json.dumps({
+        return json_response({
             REPORT_RETURN_STATUS : REPORT_STRING_STATES[REPORT_STATE_SIGN_IN]
         })
     
@@ -381,7 +516,7 @@ def report():
 
     # BRANCH 1 : username or review ID unspecified
     if ((username == "") or (review_id == "")):
-        return json.dumps({
+        return json_response({
             REPORT_RETURN_STATUS : REPORT_STRING_STATES[REPORT_STATE_ANOTHER]
         })
 
@@ -390,12 +525,12 @@ def report():
 
     # BRANCH 3 : report successful
     if (report_status):
-        return json.dumps({
+        return json_response({
             REPORT_RETURN_STATUS : REPORT_STRING_STATES[REPORT_STATE_SUCCESS]
         })
 
     # BRANCH 2 : report failure
-    return json.dumps({
+    return json_response({
         REPORT_RETURN_STATUS : REPORT_STRING_STATES[REPORT_STATE_FAILURE]
     })
 
@@ -409,7 +544,7 @@ REMOVAL_STATE_FAILURE = 2
 
 REMOVAL_RETURN_STATUS = "status"
 
-@app.route("/remove", methods = [ "GET" ])
+@routes.route("/remove", methods = [ "GET" ])
 def remove():
 
     # extract removal key
@@ -417,7 +552,7 @@ def remove():
 
     # BRANCH 0 : removal key empty
     if (removal_key == ""):
-        return json.dumps({
+        return json_response({
             REMOVAL_RETURN_STATUS : REMOVAL_STRING_STATES[REMOVAL_STATE_ANOTHER]
         })
 
@@ -426,12 +561,12 @@ def remove():
 
     # BRANCH 1 : review removal was successful
     if (removal_status):
-        return json.dumps({
+        return json_response({
             REMOVAL_RETURN_STATUS : REMOVAL_STRING_STATES[REMOVAL_STATE_SUCCESS]
         })
 
     # BRANCH 2 : review removal failed
-    return json.dumps({
+    return json_response({
         REMOVAL_RETURN_STATUS : REMOVAL_STRING_STATES[REMOVAL_STATE_FAILURE]
     })
 
@@ -445,19 +580,19 @@ WRITE_STATE_SUCCESS = 2
 
 WRITE_RETURN_STATUS = "status"
 
-@app.route("/write", methods = [ "GET", "POST" ])
+@routes.route("/write", methods = [ "GET", "POST" ])
 def write():
 
     if (request.method == "GET"):
 
         if not (user_logged_in()):
-            return redirect(url_for("index"))
+            return redirect(url_for(".index"))
 
         return render_template("review.html")
 
     # BRANCH 0 : user not logged in
     if not (user_logged_in()):
-        return json.dumps({
+        return json_response({
             WRITE_RETURN_STATUS : WRITE_STRING_STATES[WRITE_STATE_SIGN_IN]
         })
 
@@ -485,108 +620,393 @@ def write():
     # extract hashtags
     hashtags = request.get_json().get("hashtags", [])
 
-    hashtags = list(filter("".__ne__, hashtags))
+    # validate fields and bound ratings
+    review = Review.from_fields(
+        food_name, restaurant_name, author_name, food_price, 
+        food_rating, service_rating, recommend_rating, hashtags
+    )
+
+    # BRANCH 1 : some fields were unspecified (empty) or not numeric
+    if (review is None):
+        return json_response({ WRITE_RETURN_STATUS : WRITE_STRING_STATES[WRITE_STATE_FILL_IN] })
+
+    # attempt to add review
+    review_manager.add_review(review)
 
-    # BRANCH 1 : some fields were unspecified (empty)
-    if any([
-        author_name == "", food_name == "", restaurant_name == "", food_price == "",
-        food_rating == "", service_rating == "", recommend_rating == ""
-    ]):
-        return json.dumps({ WRITE_RETURN_STATUS : WRITE_STRING_STATES[WRITE_STATE_FILL_IN] })
+    # BRANCH 2 : review successfully added
+    return json_response({ WRITE_RETURN_STATUS : WRITE_STRING_STATES[WRITE_STATE_SUCCESS] })
 
-    if not all([
-        food_price.isnumeric(), food_rating.isnumeric(), 
-        service_rating.isnumeric(), recommend_rating.isnumeric()
-    ]):
-        return json.dumps({ WRITE_RETURN_STATUS : WRITE_STRING_STATES[WRITE_STATE_FILL_IN] })
+def mark_review_states(username : str, review_page : Dict[ str, Any ]) -> Dict[ str, Any ]:
 
-    def bound_range(value):
-        return min(5, max(1, value))
+    review_ids = [ ObjectId(review["_id"]) for review in review_page["data"] ]
 
-    # attempt to add review
-    review_manager.add_review(Review(
-        food_name, restaurant_name, 
-        author_name, abs(int(food_price)), bound_range(int(food_rating)), 
-        bound_range(int(service_rating)), bound_range(int(recommend_rating)), hashtags)
+    # find upvoted and bookmarked reviews of this page (a single query each)
+    upvoted_ids, bookmarked_ids = (
+        review_manager.upvoted_reviews(username, review_ids), user_manager.bookmarked_reviews(username, review_ids)
     )
 
-    # BRANCH 2 : review successfully added
-    return json.dumps({ WRITE_RETURN_STATUS : WRITE_STRING_STATES[WRITE_STATE_SUCCESS] })
+    for review_id, review in zip(review_ids, review_page["data"]):
+        review["upvoted"   ] = (review_id in upvoted_ids   )
+        review["bookmarked"] = (review_id in bookmarked_ids)
+
+    return review_page
 
-@app.route("/bookmarked", methods = [ "POST" ])
+def page_arguments() -> Tuple[ Optional[ int ], Optional[ str ], bool ]:
+
+    # listing endpoints may be called without a body (or with query arguments, when conditional)
+    arguments = (request.get_json(silent = True) or request.args)
+
+    # page size (defaults to ReviewPage.DEFAULT_PAGE_SIZE)
+    page_size = arguments.get("page-size", None)
+
+    # cursor token returned as "next-cursor" by the previous page
+    cursor = arguments.get("cursor", None)
+
+    # whether to count all matching reviews
+    with_total = (str(arguments.get("with-total", False)).lower() in ("1", "true"))
+
+    if ((page_size is not None) and not (str(page_size).isnumeric())):
+        raise ValueError(f"Invalid page size: {repr(page_size)}")
+
+    return (((None) if (page_size is None) else (int(page_size))), cursor, with_total)
+
+def check_list_version(username : str, list_name : str) -> Tuple[ Optional[ Response ], str ]:
+
+    # tag of the requested page (only the version is read, no review is touched)
+    etag = ListVersions.etag(
+        username, list_name, user_manager.list_versions.fetch(username, list_name), { **request.args, **(request.get_json(silent = True) or dict()) }
+    )
+
+    # client already holds this page (conditional responses apply to safe methods only)
+    if ((request.method in ("GET", "HEAD")) and any(
+        tag.strip() in (etag, "*") for tag in request.headers.get("If-None-Match", "").split(",")
+    )):
+        return (tag_list_response(Response(status = 304), etag), etag)
+
+    return (None, etag)
+
+def tag_list_response(response : Response, etag : str) -> Response:
+
+    response.headers["ETag"] = etag
+
+    # pages belong to the logged-in user, so a cached page is only reused with the same session cookie
+    response.vary.add("Cookie")
+
+    # browsers keep the page but revalidate it on every load
+    response.headers["Cache-Control"] = "private, no-cache"
+
+    return response
+
+def filter_arguments() -> Optional[ ReviewCondition ]:
+
+    arguments = request.get_json()
+
+    # review condition described by the JSON body (None if invalid)
+    return ReviewCondition.from_fields(
+        arguments.get("food-name"),      arguments.get("restaurant-name"),  arguments.get("author-name"),
+        arguments.get("food-price-range"), arguments.get("food-rating"),    arguments.get("service-rating"),
+        arguments.get("recommend-rating"), arguments.get("hashtags")
+    )
+
+@routes.route("/bookmarked", methods = [ "GET", "POST" ])
 def bookmarked():
 
     if not (user_logged_in()):
-        return json.dumps({
+        return json_response({
             "status" : "not-logged-in"
         })
 
     username = session.get("username")
 
-    bookmarked_ids = user_manager.fetch_bookmarks(username)
+    # answer from the list version alone if unchanged
+    not_modified, etag = check_list_version(username, "bookmarked")
 
-    bookmarked_reviews = review_manager.fetch_reviews_by_ids(bookmarked_ids)
+    if (not_modified is not None):
+        return not_modified
 
-    return json.dumps({
-        "status" : "retrieve-success", "data" : bookmarked_reviews
-    })
+    try:
+
+        page_size, cursor, with_total = page_arguments()
+
+        # page through bookmarks newest first
+        bookmarked_ids, next_cursor = user_manager.fetch_bookmarks(username, ReviewPage.bound_page_size(page_size), cursor)
+
+        bookmarked_reviews = ReviewPage(
+            review_manager.fetch_reviews_in_order(bookmarked_ids, view = "card"), next_cursor,
+            ((user_manager.count_bookmarks(username)) if (with_total) else (None))
+        )
+
+    except (ValueError):
+        return json_response({
+            "status" : "invalid-page"
+        })
 
-@app.route("/written", methods = [ "POST" ])
+    return tag_list_response(json_response({
+        "status" : "retrieve-success", **mark_review_states(username, bookmarked_reviews)
+    }), etag)
+
+@routes.route("/written", methods = [ "GET", "POST" ])
 def written():
 
     if not (user_logged_in()):
-        return json.dumps({
+        return json_response({
             "status" : "not-logged-in"
         })
 
     username = session.get("username")
 
-    written_reviews = review_manager.fetch_reviews(ReviewCondition(author_name = username))
+    # answer from the list version alone if unchanged
+    not_modified, etag = check_list_version(username, "written")
 
-    return json.dumps({
-        "status" : "retrieve-success", "data" : written_reviews
-    })
+    if (not_modified is not None):
+        return not_modified
+
+    try:
+
+        page_size, cursor, with_total = page_arguments()
+
+        written_reviews = review_manager.fetch_reviews(ReviewCondition(author_name = username), page_size, cursor, with_total, view = "card")
 
-@app.route("/recommended", methods = [ "POST" ])
+    except (ValueError):
+        return json_response({
+            "status" : "invalid-page"
+        })
+
+    return tag_list_response(json_response({
+        "status" : "retrieve-success", **mark_review_states(username, written_reviews)
+    }), etag)
+
+@routes.route("/recommended", methods = [ "GET", "POST" ])
 def recommended():
 
     if not (user_logged_in()):
-        return json.dumps({
+        return json_response({
             "status" : "not-logged-in"
         })
 
     username = session.get("username")
 
-    recommended_ids = user_manager.fetch_recommendations(username)
+    # answer from the list version alone if unchanged
+    not_modified, etag = check_list_version(username, "recommended")
 
-    recommended_reviews = review_manager.fetch_reviews_by_ids(recommended_ids)
+    if (not_modified is not None):
+        return not_modified
 
-    return json.dumps({
-        "status" : "retrieve-success", "data" : recommended_reviews
-    })
+    try:
+
+        page_size, cursor, with_total = page_arguments()
+
+        recommended_ids = user_manager.fetch_recommendations(username)
+
+        recommended_reviews = review_manager.fetch_reviews_by_ids(recommended_ids, page_size, cursor, with_total, view = "card")
+
+    except (ValueError):
+        return json_response({
+            "status" : "invalid-page"
+        })
+
+    return tag_list_response(json_response({
+        "status" : "retrieve-success", **mark_review_states(username, recommended_reviews)
+    }), etag)
 
-@app.route("/search", methods = [ "POST" ])
+@routes.route("/search", methods = [ "POST" ])
 def search():
     if not (user_logged_in()):
-        return json.dumps({
+        return json_response({
             "status" : "user-not-logged-in"
         })
     
+    username = session.get("username")
+
     search_string = request.get_json().get("search-string", "")
 
     if (search_string == ""):
-        return json.dumps({
+        return json_response({
             "status" : "empty-search-string"
         })
 
-    found_reviews = review_manager._advanced_query(
-        { "$or" : [ { "author_name" : search_string }, { "food_name" : search_string }, { "restaurant_name" : search_string } ] }
-    )
+    try:
+
+        page_size, cursor, _ = page_arguments()
+
+        # rank reviews by relevance to search string
+        found_reviews = review_manager.search_reviews(search_string, page_size, cursor, view = "card")
+
+    except (ValueError):
+        return json_response({
+            "status" : "invalid-page"
+        })
+
+    return json_response({
+        "status" : "retrieve-success", **mark_review_states(username, found_reviews)
+    })
+
+@routes.route("/trending", methods = [ "POST" ])
+def trending():
+    if not (user_logged_in()):
+        return json_response({
+            "status" : "user-not-logged-in"
+        })
+
+    username = session.get("username")
+
+    arguments = request.get_json()
+
+    # site-wide leaderboard unless a restaurant or a hashtag is specified
+    restaurant_name, hashtag = arguments.get("restaurant-name") or None, arguments.get("hashtag") or None
+
+    # board names must be strings (e.g. a JSON list cannot name a leaderboard)
+    if not all(isinstance(board_name, str) for board_name in [ restaurant_name, hashtag ] if (board_name is not None)):
+        return json_response({
+            "status" : "trending-failure"
+        })
+
+    if ((restaurant_name is not None) and (hashtag is not None)):
+        return json_response({
+            "status" : "too-many-boards"
+        })
+
+    try:
+
+        page_size, cursor, _ = page_arguments()
+
+        # rank reviews by time-decayed upvotes
+        trending_reviews = review_manager.trending_reviews(restaurant_name, hashtag, page_size, cursor, view = "card")
+
+    except (ValueError):
+        return json_response({
+            "status" : "invalid-page"
+        })
+
+    return json_response({
+        "status" : "retrieve-success", **mark_review_states(username, trending_reviews)
+    })
+
+@routes.route("/filter", methods = [ "POST" ])
+def filter_reviews():
+    if not (user_logged_in()):
+        return json_response({
+            "status" : "user-not-logged-in"
+        })
+
+    username = session.get("username")
+
+    review_filter = filter_arguments()
+
+    if (review_filter is None):
+        return json_response({
+            "status" : "invalid-filter"
+        })
+
+    try:
+
+        page_size, cursor, with_total = page_arguments()
+
+        # reviews matching every specified condition (newest first)
+        filtered_reviews = review_manager.fetch_reviews(review_filter, page_size, cursor, with_total, view = "card")
+
+    except (ValueError):
+        return json_response({
+            "status" : "invalid-page"
+        })
 
-    return json.dumps({
-        "status" : "retrieve-success", "data" : found_reviews
+    return json_response({
+        "status" : "retrieve-success", **mark_review_states(username, filtered_reviews)
     })
 
+@routes.route("/facets", methods = [ "POST" ])
+def facets():
+    if not (user_logged_in()):
+        return json_response({
+            "status" : "user-not-logged-in"
+        })
+
+    username = session.get("username")
+
+    review_filter = filter_arguments()
+
+    if (review_filter is None):
+        return json_response({
+            "status" : "invalid-filter"
+        })
+
+    try:
+
+        page_size, cursor, _ = page_arguments()
+
+        # matching reviews with hashtag, price band and rating counts
+        filtered_reviews = review_manager.fetch_facets(review_filter, page_size, cursor, view = "card")
+
+    except (ValueError):
+        return json_response({
+            "status" : "invalid-page"
+        })
+
+    return json_response({
+        "status" : "retrieve-success", **mark_review_states(username, filtered_reviews)
+    })
+
+@routes.route("/autocomplete", methods = [ "POST" ])
+def autocomplete():
+    if not (user_logged_in()):
+        return json_response({
+            "status" : "user-not-logged-in"
+        })
+
+    arguments = request.get_json()
+
+    prefix, kind, limit = arguments.get("prefix", ""), arguments.get("kind") or None, arguments.get("limit", 10)
+
+    # prefix must be a string and limit a non-negative integer or digit string (booleans and floats are rejected)
+    if (not (isinstance(prefix, str)) or (kind not in (None, "restaurant", "food")) or not (
+        ((type(limit) is int) and (limit >= 0)) or (isinstance(limit, str) and limit.isdecimal())
+    )):
+        return json_response({
+            "status" : "autocomplete-failure"
+        })
+
+    # served from memory (no database query)
+    return json_response({
+        "status" : "retrieve-success", "suggestions" : review_manager.suggest_names(prefix, kind, min(int(limit), 20))
+    })
+
+@routes.route("/ratings", methods = [ "POST" ])
+def ratings():
+    if not (user_logged_in()):
+        return json_response({
+            "status" : "user-not-logged-in"
+        })
+
+    arguments = request.get_json()
+
+    restaurant_name, food_name = arguments.get("restaurant-name", ""), arguments.get("food-name") or None
+
+    # names must be strings (e.g. a JSON object would become a query operator)
+    if not (isinstance(restaurant_name, str) and ((food_name is None) or isinstance(food_name, str))):
+        return json_response({
+            "status" : "ratings-failure"
+        })
+
+    if (restaurant_name == ""):
+        return json_response({
+            "status" : "empty-restaurant-name"
+        })
+
+    # restaurant-wide ratings unless a food is specified
+    food_ratings = review_manager.fetch_ratings(restaurant_name, food_name)
+
+    if (food_ratings is None):
+        return json_response({
+            "status" : "no-ratings"
+        })
+
+    return json_response({
+        "status" : "retrieve-success", "ratings" : food_ratings
+    })
+
+# application served by "flask run" and WSGI servers pointed at "app:app"
+app = create_app()
+
 if (__name__ == "__main__"):
 
     app.run(debug = True)
\ No newline at end of file
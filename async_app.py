@@ -0,0 +1,289 @@
+from quart import Quart, Response, Request, session, request, redirect
+from quart.sessions import SessionInterface, SessionMixin
+from hypercorn.middleware import AsyncioWSGIMiddleware
+from pymongo import AsyncMongoClient
+
+from app import create_app, DEFAULT_CONFIG
+from app import LOGIN_STRING_STATES, LOGIN_STATE_ALREADY, LOGIN_STATE_SUCCESS, LOGIN_STATE_INVALID, LOGIN_STATE_NO_USER, LOGIN_STATE_BLOCKED, LOGIN_STATE_ANOTHER, LOGIN_RETURN_STATUS
+from app import REGISTER_STRING_STATES, REGISTER_STATE_SIGN_IN, REGISTER_STATE_SUCCESS, REGISTER_STATE_ALREADY, REGISTER_STATE_FAILURE, REGISTER_STATE_ANOTHER, REGISTER_RETURN_STATUS
+from app import ACTIVATE_STRING_STATES, ACTIVATE_STATE_ALREADY, ACTIVATE_STATE_SUCCESS, ACTIVATE_STATE_FAILURE, ACTIVATE_STATE_ANOTHER, ACTIVATE_RETURN_STATUS
+from app import LOGOUT_STRING_STATES, LOGOUT_STATE_SIGN_IN, LOGOUT_STATE_LOG_OUT, LOGOUT_RETURN_STATUS
+from async_managers import AsyncAccessManager
+from service_registry import ServiceRegistry, EXTENSION_NAME
+from response_utils import ResponseEncoder, encode_json
+
+from typing import *
+import asyncio
+
+class AsyncSessionInterface(SessionInterface):
+
+    def __init__(self, get_interface : Callable[ [], Any ]) -> None:
+
+        # returns the (synchronous) session interface of the current process, shared with the WSGI routes
+        self.get_interface = get_interface
+
+    async def open_session(self, app : Quart, request : Request) -> Optional[ SessionMixin ]:
+
+        # off the event loop (the MongoDB backend mostly answers from its front cache)
+        return await asyncio.to_thread(lambda : self.get_interface().open_session(app, request))
+
+    async def save_session(self, app : Quart, session : SessionMixin, response : Response) -> None:
+
+        await asyncio.to_thread(lambda : self.get_interface().save_session(app, session, response))
+
+class RouteDispatcher:
+
+    def __init__(self, asgi_app : Quart, wsgi_app : Callable[ ..., Any ]) -> None:
+
+        # application serving the natively asynchronous routes (and the server lifespan)
+        self.asgi_app = asgi_app
+
+        # application serving every other route
+        self.wsgi_app = wsgi_app
+
+        # runs the synchronous application in the event loop's thread pool
+        self.wsgi_middleware = AsyncioWSGIMiddleware(wsgi_app)
+
+        # paths answered by the asynchronous application
+        self.asgi_paths = { rule.rule for rule in asgi_app.url_map.iter_rules() }
+
+    async def __call__(self, scope : Dict[ str, Any ], receive : Callable[ ..., Any ], send : Callable[ ..., Any ]) -> None:
+
+        if ((scope["type"] == "http") and (scope["path"] not in self.asgi_paths)):
+            return await self.wsgi_middleware(scope, receive, send)
+
+        return await self.asgi_app(scope, receive, send)
+
+def json_response(payload : Dict[ str, Any ]) -> Response:
+
+    # status replies are below ResponseEncoder.MIN_COMPRESS_SIZE, so they are never compressed
+    response = Response(encode_json(payload), mimetype = ResponseEncoder.MIME_TYPE)
+
+    response.headers["Vary"] = "Accept-Encoding"
+
+    return response
+
+def build_async_database(services : ServiceRegistry) -> Any:
+
+    # async driver client (connects on first query, in the event loop using it)
+    return AsyncMongoClient(services.app.config["MONGO_URI"]).get_default_database()
+
+def create_async_app(config : Optional[ Dict[ str, Any ] ] = None) -> RouteDispatcher:
+
+    # synchronous application (serves every route not redefined below)
+    wsgi_app = create_app(config)
+
+    # components are shared by both applications (one registry per process)
+    services = wsgi_app.extensions[EXTENSION_NAME]
+
+    services.register("async_database",       build_async_database)
+    services.register("async_access_manager", lambda services : AsyncAccessManager(services.access_manager, services.async_database))
+
+    asgi_app = Quart(__name__, static_folder = None)
+
+    asgi_app.config.update(DEFAULT_CONFIG)
+
+    asgi_app.config.update(config or dict())
+
+    asgi_app.extensions[EXTENSION_NAME] = services
+
+    asgi_app.session_interface = AsyncSessionInterface(lambda : services.session_interface)
+
+    def user_logged_in() -> bool:
+        return (session.get("username", None) is not None)
+
+    @asgi_app.before_request
+    async def begin_request() -> None:
+
+        # first request of a worker builds every component (blocking work, so in a thread)
+        if not (services.is_warm()):
+            await asyncio.to_thread(services.warm_up)
+
+    @asgi_app.route("/logout", methods = [ "POST", "GET" ])
+    async def logout() -> Response:
+
+        response_message = { LOGOUT_RETURN_STATUS : LOGOUT_STRING_STATES[LOGOUT_STATE_SIGN_IN] }
+
+        if (user_logged_in()):
+
+            # log user out
+            del session["username"]
+
+            response_message[LOGOUT_RETURN_STATUS] = LOGOUT_STRING_STATES[LOGOUT_STATE_LOG_OUT]
+
+        if (request.method == "POST"):
+            return json_response(response_message)
+
+        # home page is served by the synchronous application
+        return redirect("/")
+
+    @asgi_app.route("/login", methods = [ "POST" ])
+    async def login() -> Response:
+
+        arguments = ((await request.get_json()) or dict())
+
+        username, password = arguments.get("username", ""), arguments.get("password", "")
+
+        if ((username == "") or (password == "")):
+            return json_response({ REGISTER_RETURN_STATUS : REGISTER_STRING_STATES[REGISTER_STATE_ANOTHER] })
+
+        response_message = { LOGIN_RETURN_STATUS : LOGIN_STRING_STATES[LOGIN_STATE_ALREADY] }
+
+        # BRANCH 0 : user already logged in
+        if (user_logged_in()):
+            return json_response(response_message)
+
+        login_status = await services.async_access_manager.authenticate_login(username, password, request.remote_addr)
+
+        access_manager = services.access_manager
+
+        # status codes map to the same strings as the synchronous route
+        login_states = {
+            access_manager.STATE_LOGIN_SUCCESS : LOGIN_STATE_SUCCESS,
+            access_manager.STATE_LOGIN_INVALID : LOGIN_STATE_INVALID,
+            access_manager.STATE_LOGIN_NO_USER : LOGIN_STATE_NO_USER,
+            access_manager.STATE_LOGIN_BLOCKED : LOGIN_STATE_BLOCKED
+        }
+
+        response_message[LOGIN_RETURN_STATUS] = LOGIN_STRING_STATES[login_states.get(login_status, LOGIN_STATE_ANOTHER)]
+
+        # log user in
+        if (login_status == access_manager.STATE_LOGIN_SUCCESS):
+            session["username"] = username
+
+        return json_response(response_message)
+
+    @asgi_app.route("/register", methods = [ "POST" ])
+    async def register() -> Response:
+
+        arguments = ((await request.get_json()) or dict())
+
+        username, password = arguments.get("username", ""), arguments.get("password", "")
+
+        if ((username == "") or (password == "")):
+            return json_response({ REGISTER_RETURN_STATUS : REGISTER_STRING_STATES[REGISTER_STATE_ANOTHER] })
+
+        # BRANCH 0 : user already logged in
+        if (user_logged_in()):
+            return json_response({ REGISTER_RETURN_STATUS : REGISTER_STRING_STATES[REGISTER_STATE_SIGN_IN] })
+
+        register_status = await services.async_access_manager.register_account(username, password)
+
+        access_manager = services.access_manager
+
+        register_states = {
+            access_manager.STATE_REGISTER_SUCCESS : REGISTER_STATE_SUCCESS,
+            access_manager.STATE_REGISTER_ALREADY : REGISTER_STATE_ALREADY,
+            access_manager.STATE_REGISTER_FAILURE : REGISTER_STATE_FAILURE
+        }
+
+        return json_response({ REGISTER_RETURN_STATUS : REGISTER_STRING_STATES[register_states.get(register_status, REGISTER_STATE_ANOTHER)] })
+
+    @asgi_app.route("/activate", methods = [ "GET" ])
+    async def activate() -> Response:
+
+        activation_key = request.args.get("key", None)
+
+        # BRANCH 3 : no activation key is found
+        if (activation_key is None):
+            return json_response({ ACTIVATE_RETURN_STATUS : ACTIVATE_STRING_STATES[ACTIVATE_STATE_ANOTHER] })
+
+        activate_status = await services.async_access_manager.activate_account(activation_key)
+
+        access_manager = services.access_manager
+
+        activate_states = {
+            access_manager.STATE_ACTIVATE_ALREADY : ACTIVATE_STATE_ALREADY,
+            access_manager.STATE_ACTIVATE_SUCCESS : ACTIVATE_STATE_SUCCESS,
+            access_manager.STATE_ACTIVATE_FAILURE : ACTIVATE_STATE_FAILURE
+        }
+
+        return json_response({ ACTIVATE_RETURN_STATUS : ACTIVATE_STRING_STATES[activate_states.get(activate_status, ACTIVATE_STATE_ANOTHER)] })
+
+    return RouteDispatcher(asgi_app, wsgi_app)
+
+# application served by ASGI servers pointed at "async_app:app" (e.g. hypercorn)
+app = create_async_app()
+
+if (__name__ == "__main__"):
+
+    # login throughput of the synchronous app (worker threads) and the asynchronous app (one event loop), side by side
+    #   Note: Unknown usernames keep password hashing (CPU-bound either way) out of the comparison.
+    from concurrent.futures import ThreadPoolExecutor
+    import argparse, threading, time, uuid
+
+    parser = argparse.ArgumentParser(description = "Compare login throughput of the WSGI and ASGI serving modes.")
+
+    parser.add_argument("--mongo-uri", default = "mongodb://localhost:27017/food-fellow-benchmark")
+
+    parser.add_argument("--num-requests", type = int, default = 2000)
+
+    parser.add_argument("--sync-threads", type = int, default = 16)
+
+    parser.add_argument("--concurrency", type = int, default = 64)
+
+    arguments = parser.parse_args()
+
+    config = { "MONGO_URI" : arguments.mongo_uri, "SECRET_KEY" : "benchmark", "MAINTENANCE_ENABLED" : False, "SESSION_BACKEND" : "cookie", "SESSION_MIGRATE_FROM" : None }
+
+    dispatcher = create_async_app(config)
+
+    def report(mode_name : str, latencies : List[ float ], elapsed : float) -> None:
+
+        latencies = sorted(latencies)
+
+        print(f"{mode_name:<34} | {len(latencies) / elapsed:8.1f} logins/s | p50 {latencies[len(latencies) // 2] * 1e3:7.2f} ms | p99 {latencies[int(len(latencies) * 0.99)] * 1e3:7.2f} ms")
+
+    def login_payload() -> Dict[ str, str ]:
+        return { "username" : f"{uuid.uuid4().hex}@example.com", "password" : "wrong" }
+
+    # synchronous app: one test client per worker thread
+    clients = threading.local()
+
+    def sync_login() -> float:
+
+        if not hasattr(clients, "client"):
+            clients.client = dispatcher.wsgi_app.test_client()
+
+        start_time = time.perf_counter()
+
+        assert (clients.client.post("/login", json = login_payload()).get_json(force = True)["status"] == "invalid-username")
+
+        return time.perf_counter() - start_time
+
+    # warm up (builds every component)
+    sync_login()
+
+    with ThreadPoolExecutor(arguments.sync_threads) as executor:
+
+        start_time = time.perf_counter()
+
+        latencies = list(executor.map(lambda _ : sync_login(), range(arguments.num_requests)))
+
+        report(f"wsgi ({arguments.sync_threads} threads)", latencies, time.perf_counter() - start_time)
+
+    async def run_async() -> None:
+
+        client, slots = dispatcher.asgi_app.test_client(), asyncio.Semaphore(arguments.concurrency)
+
+        async def async_login() -> float:
+
+            async with slots:
+
+                start_time = time.perf_counter()
+
+                response = await client.post("/login", json = login_payload())
+
+                assert ((await response.get_json())["status"] == "invalid-username")
+
+                return time.perf_counter() - start_time
+
+        await async_login()
+
+        start_time = time.perf_counter()
+
+        latencies = await asyncio.gather(*[ async_login() for _ in range(arguments.num_requests) ])
+
+        report(f"asgi (concurrency {arguments.concurrency})", list(latencies), time.perf_counter() - start_time)
+
+    asyncio.run(run_async())
@@ -0,0 +1,136 @@
+from pymongo.asynchronous.database import AsyncDatabase
+from access_manager import AccessManager
+from user_manager import User, UserManager
+from ip_manager import IPManager, IPRecord
+from password_hasher import hasher_for
+from typing import *
+import asyncio
+
+class AsyncAccessManager:
+
+    def __init__(self, access_manager : AccessManager, database : AsyncDatabase) -> None:
+
+        # synchronous access manager of this process (shares its user cache, password pool and failure counter)
+        self.access_manager = access_manager
+
+        self.user_manager = access_manager.user_manager
+
+        self.ip_manager = access_manager.ip_manager
+
+        # same collections as the synchronous managers, through the async driver
+        self.users      = database[UserManager._USER_COLLECTION_NAME]
+        self.blacklist  = database[IPManager._IP_COLLECTION_BLACKLIST_NAME]
+        self.ip_history = database[IPManager._IP_COLLECTION_NAME]
+
+    async def fetch_user(self, username : str) -> Optional[ Dict[ str, Any ] ]:
+
+        found, user_document = self.user_manager.cache.get(username)
+
+        if (found):
+            return user_document
+
+        user_document = await self.users.find_one({ "username" : username })
+
+        # missing users are not shared, since another worker may activate them
+        if (user_document is not None):
+            self.user_manager.cache.put(username, user_document)
+
+        return user_document
+
+    async def ip_blacklisted(self, ip_address : str) -> bool:
+
+        return (await self.blacklist.find_one({ "ip-address" : ip_address }, { "_id" : 1 }) is not None)
+
+    async def _run_pooled(self, function : Callable[ ..., Any ], *arguments : Any) -> Any:
+
+        # hash in the password pool without blocking the event loop (waiting for a slot included)
+        return await asyncio.to_thread(self.user_manager.password_pool.run, function, *arguments)
+
+    async def verify_password(self, username : str, password : str, user_document : Dict[ str, Any ]) -> bool:
+
+        # verify with the algorithm and parameters the hash was created with
+        if not (await self._run_pooled(hasher_for(user_document).verify, password, user_document)):
+            return False
+
+        # upgrade outdated hashes while the plain password is known
+        if (self.user_manager.password_hasher.needs_rehash(user_document)):
+
+            password_record = await self._run_pooled(self.user_manager.password_hasher.hash, password)
+
+            await self.users.update_one(filter = { "username" : username }, update = { "$set" : password_record })
+
+            self.user_manager.cache.invalidate(username)
+
+        return True
+
+    def _count_failure(self, ip_address : str) -> int:
+
+        # count failure in sliding window (the first count of an IP loads its history)
+        self.ip_manager.failure_counter.add_failure(ip_address)
+
+        return self.ip_manager.num_failures(ip_address)
+
+    async def authenticate_login(self, username : str, password : str, ip_address : str) -> int:
+
+        # blacklist check and user fetch are independent, so their round trips overlap
+        blacklisted, user_document = await asyncio.gather(self.ip_blacklisted(ip_address), self.fetch_user(username))
+
+        # reject authentication request for blacklisted IP addresses
+        if (blacklisted):
+            return self.access_manager.STATE_LOGIN_BLOCKED
+
+        if (user_document is None):
+            login_status = self.access_manager.STATE_LOGIN_NO_USER
+
+        else:
+            login_status = (not await self.verify_password(username, password, user_document)) * 1
+
+        # if login was unsuccessful
+        if (login_status != self.access_manager.STATE_LOGIN_SUCCESS):
+
+            # record failed login and count it (independent as well)
+            _, num_failures = await asyncio.gather(
+                self.ip_history.insert_one(IPRecord(ip_address, is_failure = True)), asyncio.to_thread(self._count_failure, ip_address)
+            )
+
+            # blacklist IP address if number of failures exceeded limit
+            if (num_failures >= self.access_manager.MAX_LOGIN_FAILURES):
+                await self.blacklist.update_one(
+                    filter = { "ip-address" : ip_address },
+                    update = { "$setOnInsert" : { "ip-address" : ip_address } },
+                    upsert = True
+                )
+
+        return login_status
+
+    async def register_account(self, username : str, password : str) -> int:
+
+        # check whether user has already registered
+        if (await self.fetch_user(username) is not None):
+            return self.access_manager.STATE_REGISTER_ALREADY
+
+        # encrypt and queue the activation link (delivered over SMTP by the mail workers, never on the request path)
+        if (await asyncio.to_thread(self.access_manager._send_activation_link, username, password)):
+            return self.access_manager.STATE_REGISTER_SUCCESS
+
+        return self.access_manager.STATE_REGISTER_FAILURE
+
+    async def activate_account(self, activation_key : str) -> int:
+
+        # decrypt activation key (fails if past expiration time)
+        success, activation_object = self.access_manager._decrypt_data(activation_key)
+
+        if not (success):
+            return self.access_manager.STATE_ACTIVATE_FAILURE
+
+        if (await self.fetch_user(activation_object["username"]) is not None):
+            return self.access_manager.STATE_ACTIVATE_ALREADY
+
+        # hash password in the password pool, then add user
+        password_record = await self._run_pooled(self.user_manager.password_hasher.hash, activation_object["password"])
+
+        await self.users.insert_one(User(activation_object["username"], password_record))
+
+        self.user_manager.cache.invalidate(activation_object["username"])
+
+        return self.access_manager.STATE_ACTIVATE_SUCCESS
@@ -0,0 +1,107 @@
+from collections import OrderedDict
+from typing import *
+import threading, time
+
+class LRUCache:
+
+    def __init__(self, max_size : int, time_to_live : float) -> None:
+
+        assert ((max_size > 0) and (time_to_live > 0))
+
+        # largest number of cached entries
+        self.max_size = max_size
+
+        # entries older than this period (in seconds) are refetched
+        self.time_to_live = time_to_live
+
+        # key => (expiry time, value), least recently used first
+        self.entries = OrderedDict()
+
+        # number of lookups answered from / missed by the cache
+        self.hits, self.misses = 0, 0
+
+        self.lock = threading.Lock()
+
+    def get(self, key : Hashable) -> Tuple[ bool, Any ]:
+
+        with self.lock:
+
+            entry = self.entries.get(key, None)
+
+            # missing or expired
+            if ((entry is None) or (entry[0] <= time.monotonic())):
+
+                self.misses += 1
+
+                if (entry is not None):
+                    del self.entries[key]
+
+                return (False, None)
+
+            self.hits += 1
+
+            # mark as most recently used
+            self.entries.move_to_end(key)
+
+            return (True, entry[1])
+
+    def put(self, key : Hashable, value : Any) -> None:
+
+        with self.lock:
+
+            self.entries[key] = (time.monotonic() + self.time_to_live, value)
+
+            self.entries.move_to_end(key)
+
+            # evict least recently used entries
+            while (len(self.entries) > self.max_size):
+                self.entries.popitem(last = False)
+
+    def invalidate(self, key : Hashable) -> None:
+
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def stats(self) -> Dict[ str, int ]:
+
+        with self.lock:
+            return { "hits" : self.hits, "misses" : self.misses, "size" : len(self.entries) }
+
+class RequestMemo:
+
+    def __init__(self) -> None:
+
+        # per-thread (i.e. per-request) dictionary, absent outside requests
+        self.local = threading.local()
+
+    def begin(self) -> None:
+
+        self.local.entries = dict()
+
+    def end(self) -> None:
+
+        self.local.entries = None
+
+    def get(self, key : Hashable) -> Tuple[ bool, Any ]:
+
+        entries = getattr(self.local, "entries", None)
+
+        # memo only lives during a request
+        if ((entries is None) or (key not in entries)):
+            return (False, None)
+
+        return (True, entries[key])
+
+    def put(self, key : Hashable, value : Any) -> None:
+
+        entries = getattr(self.local, "entries", None)
+
+        if (entries is not None):
+            entries[key] = value
+
+    def invalidate(self, key : Hashable) -> None:
+
+        entries = getattr(self.local, "entries", None)
+
+        if (entries is not None):
+            entries.pop(key, None)
@@ -0,0 +1,67 @@
+from pymongo.database import Database
+from pymongo import ASCENDING
+from bson.objectid import ObjectId
+from index_utils import IndexUtils
+from time_utils import TimeStamp
+from datetime import timedelta
+from typing import *
+
+class ChangeJournal(IndexUtils):
+
+    # journal collection name
+    _JOURNAL_COLLECTION_NAME = "review-changes"
+
+    # period (in seconds) entries are kept (a reader absent for longer must rebuild instead)
+    _TIME_TO_LIVE = 3600
+
+    # period (in seconds) every read overlaps the previous one
+    #   Note: Entry IDs carry the clock of the writing worker, and an entry may be committed after a
+    #         newer one, so reading only past the newest seen ID could skip it.
+    _READ_OVERLAP = 5
+
+    # indexes required by journal queries ("_id" serves the reads)
+    _INDEXES = {
+        "collection" : [
+            ( [ ("created-at", ASCENDING) ], { "expireAfterSeconds" : _TIME_TO_LIVE } )
+        ]
+    }
+
+    def __init__(self, database : Database) -> None:
+
+        # Food-Fellow (MongoDB) database object
+        self.database = database
+
+        # collection containing one entry per changed review (added, removed or upvoted)
+        self.collection = getattr(self.database.db, self._JOURNAL_COLLECTION_NAME)
+
+        # entries created from this time on are unread
+        #   Note: Set at construction, as the owner reads the whole collection right after.
+        self.read_from = self._next_read_from()
+
+    def _next_read_from(self) -> Any:
+
+        return TimeStamp.current_time() - timedelta(seconds = self._READ_OVERLAP)
+
+    def record(self, review_ids : Iterable[ ObjectId ]) -> None:
+
+        created_at = TimeStamp.current_time()
+
+        journal_entries = [ { "review-id" : review_id, "created-at" : created_at } for review_id in review_ids ]
+
+        if (len(journal_entries) > 0):
+            self.collection.insert_many(journal_entries, ordered = False)
+
+    def read_changes(self) -> Optional[ Set[ ObjectId ] ]:
+
+        read_from, self.read_from = self.read_from, self._next_read_from()
+
+        # entries since the last read may have expired already, so the caller must reread everything
+        if (TimeStamp.current_time() - read_from >= timedelta(seconds = self._TIME_TO_LIVE)):
+            return None
+
+        # IDs of reviews changed since the last read (the overlap is read twice, so readers must be idempotent)
+        return {
+            journal_entry["review-id"] for journal_entry in self.collection.find(
+                { "_id" : { "$gte" : ObjectId.from_datetime(read_from) } }, { "_id" : 0, "review-id" : 1 }
+            )
+        }
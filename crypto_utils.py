@@ -1,24 +1,143 @@
-from cryptography.fernet import Fernet 
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from typing import *
+import base64, logging, struct, json, time, os
+
+class TokenKeyring(object):
+
+    # environment variable listing keys, e.g. "2:<base64 key>,1:<base64 key>" (first one signs)
+    KEYS_VARIABLE = "FOOD_FELLOW_TOKEN_KEYS"
+
+    # environment variable naming the key file shared by processes on one host when the keys are not listed
+    KEYS_FILE_VARIABLE = "FOOD_FELLOW_TOKEN_KEYS_FILE"
+
+    # key file used when neither variable is set
+    #   Note: Kept outside the source directory, so deploys neither overwrite nor ship it.
+    KEYS_FILE = os.path.join(os.path.expanduser("~"), ".food-fellow", "token-keys")
+
+    # source directory (refused as a key file location)
+    SOURCE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+    # shared keyring of this process
+    _default = None
+
+    def __init__(self, keys : Dict[ int, bytes ], current_id : int) -> None:
+
+        assert (current_id in keys)
+
+        # key ID => 256-bit AES key
+        self.keys = keys
+
+        # ID of the key that encrypts new tokens (others only decrypt, for rotation)
+        self.current_id = current_id
+
+    @classmethod
+    def parse(class_, keys_string : str) -> "TokenKeyring":
+
+        keys, current_id = dict(), None
+
+        for entry in keys_string.replace("\n", ",").split(","):
+
+            if (entry.strip() == ""):
+                continue
+
+            key_id, encoded_key = entry.strip().split(":", 1)
+
+            keys[int(key_id)] = base64.urlsafe_b64decode(encoded_key)
+
+            # first listed key is the current one
+            if (current_id is None):
+                current_id = int(key_id)
+
+        return class_(keys, current_id)
+
+    @classmethod
+    def from_file(class_, file_path : str) -> "TokenKeyring":
+
+        file_path = os.path.abspath(file_path)
+
+        if (os.path.commonpath([ file_path, class_.SOURCE_DIRECTORY ]) == class_.SOURCE_DIRECTORY):
+            raise ValueError(f"Token key file inside the source directory: {repr(file_path)}")
+
+        # only the owner may list the keys
+        os.makedirs(os.path.dirname(file_path), mode = 0o700, exist_ok = True)
+
+        # create the key file once (exclusive creation is safe against concurrent workers)
+        try:
+
+            file_descriptor = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+
+            with os.fdopen(file_descriptor, "w") as file:
+                file.write("0:" + base64.urlsafe_b64encode(AESGCM.generate_key(bit_length = 256)).decode("ascii") + "\n")
+
+        # another process created it
+        except (FileExistsError):
+            pass
+
+        # a concurrent creator may still be writing
+        for _ in range(50):
+
+            with open(file_path, "r") as file:
+                keys_string = file.read()
+
+            if (keys_string.endswith("\n")):
+                return class_.parse(keys_string)
+
+            time.sleep(0.01)
+
+        raise ValueError(f"Incomplete token key file: {repr(file_path)}")
+
+    @classmethod
+    def default(class_) -> "TokenKeyring":
+
+        # load shared keys once per process
+        if (class_._default is None):
+
+            keys_string = os.environ.get(class_.KEYS_VARIABLE, "")
+
+            if (keys_string != ""):
+                class_._default = class_.parse(keys_string)
+
+            else:
+
+                file_path = os.environ.get(class_.KEYS_FILE_VARIABLE, class_.KEYS_FILE)
+
+                # keys are not shared beyond this host (tokens issued here fail elsewhere)
+                logging.getLogger(__name__).warning(f"{class_.KEYS_VARIABLE} is not set, using token keys of {file_path}")
+
+                class_._default = class_.from_file(file_path)
+
+        return class_._default
 
 class CryptoUtils(object):
 
-    def __init__(self) -> None:
+    # token format version
+    _TOKEN_VERSION = 1
+
+    # header: version (1 byte), key ID (1 byte), expiry in UNIX seconds (4 bytes)
+    _TOKEN_HEADER = struct.Struct(">BBI")
+
+    # AES-GCM nonce length (in bytes)
+    _NONCE_LENGTH = 12
 
-        # used to encrypt and decrypt data
-        self.crypt = Fernet(Fernet.generate_key())
+    # token lifetime (in seconds) when unspecified
+    TOKEN_TIME_TO_LIVE = 86400
+
+    def __init__(self, keyring : Optional[ TokenKeyring ] = None) -> None:
+
+        # keys shared by every worker, so tokens survive restarts and work on any process
+        self.keyring = ((TokenKeyring.default()) if (keyring is None) else (keyring))
 
     def __deco_crypt(crypt_function : Callable) -> Callable:
 
-        def __cryptography(self, data : Any) -> Tuple[ bool, Union[ Any, None ] ]:
+        def __cryptography(self, *arguments : Any) -> Tuple[ bool, Union[ Any, None ] ]:
 
             # either encrypt or decrypt
             try:
-                return (True, crypt_function(self, data))
+                return (True, crypt_function(self, *arguments))
 
             # allow keyboard interrupt
             except (KeyboardInterrupt):
-                raise 
+                raise
 
             # return (flag == False) on exception
             except (Exception):
@@ -27,13 +146,73 @@ class CryptoUtils(object):
         return __cryptography
 
     @__deco_crypt
-    def _encrypt_data(self, data : Any) -> str:
+    def _encrypt_data(self, data : Any, time_to_live : Optional[ int ] = None) -> str:
+
+        if (time_to_live is None):
+            time_to_live = self.TOKEN_TIME_TO_LIVE
+
+        # header is authenticated (not encrypted), so expiry can be checked before decryption
+        header = self._TOKEN_HEADER.pack(self._TOKEN_VERSION, self.keyring.current_id, int(time.time()) + time_to_live)
 
-        # stringify => binary encoding => encryption => string decoding
-        return self.crypt.encrypt(str(data).encode(encoding = "utf-8")).decode(encoding = "utf-8")
+        nonce = os.urandom(self._NONCE_LENGTH)
 
-    @__deco_crypt 
+        # compact JSON => binary encoding => encryption
+        ciphertext = AESGCM(self.keyring.keys[self.keyring.current_id]).encrypt(
+            nonce, json.dumps(data, separators = (",", ":")).encode("utf-8"), header
+        )
+
+        # URL-safe string without padding
+        return base64.urlsafe_b64encode(header + nonce + ciphertext).decode("ascii").rstrip("=")
+
+    @__deco_crypt
     def _decrypt_data(self, data : str) -> Any:
 
-        # binary encoding => decryption => string decoding 
-        return eval(self.crypt.decrypt(bytes(data, encoding = "utf-8")).decode(encoding = "utf-8"))
\ No newline at end of file
+        # restore padding, then string decoding
+        token = base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+        header = token[:self._TOKEN_HEADER.size]
+
+        version, key_id, expiry = self._TOKEN_HEADER.unpack(header)
+
+        # reject unknown formats and expired tokens without decrypting
+        if ((version != self._TOKEN_VERSION) or (expiry < time.time())):
+            raise ValueError("Token expired or unsupported")
+
+        nonce = token[self._TOKEN_HEADER.size:(self._TOKEN_HEADER.size + self._NONCE_LENGTH)]
+
+        # decryption (verifies integrity of header and payload) => JSON decoding
+        return json.loads(AESGCM(self.keyring.keys[key_id]).decrypt(
+            nonce, token[(self._TOKEN_HEADER.size + self._NONCE_LENGTH):], header
+        ))
+
+if (__name__ == "__main__"):
+
+    # microbenchmark against the previous Fernet + str/eval path
+    from cryptography.fernet import Fernet
+    import timeit
+
+    payload = { "username" : "someone@example.com", "password" : "correct horse battery staple", "datetime" : "20260101_120000" }
+
+    fernet = Fernet(Fernet.generate_key())
+
+    crypto_utils = CryptoUtils(TokenKeyring({ 0 : AESGCM.generate_key(bit_length = 256) }, 0))
+
+    legacy_token = fernet.encrypt(str(payload).encode("utf-8")).decode("utf-8")
+
+    _, token = crypto_utils._encrypt_data(payload, 600)
+
+    assert (crypto_utils._decrypt_data(token) == (True, payload))
+
+    NUM_RUNS = 20000
+
+    measurements = [
+        ("legacy encode", lambda : fernet.encrypt(str(payload).encode("utf-8")).decode("utf-8")),
+        ("legacy decode", lambda : eval(fernet.decrypt(bytes(legacy_token, encoding = "utf-8")).decode("utf-8"))),
+        ("token encode",  lambda : crypto_utils._encrypt_data(payload, 600)),
+        ("token decode",  lambda : crypto_utils._decrypt_data(token))
+    ]
+
+    for measurement_name, function in measurements:
+        print(f"{measurement_name:<14} | {timeit.timeit(function, number = NUM_RUNS) * 1e6 / NUM_RUNS:8.2f} us")
+
+    print(f"token length   | legacy {len(legacy_token)} characters | new {len(token)} characters")
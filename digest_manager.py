@@ -0,0 +1,118 @@
+from datetime import timedelta
+from time_utils import TimeStamp
+from email_manager import GmailManager
+from index_utils import IndexUtils
+from pymongo.database import Database
+from pymongo import ASCENDING, ReturnDocument
+from bson.objectid import ObjectId
+from typing import *
+
+class DigestManager(IndexUtils):
+
+    # pending digest collection name
+    _DIGEST_COLLECTION_NAME = "pending-digests"
+
+    # period (in seconds) recommendations are buffered before a digest is sent
+    DIGEST_WINDOW = 600
+
+    # number of buffered recommendations that triggers an early digest
+    DIGEST_THRESHOLD = 10
+
+    # indexes required by digest queries
+    _INDEXES = {
+        "collection" : [
+            ( [ ("username",   ASCENDING) ], { "unique" : True } ),
+            ( [ ("created-at", ASCENDING) ], {} )
+        ]
+    }
+
+    def __init__(self, database           : Database,
+                       gmail_manager      : GmailManager,
+                       review_describer   : Optional[ Callable[ [ List[ ObjectId ] ], Dict[ ObjectId, str ] ] ] = None,
+                       digest_window      : Optional[ int ] = None,
+                       digest_threshold   : Optional[ int ] = None) -> None:
+
+        # Food-Fellow (MongoDB) database object
+        self.database = database
+
+        # used to send digests
+        self.gmail_manager = gmail_manager
+
+        # maps review IDs to readable descriptions (IDs are listed if unspecified)
+        self.review_describer = review_describer
+
+        if (digest_window is not None):
+            self.DIGEST_WINDOW = digest_window
+
+        if (digest_threshold is not None):
+            self.DIGEST_THRESHOLD = digest_threshold
+
+        # collection containing one buffer of recommendations per recipient
+        self.collection = getattr(self.database.db, self._DIGEST_COLLECTION_NAME)
+
+    def add_recommendation(self, username : str, review_id : ObjectId, recommender : str) -> None:
+
+        # append recommendation to recipient's buffer (creating it if needed)
+        digest_document = self.collection.find_one_and_update(
+            filter          = { "username" : username },
+            update          = {
+                "$push"        : { "items" : { "review-id" : review_id, "recommender" : recommender } },
+                "$inc"         : { "count" : 1 },
+                "$setOnInsert" : { "created-at" : TimeStamp.current_time() }
+            },
+            projection      = { "count" : 1 },
+            upsert          = True,
+            return_document = ReturnDocument.AFTER
+        )
+
+        # send early if enough recommendations piled up
+        if (digest_document["count"] >= self.DIGEST_THRESHOLD):
+            self.flush_digest(username)
+
+    def _format_digest(self, items : List[ Dict[ str, Any ] ]) -> str:
+
+        review_ids = list(dict.fromkeys(item["review-id"] for item in items))
+
+        # describe each review once
+        descriptions = ((self.review_describer(review_ids)) if (self.review_describer is not None) else (dict()))
+
+        # review ID => recommenders (in order of recommendation)
+        recommenders = { review_id : [] for review_id in review_ids }
+
+        for item in items:
+            if (item["recommender"] not in recommenders[item["review-id"]]):
+                recommenders[item["review-id"]].append(item["recommender"])
+
+        lines = [ f"You have {len(items)} new recommendation(s) on Food-Fellow:", "" ]
+
+        for review_id in review_ids:
+            lines.append(f"- {descriptions.get(review_id, str(review_id))} (recommended by {', '.join(recommenders[review_id])})")
+
+        return "\n".join(lines)
+
+    def flush_digest(self, username : str) -> bool:
+
+        # atomically take the buffer so no other worker sends it too
+        digest_document = self.collection.find_one_and_delete({ "username" : username })
+
+        # nothing buffered (already sent)
+        if (digest_document is None):
+            return False
+
+        subject = "Food-Fellow: New Recommendations"
+
+        # queue a single email listing every buffered recommendation
+        return self.gmail_manager.send(username, subject, self._format_digest(digest_document["items"]))
+
+    def flush_due(self) -> int:
+
+        # buffers older than the digest window
+        cutoff = TimeStamp.current_time() - timedelta(seconds = self.DIGEST_WINDOW)
+
+        due_usernames = [
+            document["username"] for document in
+                self.collection.find({ "created-at" : { "$lte" : cutoff } }, { "_id" : 0, "username" : 1 })
+        ]
+
+        # return number of digests sent
+        return sum(self.flush_digest(username) for username in due_usernames)
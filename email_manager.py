@@ -1,16 +1,235 @@
-from email.mime.multipart import MIMEMultipart 
+from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
+from pymongo.collection import Collection
+from pymongo import ASCENDING, ReturnDocument
+from index_utils import IndexUtils
+from time_utils import TimeStamp
 from typing import *
-import smtplib
+import threading, smtplib, heapq, itertools, time
+
+class EmailMessage(dict):
+
+    def __init__(self, receiver : str, subject : str, body : str) -> None:
+
+        super(EmailMessage, self).__init__()
+
+        # pack message and delivery state into dictionary
+        self.update({
+            "receiver" : receiver,
+            "subject"  : subject,
+            "body"     : body,
+            "attempts" : 0,
+            "due"      : time.time(),
+            "error"    : None
+        })
+
+class MemoryOutbox:
+
+    def __init__(self) -> None:
+
+        # heap of (due time, sequence number, message)
+        self.heap = []
+
+        # breaks ties between messages due at the same time
+        self.sequence = itertools.count()
+
+        # messages that exhausted their retries
+        self.dead = []
+
+        # wakes up workers when messages arrive
+        self.condition = threading.Condition()
+
+    def put(self, message : Dict[ str, Any ]) -> None:
+
+        with self.condition:
+            heapq.heappush(self.heap, (message["due"], next(self.sequence), message))
+            self.condition.notify()
+
+    def claim(self, timeout : float) -> Optional[ Dict[ str, Any ] ]:
+
+        deadline = time.time() + timeout
+
+        with self.condition:
+
+            while (True):
+
+                current_time = time.time()
+
+                # hand out the earliest message that is due
+                if ((len(self.heap) > 0) and (self.heap[0][0] <= current_time)):
+                    return heapq.heappop(self.heap)[2]
+
+                if (current_time >= deadline):
+                    return None
+
+                # sleep until the earliest message is due, a message arrives or timeout
+                next_due = ((self.heap[0][0]) if (len(self.heap) > 0) else (deadline))
+
+                self.condition.wait(min(next_due, deadline) - current_time)
+
+    def complete(self, message : Dict[ str, Any ]) -> None:
+
+        # claimed messages are no longer stored
+        pass
+
+    def retry(self, message : Dict[ str, Any ]) -> None:
+
+        self.put(message)
+
+    def bury(self, message : Dict[ str, Any ]) -> None:
+
+        with self.condition:
+            self.dead.append(message)
+
+    def dead_letters(self) -> List[ Dict[ str, Any ] ]:
+
+        with self.condition:
+            return list(self.dead)
+
+    def __len__(self) -> int:
+
+        with self.condition:
+            return len(self.heap)
+
+class MongoOutbox(IndexUtils):
+
+    # period (in seconds) between polls of an empty outbox
+    _POLL_PERIOD = 0.5
+
+    # claimed messages are handed out again after this period (in seconds)
+    #   Note: This recovers messages of workers that died while sending.
+    _CLAIM_LEASE = 300
+
+    # dead messages are kept for inspection during this period (in seconds)
+    _DEAD_LETTER_TIME_TO_LIVE = 7 * 86400
+
+    # indexes required by outbox queries
+    #   Note: Sent messages are deleted, and MongoDB removes dead ones once "dead-at" is old enough.
+    _INDEXES = {
+        "collection" : [
+            ( [ ("status", ASCENDING), ("due", ASCENDING) ], {} ),
+            ( [ ("dead-at", ASCENDING) ], { "expireAfterSeconds" : _DEAD_LETTER_TIME_TO_LIVE } )
+        ]
+    }
+
+    def __init__(self, collection : Collection) -> None:
+
+        # collection containing queued and dead messages
+        self.collection = collection
+
+    def put(self, message : Dict[ str, Any ]) -> None:
+
+        self.collection.insert_one({ **message, "status" : "pending" })
+
+    def claim(self, timeout : float) -> Optional[ Dict[ str, Any ] ]:
+
+        deadline = time.time() + timeout
+
+        while (True):
+
+            current_time = time.time()
+
+            # atomically claim the earliest due message (or one whose lease expired)
+            message = self.collection.find_one_and_update(
+                filter          = { "status" : { "$in" : [ "pending", "sending" ] }, "due" : { "$lte" : current_time } },
+                update          = { "$set" : { "status" : "sending", "due" : current_time + self._CLAIM_LEASE } },
+                sort            = [ ("due", 1) ],
+                return_document = ReturnDocument.AFTER
+            )
+
+            if ((message is not None) or (current_time >= deadline)):
+                return message
+
+            time.sleep(min(self._POLL_PERIOD, deadline - current_time))
+
+    def complete(self, message : Dict[ str, Any ]) -> None:
+
+        self.collection.delete_one({ "_id" : message["_id"] })
+
+    def retry(self, message : Dict[ str, Any ]) -> None:
+
+        self.collection.update_one({ "_id" : message["_id"] }, { "$set" : {
+            "status" : "pending", "attempts" : message["attempts"], "due" : message["due"], "error" : message["error"]
+        } })
+
+    def bury(self, message : Dict[ str, Any ]) -> None:
+
+        self.collection.update_one({ "_id" : message["_id"] }, { "$set" : {
+            "status" : "dead", "attempts" : message["attempts"], "error" : message["error"], "dead-at" : TimeStamp.current_time()
+        } })
+
+    def dead_letters(self) -> List[ Dict[ str, Any ] ]:
+
+        return list(self.collection.find({ "status" : "dead" }))
+
+    def __len__(self) -> int:
+
+        return self.collection.count_documents({ "status" : { "$in" : [ "pending", "sending" ] } })
+
+class CircuitBreaker:
+
+    def __init__(self, failure_threshold : int, cooldown_period : float) -> None:
+
+        # consecutive failures that open the circuit
+        self.failure_threshold = failure_threshold
+
+        # period (in seconds) the circuit stays open
+        self.cooldown_period = cooldown_period
+
+        # number of consecutive failures
+        self.failures = 0
+
+        # time until which delivery is not attempted
+        self.open_until = 0.0
+
+        self.lock = threading.Lock()
+
+    def remaining(self) -> float:
+
+        # seconds until delivery may be attempted again (0 when closed)
+        with self.lock:
+            return max(0.0, self.open_until - time.time())
+
+    def record(self, success : bool) -> None:
+
+        with self.lock:
+
+            if (success):
+                self.failures = 0
+                return
+
+            self.failures += 1
+
+            # open (or re-open after a failed trial) the circuit
+            if (self.failures >= self.failure_threshold):
+                self.open_until = time.time() + self.cooldown_period
 
 class GmailManager:
 
-    @staticmethod 
-    def __init_mime_container(receiver   : str, 
-                              sender     : str, 
-                              subject    : str, 
+    # number of delivery attempts before a message is dead-lettered
+    MAX_ATTEMPTS = 5
+
+    # delay (in seconds) before the first retry, doubled on each further retry
+    RETRY_BASE_DELAY = 2.0
+
+    # longest delay (in seconds) between retries
+    RETRY_MAX_DELAY = 300.0
+
+    # consecutive delivery failures that stop all delivery for a while
+    BREAKER_THRESHOLD = 5
+
+    # period (in seconds) delivery stays stopped
+    BREAKER_COOLDOWN = 60.0
+
+    # idle connections are checked with NOOP after this period (in seconds)
+    IDLE_CHECK_PERIOD = 30.0
+
+    @staticmethod
+    def __init_mime_container(receiver   : str,
+                              sender     : str,
+                              subject    : str,
                               content    : str) -> MIMEMultipart:
-        
+
         container = MIMEMultipart()
         container["subject"] = subject
         container["from"   ] = sender
@@ -18,21 +237,175 @@ class GmailManager:
         container.attach(MIMEText(content))
         return container
 
-    def __init__(self, account : str, password : str) -> None:
+    def __init__(self, account     : str,
+                       password    : str,
+                       outbox      : Optional[ Union[ MemoryOutbox, MongoOutbox ] ] = None,
+                       num_workers : Optional[ int   ] = 2,
+                       host        : Optional[ str   ] = "smtp.gmail.com",
+                       port        : Optional[ int   ] = 587,
+                       use_tls     : Optional[ bool  ] = True,
+                       timeout     : Optional[ float ] = 10.0) -> None:
 
         assert isinstance(account, str)
-        
+
         assert isinstance(password, str)
 
         self.credentials = (account, password)
 
-    def send(self, receiver : str, subject : str, body : str) -> bool:
+        # SMTP relay address
+        self.address = (host, port)
+
+        # whether to upgrade connections with STARTTLS
+        self.use_tls = use_tls
+
+        # socket timeout (in seconds) of SMTP connections
+        self.timeout = timeout
+
+        # queue of messages waiting for delivery
+        self.outbox = ((MemoryOutbox()) if (outbox is None) else (outbox))
+
+        # stops delivery while the relay keeps failing
+        self.breaker = CircuitBreaker(self.BREAKER_THRESHOLD, self.BREAKER_COOLDOWN)
+
+        # per-worker SMTP connection and time of last use
+        self.connections = threading.local()
+
+        # signals workers to stop
+        self.stopped = threading.Event()
+
+        # workers draining the outbox
+        self.workers = [
+            threading.Thread(target = self._drain_outbox, daemon = True) for _ in range(num_workers)
+        ]
+
+        for worker in self.workers:
+            worker.start()
+
+    def _connect(self) -> smtplib.SMTP:
+
+        # open and authenticate a new connection
+        smtp = smtplib.SMTP(host = self.address[0], port = self.address[1], timeout = self.timeout)
+
+        try:
+            smtp.ehlo()
+            if (self.use_tls):
+                smtp.starttls()
+                smtp.ehlo()
+            smtp.login(*self.credentials)
 
-        print(receiver, type(receiver))
+        except (BaseException):
+            smtp.close()
+            raise
 
-        print(subject, type(subject))
+        return smtp
 
-        print(body, type(body))
+    def _disconnect(self) -> None:
+
+        smtp = getattr(self.connections, "smtp", None)
+
+        self.connections.smtp = None
+
+        if (smtp is not None):
+            try:
+                smtp.quit()
+            except (Exception):
+                smtp.close()
+
+    def _connection(self) -> smtplib.SMTP:
+
+        smtp = getattr(self.connections, "smtp", None)
+
+        # check idle connections, since relays drop them silently
+        if ((smtp is not None) and (time.time() - self.connections.last_used >= self.IDLE_CHECK_PERIOD)):
+            try:
+                if (smtp.noop()[0] != 250):
+                    self._disconnect()
+            except (Exception):
+                self._disconnect()
+
+        # reuse the worker's connection, reconnecting if needed
+        if (getattr(self.connections, "smtp", None) is None):
+            self.connections.smtp = self._connect()
+
+        self.connections.last_used = time.time()
+
+        return self.connections.smtp
+
+    def deliver(self, receiver : str, subject : str, body : str) -> bool:
+
+        try:
+
+            # send over the pooled connection
+            self._connection().send_message(self.__init_mime_container(
+                receiver, self.credentials[0], subject, body)
+            )
+
+        except (KeyboardInterrupt):
+
+            raise
+
+        except (Exception):
+
+            # drop the connection since its state is unknown
+            self._disconnect()
+
+            return False
+
+        return True
+
+    def _process(self, message : Dict[ str, Any ]) -> None:
+
+        # relay is failing: postpone without spending an attempt
+        cooldown = self.breaker.remaining()
+
+        if (cooldown > 0):
+            message["due"] = time.time() + cooldown
+            self.outbox.retry(message)
+            return
+
+        success = self.deliver(message["receiver"], message["subject"], message["body"])
+
+        self.breaker.record(success)
+
+        if (success):
+            self.outbox.complete(message)
+            return
+
+        message["attempts"] += 1
+
+        message["error"] = "delivery-failure"
+
+        # dead-letter messages that exhausted their retries
+        if (message["attempts"] >= self.MAX_ATTEMPTS):
+            self.outbox.bury(message)
+            return
+
+        # retry later with exponential backoff
+        message["due"] = time.time() + min(self.RETRY_MAX_DELAY, self.RETRY_BASE_DELAY * (2 ** (message["attempts"] - 1)))
+
+        self.outbox.retry(message)
+
+    def _drain_outbox(self) -> None:
+
+        while not (self.stopped.is_set()):
+
+            try:
+
+                message = self.outbox.claim(timeout = 1.0)
+
+                if (message is not None):
+                    self._process(message)
+
+            except (KeyboardInterrupt):
+                raise
+
+            # keep the worker alive (e.g. database briefly unreachable)
+            except (Exception):
+                time.sleep(1.0)
+
+        self._disconnect()
+
+    def send(self, receiver : str, subject : str, body : str) -> bool:
 
         assert isinstance(receiver, str)
 
@@ -40,23 +413,124 @@ class GmailManager:
 
         assert isinstance(body, str)
 
-        with smtplib.SMTP(host = "smtp.gmail.com", port = "587") as smtp:
+        try:
 
-            try:
+            # queue message for background delivery
+            self.outbox.put(EmailMessage(receiver, subject, body))
 
-                smtp.ehlo()
-                smtp.starttls()
-                smtp.login(*self.credentials)
-                smtp.send_message(self.__init_mime_container(
-                    receiver, self.credentials[0], subject, body)
-                )
+        except (KeyboardInterrupt):
 
-            except (KeyboardInterrupt):
+            raise
 
-                raise 
+        except (Exception):
 
-            except (Exception):
+            return False
+
+        return True
+
+    def stop(self) -> None:
+
+        # stop workers after their current message
+        self.stopped.set()
+
+        for worker in self.workers:
+            worker.join()
+
+if (__name__ == "__main__"):
+
+    # benchmark against a local SMTP stand-in
+    import socketserver
+
+    class SMTPStandIn(socketserver.StreamRequestHandler):
+
+        # number of messages received
+        received = 0
+
+        # artificial delay (in seconds) per command, emulating a remote relay
+        latency = 0.002
+
+        def reply(self, line : str) -> None:
+            time.sleep(self.latency)
+            self.wfile.write((line + "\r\n").encode("ascii"))
+
+        def handle(self) -> None:
+
+            self.reply("220 stand-in ready")
+
+            for line in self.rfile:
+
+                command = line.decode("utf-8", "replace").strip().upper()
+
+                if (command.startswith("EHLO")):
+                    self.wfile.write(b"250-stand-in\r\n250-AUTH PLAIN LOGIN\r\n")
+                    self.reply("250 OK")
+
+                elif (command.startswith("AUTH")):
+                    self.reply("235 authenticated")
+
+                elif (command == "DATA"):
+
+                    self.reply("354 end with <CRLF>.<CRLF>")
+
+                    for data_line in self.rfile:
+                        if (data_line in (b".\r\n", b".\n")):
+                            break
+
+                    SMTPStandIn.received += 1
+
+                    self.reply("250 queued")
+
+                elif (command == "QUIT"):
+                    self.reply("221 bye")
+                    return
+
+                else:
+                    self.reply("250 OK")
+
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), SMTPStandIn)
+
+    server.daemon_threads = True
+
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+
+    host, port = server.server_address
+
+    NUM_MESSAGES = 200
+
+    # previous approach: one connection, handshake and login per message, inside the request
+    legacy = GmailManager("sender@example.com", "password", num_workers = 0, host = host, port = port, use_tls = False)
+
+    start_time = time.perf_counter()
+
+    for index in range(NUM_MESSAGES):
+        with legacy._connect() as smtp:
+            smtp.send_message(GmailManager._GmailManager__init_mime_container(f"user{index}@example.com", "sender@example.com", "subject", "body"))
+
+    legacy_elapsed = time.perf_counter() - start_time
+
+    print(f"legacy      | request latency {legacy_elapsed * 1e3 / NUM_MESSAGES:8.3f} ms/message | throughput {NUM_MESSAGES / legacy_elapsed:8.1f} messages/s")
+
+    for num_workers in (1, 4):
+
+        SMTPStandIn.received = 0
+
+        pooled = GmailManager("sender@example.com", "password", num_workers = num_workers, host = host, port = port, use_tls = False)
+
+        start_time = time.perf_counter()
+
+        for index in range(NUM_MESSAGES):
+            pooled.send(f"user{index}@example.com", "subject", "body")
+
+        enqueue_elapsed = time.perf_counter() - start_time
+
+        # wait until the stand-in received everything
+        while (SMTPStandIn.received < NUM_MESSAGES):
+            time.sleep(0.001)
+
+        drain_elapsed = time.perf_counter() - start_time
+
+        pooled.stop()
 
-                return False 
+        print(f"{num_workers} worker(s) | request latency {enqueue_elapsed * 1e3 / NUM_MESSAGES:8.3f} ms/message | throughput {NUM_MESSAGES / drain_elapsed:8.1f} messages/s")
 
-            return True 
\ No newline at end of file
+    server.shutdown()
@@ -0,0 +1,309 @@
+from collections import deque
+from typing import *
+import threading, time
+
+class FailureCounter:
+
+    def __init__(self, window_period : int,
+                       bucket_period : Optional[ int ] = 60,
+                       loader        : Optional[ Callable[ [ List[ str ], int ], Dict[ str, Dict[ int, int ] ] ] ] = None,
+                       persister     : Optional[ Callable[ [ Dict[ Tuple[ str, int ], int ] ], None ] ] = None,
+                       flush_period  : Optional[ float ] = 1.0) -> None:
+
+        assert ((window_period > 0) and (bucket_period > 0))
+
+        # failures older than this period (in seconds) are not counted
+        self.window_period = window_period
+
+        # failures are counted in buckets of this period (in seconds)
+        self.bucket_period = bucket_period
+
+        # number of buckets covering the window
+        self.num_buckets = max(1, window_period // bucket_period)
+
+        # fetches persisted bucket counts of IPs since given bucket (IP => bucket => count, in one query)
+        self.loader = loader
+
+        # persists bucket count increments
+        self.persister = persister
+
+        # period (in seconds) between background flushes
+        self.flush_period = flush_period
+
+        # guards every structure below
+        self.lock = threading.Lock()
+
+        # IP => ring buffer of [ bucket, count ] (oldest first)
+        self.buckets = dict()
+
+        # IP => number of failures within window
+        self.totals = dict()
+
+        # (IP, bucket) => increment not yet persisted
+        self.pending = dict()
+
+        # background flushing thread
+        self.flusher = None
+
+        # signals background thread to stop
+        self.stopped = threading.Event()
+
+    def _current_bucket(self, now : Optional[ float ] = None) -> int:
+
+        return int(((time.time()) if (now is None) else (now)) // self.bucket_period)
+
+    def _expire(self, ip_address : str, current_bucket : int) -> None:
+
+        ring = self.buckets[ip_address]
+
+        # drop buckets that slid out of the window
+        while ((len(ring) > 0) and (ring[0][0] <= current_bucket - self.num_buckets)):
+            self.totals[ip_address] -= ring.popleft()[1]
+
+    def _fetch(self, ip_addresses : List[ str ], current_bucket : int) -> Dict[ str, Dict[ int, int ] ]:
+
+        # fetch counts persisted by previous runs or other workers
+        return (self.loader(ip_addresses, current_bucket - self.num_buckets + 1) if (self.loader is not None) else {})
+
+    def _load(self, ip_address : str, persisted : Dict[ int, int ]) -> None:
+
+        ring = deque()
+
+        for bucket in sorted(persisted):
+            ring.append([ bucket, persisted[bucket] ])
+
+        self.buckets[ip_address] = ring
+
+        self.totals[ip_address] = sum(persisted.values())
+
+    def _ensure_loaded(self, ip_address : str, current_bucket : int) -> None:
+
+        with self.lock:
+
+            if (ip_address in self.buckets):
+                return
+
+        # first time this IP is seen by this process => fetch without the lock (other IPs are not held up by the round trip)
+        persisted = self._fetch([ ip_address ], current_bucket).get(ip_address, {})
+
+        with self.lock:
+
+            # loaded by another thread meanwhile (its copy is kept, along with the failures counted since)
+            if (ip_address in self.buckets):
+                return
+
+            # add increments still queued (not persisted, so not fetched), e.g. of an IP forgotten by a flush
+            for bucket in range(current_bucket - self.num_buckets + 1, current_bucket + 1):
+                if ((ip_address, bucket) in self.pending):
+                    persisted[bucket] = persisted.get(bucket, 0) + self.pending[(ip_address, bucket)]
+
+            self._load(ip_address, persisted)
+
+    def add_failure(self, ip_address : str, now : Optional[ float ] = None) -> int:
+
+        current_bucket = self._current_bucket(now)
+
+        self._ensure_loaded(ip_address, current_bucket)
+
+        with self.lock:
+
+            # forgotten by a flush meanwhile (no failure within the window)
+            if (ip_address not in self.buckets):
+                self._load(ip_address, {})
+
+            self._expire(ip_address, current_bucket)
+
+            ring = self.buckets[ip_address]
+
+            # open a new bucket if the newest one is stale
+            if ((len(ring) == 0) or (ring[-1][0] != current_bucket)):
+                ring.append([ current_bucket, 0 ])
+
+            ring[-1][1] += 1
+
+            self.totals[ip_address] += 1
+
+            # queue increment for background persistence
+            self.pending[(ip_address, current_bucket)] = self.pending.get((ip_address, current_bucket), 0) + 1
+
+            # return number of failures within window
+            return self.totals[ip_address]
+
+    def count(self, ip_address : str, now : Optional[ float ] = None) -> int:
+
+        current_bucket = self._current_bucket(now)
+
+        self._ensure_loaded(ip_address, current_bucket)
+
+        with self.lock:
+
+            # forgotten by a flush meanwhile (no failure within the window)
+            if (ip_address not in self.buckets):
+                self._load(ip_address, {})
+
+            self._expire(ip_address, current_bucket)
+
+            # return number of failures within window
+            return self.totals[ip_address]
+
+    def flush(self, now : Optional[ float ] = None) -> int:
+
+        current_bucket = self._current_bucket(now)
+
+        with self.lock:
+
+            # swap out increments so request threads are not blocked by I/O
+            pending, self.pending = self.pending, dict()
+
+            # forget IPs without failures in the window (bounds memory)
+            for ip_address in list(self.buckets):
+
+                self._expire(ip_address, current_bucket)
+
+                if (self.totals[ip_address] == 0):
+                    del self.buckets[ip_address], self.totals[ip_address]
+
+        if ((len(pending) > 0) and (self.persister is not None)):
+
+            try:
+                self.persister(pending)
+
+            # allow keyboard interrupt
+            except (KeyboardInterrupt):
+                raise
+
+            # put increments back to retry on next flush
+            except (Exception):
+
+                with self.lock:
+                    for key, increment in pending.items():
+                        self.pending[key] = self.pending.get(key, 0) + increment
+
+                return 0
+
+            # IPs still tracked, whose counts other workers may have raised
+            with self.lock:
+                reloaded = { ip_address for ip_address, _ in pending if (ip_address in self.buckets) }
+
+            if ((len(reloaded) > 0) and (self.loader is not None)):
+
+                # reload all of them in a single query (outside the lock, so request threads are not blocked by I/O)
+                persisted = self._fetch(list(reloaded), current_bucket)
+
+                with self.lock:
+
+                    # keep increments queued after the swap (not persisted yet)
+                    for (ip_address, bucket), increment in self.pending.items():
+                        if (ip_address in reloaded):
+                            counts = persisted.setdefault(ip_address, {})
+                            counts[bucket] = counts.get(bucket, 0) + increment
+
+                    for ip_address in reloaded:
+
+                        # forgotten meanwhile => loaded again on next use
+                        if (ip_address in self.buckets):
+                            self._load(ip_address, persisted.get(ip_address, {}))
+
+        # return number of persisted bucket increments
+        return len(pending)
+
+    def _flush_forever(self) -> None:
+
+        # flush periodically until stopped
+        while not (self.stopped.wait(self.flush_period)):
+            self.flush()
+
+    def start(self) -> None:
+
+        # start background flushing once
+        if (self.flusher is None):
+            self.flusher = threading.Thread(target = self._flush_forever, daemon = True)
+            self.flusher.start()
+
+    def stop(self) -> None:
+
+        # stop background flushing and persist remaining increments
+        self.stopped.set()
+
+        if (self.flusher is not None):
+            self.flusher.join()
+
+        self.flush()
+
+if (__name__ == "__main__"):
+
+    # benchmark under simulated attack load: one IP failing repeatedly
+    from datetime import datetime, timezone
+
+    TIMESTAMP_FORMAT = "%Y%m%d_%H%M%S"
+
+    def legacy_num_failures(records : List[ str ]) -> int:
+
+        # previous approach: parse every stored timestamp on each failed attempt
+        current_time = datetime.strptime(datetime.now(timezone.utc).strftime(TIMESTAMP_FORMAT), TIMESTAMP_FORMAT)
+
+        return sum(
+            (current_time - datetime.strptime(record, TIMESTAMP_FORMAT)).total_seconds() <= 3600 for record in records
+        )
+
+    for num_attempts in (500, 1000, 2000):
+
+        records = []
+
+        start_time = time.perf_counter()
+
+        for _ in range(num_attempts):
+            records.append(datetime.now(timezone.utc).strftime(TIMESTAMP_FORMAT))
+            legacy_num_failures(records)
+
+        legacy_elapsed = time.perf_counter() - start_time
+
+        counter = FailureCounter(window_period = 3600)
+
+        start_time = time.perf_counter()
+
+        for attempt in range(num_attempts):
+            counter.add_failure("10.0.0.1")
+            counter.count("10.0.0.1")
+
+        counter_elapsed = time.perf_counter() - start_time
+
+        print(f"{num_attempts:>6} attempts | legacy {legacy_elapsed * 1e6 / num_attempts:10.1f} us/attempt "
+              f"| sliding window {counter_elapsed * 1e6 / num_attempts:6.2f} us/attempt")
+
+    # many distinct attacking IPs (credential stuffing through a botnet)
+    #   Note: The loader stands in for MongoDB, each query costing a simulated round trip.
+    ROUND_TRIP_PERIOD = 0.0002
+
+    num_queries = 0
+
+    def simulated_loader(ip_addresses : List[ str ], first_bucket : int) -> Dict[ str, Dict[ int, int ] ]:
+
+        global num_queries
+
+        num_queries += 1
+
+        time.sleep(ROUND_TRIP_PERIOD)
+
+        return {}
+
+    counter = FailureCounter(window_period = 3600, loader = simulated_loader, persister = lambda increments : None)
+
+    start_time = time.perf_counter()
+
+    for attempt in range(200000):
+        counter.add_failure(f"10.0.{(attempt % 20011) // 256}.{(attempt % 20011) % 256}")
+
+    counter_elapsed = time.perf_counter() - start_time
+
+    # queries made when each IP was first seen
+    num_first_queries, num_queries = num_queries, 0
+
+    start_time = time.perf_counter()
+
+    num_persisted = counter.flush()
+
+    flush_elapsed = time.perf_counter() - start_time
+
+    print(f"200000 attempts over {len(counter.buckets)} IPs ({num_first_queries} first-use queries) | {counter_elapsed * 1e6 / 200000:.2f} us/attempt "
+          f"| flush of {num_persisted} bucket increments {flush_elapsed * 1e3:.1f} ms ({num_queries} reload queries)")
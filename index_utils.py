@@ -0,0 +1,116 @@
+from pymongo.collection import Collection
+from typing import *
+
+class IndexUtils(object):
+
+    # indexes required by the queries of each manager
+    #   { collection attribute : [ ( [ (field, direction), ... ], { option : value } ), ... ] }
+    _INDEXES = dict()
+
+    @staticmethod
+    def _index_name(index_keys : List[ Tuple[ str, int ] ]) -> str:
+
+        # follow MongoDB default naming, e.g. "username_1" or "username_1_review-id_1"
+        return "_".join(f"{field_name}_{direction}" for field_name, direction in index_keys)
+
+    def _declared_indexes(self) -> Iterator[ Tuple[ Collection, List[ Tuple[ str, int ] ], Dict[ str, Any ] ] ]:
+
+        for collection_attribute, index_specs in self._INDEXES.items():
+
+            for index_keys, index_options in index_specs:
+
+                yield (getattr(self, collection_attribute), index_keys, index_options)
+
+    def ensure_indexes(self) -> List[ str ]:
+
+        created_indexes = []
+
+        for collection, index_keys, index_options in self._declared_indexes():
+
+            # no-op if an identical index already exists
+            created_indexes.append(collection.name + "." + collection.create_index(
+                index_keys, name = self._index_name(index_keys), **index_options
+            ))
+
+        return created_indexes
+
+    def index_report(self) -> Dict[ str, List[ str ] ]:
+
+        report = { "missing" : [], "unused" : [], "undeclared" : [] }
+
+        # collection name => declared index names
+        declared = dict()
+
+        for collection, index_keys, _ in self._declared_indexes():
+            declared.setdefault(collection.name, (collection, set()))[1].add(self._index_name(index_keys))
+
+        for collection_name, (collection, declared_names) in declared.items():
+
+            existing_names = set(collection.index_information())
+
+            # declared but not created
+            report["missing"].extend(
+                f"{collection_name}.{index_name}" for index_name in sorted(declared_names - existing_names)
+            )
+
+            # created but not declared by any manager (default "_id" index excluded)
+            report["undeclared"].extend(
+                f"{collection_name}.{index_name}" for index_name in sorted(existing_names - declared_names - { "_id_" })
+            )
+
+            # existing indexes that have not served a single operation since server start
+            for index_stats in collection.aggregate([ { "$indexStats" : {} } ]):
+
+                if ((index_stats["name"] != "_id_") and (index_stats["accesses"]["ops"] == 0)):
+                    report["unused"].append(f"{collection_name}.{index_stats['name']}")
+
+        return report
+
+if (__name__ == "__main__"):
+
+    # report declared indexes that are missing, unused since server start, or left over from older versions
+    #   Note: Usage counts come from "$indexStats" of the connected server, so run this against every replica set member worth checking.
+    from review_manager import ReviewManager
+    from user_manager import UserManager
+    from digest_manager import DigestManager
+    from ip_manager import IPManager
+    from email_manager import MongoOutbox
+    from session_backends import MongoSessionInterface
+    from pymongo import MongoClient
+    from types import SimpleNamespace
+    import argparse, json, sys
+
+    parser = argparse.ArgumentParser(description = "Report missing, unused and undeclared MongoDB indexes.")
+
+    parser.add_argument("--mongo-uri", default = "mongodb://localhost:27017/food-fellow")
+
+    arguments = parser.parse_args()
+
+    # managers access collections through "database.db" (as with Flask-PyMongo)
+    database = SimpleNamespace(db = MongoClient(arguments.mongo_uri).get_default_database())
+
+    print("loading managers...", file = sys.stderr)
+
+    # every manager declaring indexes (no email is sent, so no mail account is needed)
+    review_manager = ReviewManager(database)
+
+    digest_manager = DigestManager(database, None)
+
+    managers = [
+        review_manager, review_manager.aggregate_manager, review_manager.change_journal, digest_manager,
+        UserManager(database, None, digest_manager), IPManager(database),
+        MongoOutbox(getattr(database.db, "email-outbox")),
+        MongoSessionInterface(getattr(database.db, MongoSessionInterface._SESSION_COLLECTION_NAME))
+    ]
+
+    report = { "missing" : [], "unused" : [], "undeclared" : [] }
+
+    for manager in managers:
+
+        for category, index_names in manager.index_report().items():
+            report[category].extend(index_names)
+
+    print(json.dumps(report, indent = 4))
+
+    # missing indexes turn queries into collection scans
+    sys.exit((1) if (report["missing"]) else (0))
@@ -1,17 +1,21 @@
+from failure_counter import FailureCounter
 from pymongo.database import Database
-from bson.objectid import ObjectId
+from index_utils import IndexUtils
+from datetime import datetime, timedelta
+from pymongo import ASCENDING, UpdateOne
 from time_utils import TimeStamp
 from typing import *
 
 class IPRecord(dict):
 
-    def __init__(self, ip_address : str, is_failure : bool, timestamp : Optional[ str ] = None) -> None:
+    def __init__(self, ip_address : str, is_failure : bool, timestamp : Optional[ datetime ] = None) -> None:
 
         super(IPRecord, self).__init__()
 
         # set timestamp to current time if unspecified
+        #   Note: Stored as a BSON date so the TTL index can expire the record.
         if (timestamp is None):
-            timestamp = TimeStamp.time2string(TimeStamp.current_time())
+            timestamp = TimeStamp.current_time()
 
         # pack record data into dictionary
         self.update({
@@ -20,7 +24,7 @@ class IPRecord(dict):
             "timestamp"  : timestamp
         })
 
-class IPManager:
+class IPManager(IndexUtils):
 
     # IP record collection name
     _IP_COLLECTION_NAME = "ip-history"
@@ -28,9 +32,35 @@ class IPManager:
     # IP blacklist collection name
     _IP_COLLECTION_BLACKLIST_NAME = "ip-blacklist"
 
+    # IP failure counter collection name
+    _IP_COLLECTION_COUNTER_NAME = "ip-failure-counts"
+
+    # failures are counted in buckets of this period (in seconds)
+    _FAILURE_BUCKET_PERIOD = 60
+
+    # period (in seconds) between failure counter flushes
+    _FAILURE_FLUSH_PERIOD = 1.0
+
+    # largest number of records removed by a single deletion
+    _PRUNE_BATCH_SIZE = 1000
+
     # backtrace period (in seconds)
     _FAILURE_BACKTRACE_PERIOD = 3600
 
+    # indexes required by IP queries
+    _INDEXES = {
+        "collection" : [
+            ( [ ("timestamp", ASCENDING) ], { "expireAfterSeconds" : _FAILURE_BACKTRACE_PERIOD } )
+        ],
+        "blacklist" : [
+            ( [ ("ip-address", ASCENDING) ], { "unique" : True } )
+        ],
+        "counters" : [
+            ( [ ("ip-address", ASCENDING), ("bucket", ASCENDING) ], { "unique" : True } ),
+            ( [ ("created-at", ASCENDING) ], { "expireAfterSeconds" : _FAILURE_BACKTRACE_PERIOD + _FAILURE_BUCKET_PERIOD } )
+        ]
+    }
+
     def __init__(self, database : Database) -> None:
 
         # Food-Fellow (MongoDB) database object
@@ -44,74 +74,97 @@ class IPManager:
         #self.blacklist = self.database[self._IP_COLLECTION_BLACKLIST_NAME]
         self.blacklist = getattr(self.database.db, self._IP_COLLECTION_BLACKLIST_NAME)
 
-    def ip_blacklisted(self, ip_address : str) -> bool:
-
-        # whether specified IP address is blacklisted
-        return (self.blacklist.find_one({ "ip-address" : ip_address }) is not None)
-
-    def blacklist_ip(self, ip_address : str) -> None:
+        # collection containing failure counts per (IP, bucket)
+        self.counters = getattr(self.database.db, self._IP_COLLECTION_COUNTER_NAME)
 
-        # blacklist specified IP address
-        self.blacklist.insert_one(document = { "ip-address" : ip_address })
+        # in-memory sliding window of recent failures (persisted in background)
+        self.failure_counter = FailureCounter(
+            window_period = self._FAILURE_BACKTRACE_PERIOD,
+            bucket_period = self._FAILURE_BUCKET_PERIOD,
+            loader        = self._load_failure_counts,
+            persister     = self._persist_failure_counts,
+            flush_period  = self._FAILURE_FLUSH_PERIOD
+        )
 
-    def add_record(self, ip_record : IPRecord) -> None:
+        self.failure_counter.start()
 
-        assert isinstance(ip_record, IPRecord)
+    def _load_failure_counts(self, ip_addresses : List[ str ], first_bucket : int) -> Dict[ str, Dict[ int, int ] ]:
 
-        # insert new record
-        self.collection.insert_one(ip_record)
+        failure_counts = dict()
 
-    def __recent_filter(self, before_not_after : Optional[ bool ] = True) -> Dict[ str, Any ]:
+        # fetch failure counts of recent buckets (recorded by any worker) of every IP in one query
+        for document in self.counters.find(
+            { "ip-address" : { "$in" : ip_addresses }, "bucket" : { "$gte" : first_bucket } }, { "_id" : 0, "ip-address" : 1, "bucket" : 1, "count" : 1 }
+        ):
+            failure_counts.setdefault(document["ip-address"], dict())[document["bucket"]] = document["count"]
 
-        # obtain current time
-        current_time = TimeStamp.current_time()
+        return failure_counts
 
-        # specify whether new or old records
-        comparison_function = ((lambda a, b : a <= b) 
-            if (before_not_after) else (lambda a, b : a >= b)
-        )
+    def _persist_failure_counts(self, increments : Dict[ Tuple[ str, int ], int ]) -> None:
 
-        def verify_recent(document : Dict[ str, Any ]) -> bool:
+        # add increments to persisted counts in a single round trip
+        self.counters.bulk_write([
+            UpdateOne(
+                filter = { "ip-address" : ip_address, "bucket" : bucket },
+                update = { "$inc" : { "count" : increment }, "$setOnInsert" : { "created-at" : TimeStamp.current_time() } },
+                upsert = True
+            ) for (ip_address, bucket), increment in increments.items()
+        ], ordered = False)
 
-            nonlocal current_time, comparison_function
+    def ip_blacklisted(self, ip_address : str) -> bool:
 
-            # elapsed time since record creation
-            elapsed_time = (current_time - TimeStamp.string2time(document["timestamp"])).total_seconds()
-            
-            # before or after backtrace period
-            return comparison_function(elapsed_time, self._FAILURE_BACKTRACE_PERIOD)
+        # whether specified IP address is blacklisted
+        return (self.blacklist.find_one({ "ip-address" : ip_address }) is not None)
 
-        return verify_recent
+    def blacklist_ip(self, ip_address : str) -> None:
 
-    def _prune_memory(self) -> None:
+        # blacklist specified IP address (upsert keeps the unique index satisfied)
+        self.blacklist.update_one(
+            filter = { "ip-address" : ip_address }, 
+            update = { "$setOnInsert" : { "ip-address" : ip_address } }, 
+            upsert = True
+        )
 
-        # remove records older than backtrace period
-        #self.collection.delete_many(self.__recent_filter(before_not_after = False))
+    def add_record(self, ip_record : IPRecord) -> None:
 
-        old_failures = self.collection.find({ "is_failure" : True })
+        assert isinstance(ip_record, IPRecord)
 
-        deletion_ids = []
+        # insert new record
+        self.collection.insert_one(ip_record)
 
-        recent_filter = self.__recent_filter(False)
+        # count failure in sliding window
+        if (ip_record["is-failure"]):
+            self.failure_counter.add_failure(ip_record["ip-address"])
 
-        for document in old_failures:
+    def _prune_memory(self) -> int:
 
-            if (recent_filter(document)):
+        # records older than backtrace period
+        #   Note: Records with BSON dates are expired by the TTL index, so only records 
+        #         written with string timestamps ("%Y%m%d_%H%M%S", which sorts by time) remain.
+        expiry_filter = { "timestamp" : { 
+            "$type" : "string", 
+            "$lt"   : TimeStamp.time2string(TimeStamp.current_time() - timedelta(seconds = self._FAILURE_BACKTRACE_PERIOD)) 
+        } }
 
-                deletion_ids.append(document["_id"])
+        num_removed = 0
 
-        self.collection.delete_many({ "_id" : { "$in" : deletion_ids } })
+        while (True):
 
-    def num_failures(self, ip_address : str) -> int:
+            # collect a bounded batch of expired record IDs
+            deletion_ids = [ 
+                document["_id"] for document in 
+                    self.collection.find(expiry_filter, { "_id" : 1 }).limit(self._PRUNE_BATCH_SIZE) 
+            ]
 
-        ip_failures = self.collection.find({ "ip-address" : ip_address, "is_failure" : True })
+            if (len(deletion_ids) == 0):
+                break 
 
-        counter = 0
+            num_removed += self.collection.delete_many({ "_id" : { "$in" : deletion_ids } }).deleted_count
 
-        recent_filter = self.__recent_filter()
+        # return number of removed records
+        return num_removed
 
-        for document in ip_failures:
-            if (recent_filter(document)):
-                counter += 1
+    def num_failures(self, ip_address : str) -> int:
 
-        return counter 
\ No newline at end of file
+        # number of failures within backtrace period
+        return self.failure_counter.count(ip_address)
@@ -0,0 +1,149 @@
+from pymongo.database import Database
+from pymongo import MongoClient, UpdateOne, ASCENDING
+from typing import *
+import argparse, sys
+
+# Deploy step: run once against the production database when deploying the upvotes and bookmarks collections
+# (safe to interrupt and re-run; e.g. "python legacy_migration.py --mongo-uri mongodb://.../food-fellow").
+#   1. copies upvotes stored in review "upvoters" arrays into the upvotes collection
+#   2. recounts "num_upvotes" of every review from the upvotes collection
+#      (also repairs reviews upvoted again before step 1 ran, which were counted twice)
+#   3. copies bookmarks stored in user "bookmarks" arrays into the bookmarks collection
+#      (until then, those bookmarks are missing from /bookmarked)
+
+def migrate_upvoters(database : Database, batch_size : int) -> int:
+
+    reviews, upvotes = database["reviews"], database["upvotes"]
+
+    num_migrated = 0
+
+    while (True):
+
+        # reviews still storing upvotes in an "upvoters" array (the array is dropped once copied, so a re-run resumes)
+        batch = list(reviews.find({ "upvoters" : { "$exists" : True } }, { "upvoters" : 1 }).sort("_id", ASCENDING).limit(batch_size))
+
+        if (len(batch) == 0):
+            break
+
+        # upvotes made since deploy win over the copied ones
+        upvote_operations = [
+            UpdateOne(
+                filter = { "username" : username, "review-id" : review_document["_id"] },
+                update = { "$setOnInsert" : { "upvoted" : True } },
+                upsert = True
+            ) for review_document in batch for username in dict.fromkeys(review_document["upvoters"])
+        ]
+
+        for batch_start in range(0, len(upvote_operations), batch_size):
+            upvotes.bulk_write(upvote_operations[batch_start:(batch_start + batch_size)], ordered = False)
+
+        # drop the arrays only after their upvotes are stored
+        reviews.update_many({ "_id" : { "$in" : [ review_document["_id"] for review_document in batch ] } }, { "$unset" : { "upvoters" : "" } })
+
+        num_migrated += len(batch)
+
+        print(f"upvoters: migrated {num_migrated} review(s)", file = sys.stderr)
+
+    return num_migrated
+
+def recount_upvotes(database : Database, batch_size : int) -> int:
+
+    reviews, upvotes = database["reviews"], database["upvotes"]
+
+    num_corrected, last_id = 0, None
+
+    while (True):
+
+        # reviews in ID order, a bounded batch at a time
+        batch_ids = [ review_document["_id"] for review_document in reviews.find(
+            ({ "_id" : { "$gt" : last_id } }) if (last_id is not None) else ({}), { "_id" : 1 }
+        ).sort("_id", ASCENDING).limit(batch_size) ]
+
+        if (len(batch_ids) == 0):
+            break
+
+        # upvotes of this batch (served by the review-id index)
+        counts = { count_document["_id"] : count_document["count"] for count_document in upvotes.aggregate([
+            { "$match" : { "review-id" : { "$in" : batch_ids }, "upvoted" : True } },
+            { "$group" : { "_id" : "$review-id", "count" : { "$sum" : 1 } } }
+        ]) }
+
+        # only rewrite counters that are off
+        num_corrected += reviews.bulk_write([
+            UpdateOne(
+                filter = { "_id" : review_id, "num_upvotes" : { "$ne" : counts.get(review_id, 0) } },
+                update = { "$set" : { "num_upvotes" : counts.get(review_id, 0) } }
+            ) for review_id in batch_ids
+        ], ordered = False).modified_count
+
+        last_id = batch_ids[-1]
+
+        print(f"num_upvotes: corrected {num_corrected}", file = sys.stderr)
+
+    return num_corrected
+
+def migrate_bookmarks(database : Database, batch_size : int) -> int:
+
+    users, bookmarks = database["users"], database["bookmarks"]
+
+    num_migrated = 0
+
+    while (True):
+
+        # users still storing bookmarks in a "bookmarks" array (the array is dropped once copied, so a re-run resumes)
+        batch = list(users.find({ "bookmarks" : { "$exists" : True } }, { "username" : 1, "bookmarks" : 1 }).sort("_id", ASCENDING).limit(batch_size))
+
+        if (len(batch) == 0):
+            break
+
+        # bookmarks already in the collection are left as they are
+        bookmark_operations = [
+            UpdateOne(
+                filter = { "username" : user_document["username"], "review-id" : review_id },
+                update = { "$setOnInsert" : { "username" : user_document["username"], "review-id" : review_id } },
+                upsert = True
+            ) for user_document in batch for review_id in dict.fromkeys(user_document["bookmarks"])
+        ]
+
+        for batch_start in range(0, len(bookmark_operations), batch_size):
+            bookmarks.bulk_write(bookmark_operations[batch_start:(batch_start + batch_size)], ordered = False)
+
+        # drop the arrays only after their bookmarks are stored
+        users.update_many({ "_id" : { "$in" : [ user_document["_id"] for user_document in batch ] } }, { "$unset" : { "bookmarks" : "" } })
+
+        # bookmarked lists changed, so pages cached by browsers are stale (see ListVersions)
+        database["list-versions"].bulk_write([
+            UpdateOne({ "_id" : user_document["username"] }, { "$inc" : { "bookmarked" : 1 } }, upsert = True) for user_document in batch
+        ], ordered = False)
+
+        num_migrated += len(batch)
+
+        print(f"bookmarks: migrated {num_migrated} user(s)", file = sys.stderr)
+
+    return num_migrated
+
+# migration name => function (run in this order)
+MIGRATIONS = {
+    "upvoters"    : migrate_upvoters,
+    "num-upvotes" : recount_upvotes,
+    "bookmarks"   : migrate_bookmarks
+}
+
+if (__name__ == "__main__"):
+
+    parser = argparse.ArgumentParser(description = "Move data stored in legacy arrays into their collections.")
+
+    parser.add_argument("--mongo-uri", default = "mongodb://localhost:27017/food-fellow")
+
+    parser.add_argument("--batch-size", type = int, default = 1000)
+
+    parser.add_argument("--only", choices = list(MIGRATIONS), action = "append", help = "run only these migrations (default: all)")
+
+    arguments = parser.parse_args()
+
+    database = MongoClient(arguments.mongo_uri).get_default_database()
+
+    for migration_name, migration_function in MIGRATIONS.items():
+
+        if ((arguments.only is None) or (migration_name in arguments.only)):
+            print(f"done: {migration_name} {migration_function(database, arguments.batch_size)}", file = sys.stderr)
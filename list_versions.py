@@ -0,0 +1,53 @@
+from pymongo.database import Database
+from pymongo import UpdateOne
+from typing import *
+import hashlib, zlib, json
+
+class ListVersions:
+
+    # version collection name
+    _VERSION_COLLECTION_NAME = "list-versions"
+
+    # personal lists with a version each
+    #   Note: Every list shows upvoted and bookmarked states, so those changes bump all of them.
+    LISTS = ( "bookmarked", "recommended", "written" )
+
+    def __init__(self, database : Database) -> None:
+
+        # Food-Fellow (MongoDB) database object
+        self.database = database
+
+        # collection containing one document of list versions per user (keyed by username)
+        self.collection = getattr(self.database.db, self._VERSION_COLLECTION_NAME)
+
+    def bump(self, usernames : Iterable[ str ], list_names : Optional[ Iterable[ str ] ] = None) -> None:
+
+        # every list unless specified
+        increments = { list_name : 1 for list_name in ((self.LISTS) if (list_names is None) else (list_names)) }
+
+        # increment versions of every user in a single round trip
+        version_updates = [
+            UpdateOne({ "_id" : username }, { "$inc" : increments }, upsert = True) for username in dict.fromkeys(usernames)
+        ]
+
+        if (len(version_updates) > 0):
+            self.collection.bulk_write(version_updates, ordered = False)
+
+    def fetch(self, username : str, list_name : str) -> int:
+
+        # single primary key lookup (users without changes are at version 0)
+        version_document = self.collection.find_one({ "_id" : username }, { "_id" : 0, list_name : 1 })
+
+        return (((version_document) or dict()).get(list_name, 0))
+
+    @staticmethod
+    def etag(username : str, list_name : str, version : int, variant : Dict[ str, Any ]) -> str:
+
+        # versions are counted per user, so the tag names its user (hashed, the header is visible to caches)
+        user_hash = hashlib.sha256(username.encode("utf-8")).hexdigest()[:16]
+
+        # pages of one list version differ by request arguments (page size, cursor, ...)
+        variant_hash = zlib.crc32(json.dumps(variant, sort_keys = True, default = str).encode("utf-8"))
+
+        # weak, since compressed and uncompressed bodies share the tag
+        return f'W/"{list_name}-{user_hash}-{version}-{variant_hash:08x}"'
@@ -0,0 +1,94 @@
+from typing import *
+import threading, time
+
+class MaintenanceScheduler:
+
+    def __init__(self, tick_period : Optional[ float ] = 1.0) -> None:
+
+        # period (in seconds) between checks for due jobs
+        self.tick_period = tick_period
+
+        # job name => [ job function, period (in seconds), next run time ]
+        self.jobs = dict()
+
+        # job name => { "time", "result", "error", "elapsed" } of the last run
+        self.reports = dict()
+
+        # guards jobs and reports
+        self.lock = threading.Lock()
+
+        # background scheduling thread
+        self.runner = None
+
+        # signals background thread to stop
+        self.stopped = threading.Event()
+
+    def register(self, job_name : str, job_function : Callable[ [], Any ], period : float) -> None:
+
+        assert (period > 0)
+
+        with self.lock:
+
+            # first run is due one period after registration
+            self.jobs[job_name] = [ job_function, period, time.monotonic() + period ]
+
+    def run_job(self, job_name : str) -> Dict[ str, Any ]:
+
+        job_function = self.jobs[job_name][0]
+
+        start_time = time.monotonic()
+
+        report = { "time" : time.time(), "result" : None, "error" : None }
+
+        try:
+            report["result"] = job_function()
+
+        # allow keyboard interrupt
+        except (KeyboardInterrupt):
+            raise
+
+        # keep scheduling other jobs when one fails
+        except (Exception) as error:
+            report["error"] = repr(error)
+
+        report["elapsed"] = time.monotonic() - start_time
+
+        with self.lock:
+            self.reports[job_name] = report
+
+        return report
+
+    def run_pending(self) -> None:
+
+        current_time = time.monotonic()
+
+        with self.lock:
+
+            due_jobs = [ job_name for job_name, (_, _, next_run) in self.jobs.items() if (next_run <= current_time) ]
+
+            # schedule next runs before running (a slow job does not pile up)
+            for job_name in due_jobs:
+                self.jobs[job_name][2] = current_time + self.jobs[job_name][1]
+
+        for job_name in due_jobs:
+            self.run_job(job_name)
+
+    def _run_forever(self) -> None:
+
+        # run due jobs until stopped
+        while not (self.stopped.wait(self.tick_period)):
+            self.run_pending()
+
+    def start(self) -> None:
+
+        # start background scheduling once
+        if (self.runner is None):
+            self.runner = threading.Thread(target = self._run_forever, daemon = True)
+            self.runner.start()
+
+    def stop(self) -> None:
+
+        self.stopped.set()
+
+        if (self.runner is not None):
+            self.runner.join()
@@ -0,0 +1,167 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import *
+import hashlib, secrets, threading, string, hmac, os
+
+def generate_random_salt(length : int) -> str:
+
+    # verify length variable is positive integer
+    assert (isinstance(length, int) and (length > 0))
+
+    # generate random string containing uppercase alphabets (cryptographically secure)
+    return "".join(secrets.choice(string.ascii_uppercase) for _ in range(length))
+
+def hash_password_and_salt(password : str, salt : str) -> str:
+
+    # verify password and salt are non-empty strings
+    assert ((len(password) > 0) and (len(salt) > 0))
+
+    # initialize SHA-256 hashing object
+    hash_object = hashlib.sha256()
+
+    # concatenate password with salt, encode into binary, then hash
+    hash_object.update(f"{password}{salt}".encode("utf-8"))
+
+    # obtain hexidecimal digest
+    return hash_object.hexdigest()
+
+class PasswordHasher(object):
+
+    # name stored alongside the hash
+    ALGORITHM = None
+
+    # salt string length
+    SALT_LENGTH = 30
+
+    def __init__(self, **params : Any) -> None:
+
+        # algorithm parameters stored alongside the hash
+        self.params = params
+
+    def _derive(self, password : str, salt : str) -> str:
+
+        raise NotImplementedError
+
+    def hash(self, password : str) -> Dict[ str, Any ]:
+
+        # generate random salt string
+        salt = generate_random_salt(self.SALT_LENGTH)
+
+        # user document fields describing the password
+        return {
+            "password_algorithm" : self.ALGORITHM,
+            "password_params"    : dict(self.params),
+            "password_salt"      : salt,
+            "password_hash"      : self._derive(password, salt)
+        }
+
+    def verify(self, password : str, password_record : Dict[ str, Any ]) -> bool:
+
+        # constant-time comparison of computed hash with stored hash
+        return hmac.compare_digest(self._derive(password, password_record["password_salt"]), password_record["password_hash"])
+
+    def needs_rehash(self, password_record : Dict[ str, Any ]) -> bool:
+
+        # whether stored hash was produced by another algorithm or other parameters
+        return (
+            (password_record.get("password_algorithm", SHA256Hasher.ALGORITHM) != self.ALGORITHM) or
+            (password_record.get("password_params", dict()) != self.params)
+        )
+
+class SHA256Hasher(PasswordHasher):
+
+    # single-iteration salted SHA-256 (legacy, kept to verify old accounts)
+    ALGORITHM = "sha256"
+
+    def _derive(self, password : str, salt : str) -> str:
+
+        return hash_password_and_salt(password, salt)
+
+class ScryptHasher(PasswordHasher):
+
+    # memory-hard key derivation
+    ALGORITHM = "scrypt"
+
+    def __init__(self, n : Optional[ int ] = 2 ** 14, r : Optional[ int ] = 8, p : Optional[ int ] = 1) -> None:
+
+        super(ScryptHasher, self).__init__(n = n, r = r, p = p)
+
+    def _derive(self, password : str, salt : str) -> str:
+
+        # memory needed is 128 * n * r * p bytes (with headroom)
+        maximum_memory = 256 * self.params["n"] * self.params["r"] * self.params["p"]
+
+        return hashlib.scrypt(
+            password.encode("utf-8"), salt = salt.encode("utf-8"), maxmem = maximum_memory, dklen = 32, **self.params
+        ).hex()
+
+# algorithm name => hasher class
+HASHERS = {
+    hasher_class.ALGORITHM : hasher_class for hasher_class in (SHA256Hasher, ScryptHasher)
+}
+
+def hasher_for(password_record : Dict[ str, Any ]) -> PasswordHasher:
+
+    # records without an algorithm were written by the legacy SHA-256 hashing
+    return HASHERS[password_record.get("password_algorithm", SHA256Hasher.ALGORITHM)](
+        **password_record.get("password_params", dict())
+    )
+
+class PasswordPool:
+
+    def __init__(self, max_workers : Optional[ int ] = None) -> None:
+
+        if (max_workers is None):
+            max_workers = (os.cpu_count() or 1)
+
+        # threads computing hashes (hashlib releases the GIL while deriving)
+        self.executor = ThreadPoolExecutor(max_workers = max_workers, thread_name_prefix = "password")
+
+        # bounds hashes in flight, so memory-hard hashing cannot exhaust memory under load
+        self.slots = threading.BoundedSemaphore(max_workers * 2)
+
+    def run(self, function : Callable[ ..., Any ], *arguments : Any) -> Any:
+
+        with self.slots:
+            return self.executor.submit(function, *arguments).result()
+
+if (__name__ == "__main__"):
+
+    # benchmark logins per second per core for each hasher setting
+    import time
+
+    settings = [
+        ("sha256 (legacy)",       SHA256Hasher()                   ),
+        ("scrypt n=2^13 r=8 p=1", ScryptHasher(n = 2 ** 13)        ),
+        ("scrypt n=2^14 r=8 p=1", ScryptHasher(n = 2 ** 14)        ),
+        ("scrypt n=2^15 r=8 p=1", ScryptHasher(n = 2 ** 15)        )
+    ]
+
+    num_cores = (os.cpu_count() or 1)
+
+    pool = PasswordPool(num_cores)
+
+    for setting_name, hasher in settings:
+
+        password_record = hasher.hash("correct horse battery staple")
+
+        # run for about one second on a single core
+        num_logins, start_time = 0, time.perf_counter()
+
+        while (time.perf_counter() - start_time < 1.0):
+            assert hasher.verify("correct horse battery staple", password_record)
+            num_logins += 1
+
+        single_rate = num_logins / (time.perf_counter() - start_time)
+
+        # same verifications through the pool (all cores)
+        num_pooled = max(num_cores * 4, min(int(single_rate), 2000))
+
+        start_time = time.perf_counter()
+
+        futures = [ pool.executor.submit(hasher.verify, "correct horse battery staple", password_record) for _ in range(num_pooled) ]
+
+        assert all(future.result() for future in futures)
+
+        pooled_rate = num_pooled / (time.perf_counter() - start_time)
+
+        print(f"{setting_name:<22} | {single_rate:10.1f} logins/s/core | {pooled_rate:10.1f} logins/s on {num_cores} core(s)")
@@ -0,0 +1,245 @@
+from cache_utils import LRUCache
+from pymongo.collection import Collection
+from pymongo import ASCENDING, DESCENDING
+from typing import *
+import itertools, threading, json
+
+class CompiledQuery(dict):
+
+    def __init__(self, shape        : Tuple[ str, ... ],
+                       key          : str,
+                       query_filter : Dict[ str, Any ],
+                       sort         : List[ Tuple[ str, int ] ],
+                       hint         : str) -> None:
+
+        super(CompiledQuery, self).__init__()
+
+        self.update({
+            "shape"  : shape,
+            "key"    : key,
+            "filter" : query_filter,
+            "sort"   : sort,
+            "hint"   : hint
+        })
+
+class QueryCompiler:
+
+    # review pages are returned newest first (keyset pagination on "_id")
+    SORT = [ ("_id", DESCENDING) ]
+
+    # condition attributes served by an index, most selective first
+    #   Note: Each index ends with "_id", so matching reviews are already in page order.
+    SHAPE_INDEXES = {
+        "author_name"     : [ ("author_name",     ASCENDING), ("_id", DESCENDING) ],
+        "food_name"       : [ ("food_name",       ASCENDING), ("_id", DESCENDING) ],
+        "restaurant_name" : [ ("restaurant_name", ASCENDING), ("_id", DESCENDING) ],
+        "hashtags"        : [ ("hashtags",        ASCENDING), ("_id", DESCENDING) ]
+    }
+
+    # index walked (in page order) when no indexed attribute is specified
+    _FALLBACK_HINT = "_id_"
+
+    # number of compiled filters kept
+    _CACHE_SIZE = 1000
+
+    # compiled filters never go stale, so they are only evicted by size
+    _CACHE_TIME_TO_LIVE = 86400
+
+    def __init__(self, collection : Collection, cache_size : Optional[ int ] = None) -> None:
+
+        # review collection (used by explain)
+        self.collection = collection
+
+        # canonical condition => compiled query
+        self.cache = LRUCache(((self._CACHE_SIZE) if (cache_size is None) else (cache_size)), self._CACHE_TIME_TO_LIVE)
+
+        # shape => number of compilations (i.e. which filter combinations clients use)
+        self.shape_counts = dict()
+
+        # guards shape counts (compiled by concurrent request threads)
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def canonicalize(review_filter : Dict[ str, Any ]) -> Dict[ str, Any ]:
+
+        canonical = dict()
+
+        for attribute_name, attribute_value in review_filter.items():
+
+            # skip if argument unspecified
+            if (attribute_value is None):
+                continue
+
+            # hashtags match regardless of order and repetition
+            if (attribute_name == "hashtags"):
+                attribute_value = sorted(set(attribute_value))
+
+            # price range bounds may be given in either order
+            elif (attribute_name == "food_price_range"):
+                attribute_value = [ min(attribute_value), max(attribute_value) ]
+
+            canonical[attribute_name] = attribute_value
+
+        return canonical
+
+    def _compile_filter(self, review_filter : Dict[ str, Any ], canonical : Dict[ str, Any ]) -> Dict[ str, Any ]:
+
+        # instantiate query conditions
+        filter_conditions = dict()
+
+        for attribute_name, attribute_value in canonical.items():
+
+            # "strict matching" uses direct comparison
+            if (attribute_name in review_filter._STRICT_MATCHING):
+
+                # e.q. { "field" : "value" }
+                query_rule = attribute_value
+
+            # "range matching" uses boundary comparison
+            elif (attribute_name in review_filter._RANGE_MATCHING):
+
+                # e.q. { "field" : { "$gte" : lower_value, "$lte" : upper_value } }
+                query_rule = {
+                    "$gte" : attribute_value[0],
+                    "$lte" : attribute_value[1]
+                }
+
+            # item matching checks if everything in target list is included
+            elif (attribute_name in review_filter._ITEM_MATCHING):
+
+                # e.q. { "field" : { "$all" : [ value_1, value_2 ] } }
+                query_rule = {
+                    "$all" : list(attribute_value)
+                }
+
+            else:
+
+                # raise an exception on unexpected attribute name
+                raise Exception(f"Invalid field name for review searching: {repr(attribute_name)}\n")
+
+            # apply the rule (on the review field the attribute refers to)
+            filter_conditions[review_filter._QUERIED_FIELDS.get(attribute_name, attribute_name)] = query_rule
+
+        return filter_conditions
+
+    def _hint(self, shape : Tuple[ str, ... ]) -> str:
+
+        # index of the most selective indexed attribute in the shape
+        for attribute_name, index_keys in self.SHAPE_INDEXES.items():
+            if (attribute_name in shape):
+                return "_".join(f"{field_name}_{direction}" for field_name, direction in index_keys)
+
+        return self._FALLBACK_HINT
+
+    def compile(self, review_filter : Dict[ str, Any ]) -> CompiledQuery:
+
+        canonical = self.canonicalize(review_filter)
+
+        # specified attributes, regardless of their values
+        shape = tuple(sorted(canonical))
+
+        with self.lock:
+            self.shape_counts[shape] = self.shape_counts.get(shape, 0) + 1
+
+        key = json.dumps(canonical, sort_keys = True)
+
+        found, compiled_query = self.cache.get(key)
+
+        if (found):
+            return compiled_query
+
+        compiled_query = CompiledQuery(shape, key, self._compile_filter(review_filter, canonical), self.SORT, self._hint(shape))
+
+        self.cache.put(key, compiled_query)
+
+        # callers must not modify the (shared) compiled query
+        return compiled_query
+
+    @staticmethod
+    def _plan_indexes(plan_stage : Any) -> List[ str ]:
+
+        # collect index names (or "COLLSCAN") of every stage in an explained plan
+        if isinstance(plan_stage, list):
+            return list(itertools.chain.from_iterable(QueryCompiler._plan_indexes(stage) for stage in plan_stage))
+
+        if not isinstance(plan_stage, dict):
+            return []
+
+        indexes = ([ plan_stage["indexName"] ] if ("indexName" in plan_stage) else []) + (
+            [ "COLLSCAN" ] if (plan_stage.get("stage") == "COLLSCAN") else []
+        )
+
+        return indexes + list(itertools.chain.from_iterable(QueryCompiler._plan_indexes(value) for value in plan_stage.values()))
+
+    def explain(self, review_filter : Dict[ str, Any ]) -> Dict[ str, Any ]:
+
+        compiled_query = self.compile(review_filter)
+
+        # plan actually used (with hint) and plan the server would have chosen on its own
+        hinted   = self.collection.find(compiled_query["filter"]).sort(compiled_query["sort"]).hint(compiled_query["hint"]).explain()
+        unhinted = self.collection.find(compiled_query["filter"]).sort(compiled_query["sort"]).explain()
+
+        execution_stats = hinted.get("executionStats", dict())
+
+        return {
+            "shape"          : list(compiled_query["shape"]),
+            "filter"         : compiled_query["filter"],
+            "hint"           : compiled_query["hint"],
+            "indexes"        : self._plan_indexes(hinted["queryPlanner"]["winningPlan"]),
+            "planner-choice" : self._plan_indexes(unhinted["queryPlanner"]["winningPlan"]),
+            "keys-examined"  : execution_stats.get("totalKeysExamined"),
+            "docs-examined"  : execution_stats.get("totalDocsExamined"),
+            "returned"       : execution_stats.get("nReturned")
+        }
+
+    def shape_stats(self) -> Dict[ str, int ]:
+
+        # e.q. { "food_rating+hashtags" : 12 }
+        with self.lock:
+            return { "+".join(shape) or "(none)" : count for shape, count in self.shape_counts.items() }
+
+if (__name__ == "__main__"):
+
+    # explain every filter shape of up to two attributes, flagging shapes without a selective index
+    from review_manager import ReviewCondition
+    from pymongo import MongoClient
+    import argparse
+
+    parser = argparse.ArgumentParser(description = "Explain index usage of review filter shapes.")
+
+    parser.add_argument("--mongo-uri", default = "mongodb://localhost:27017/food-fellow")
+
+    parser.add_argument("--max-attributes", type = int, default = 2)
+
+    arguments = parser.parse_args()
+
+    collection = MongoClient(arguments.mongo_uri).get_default_database().reviews
+
+    # an existing review provides realistic values for every attribute
+    sample = collection.find_one({ "hashtags.0" : { "$exists" : True } }) or collection.find_one()
+
+    if (sample is None):
+        raise SystemExit("No reviews to sample filter values from")
+
+    sample_values = {
+        "food_name"        : sample["food_name"],
+        "restaurant_name"  : sample["restaurant_name"],
+        "author_name"      : sample["author_name"],
+        "food_price_range" : (sample["food_price"], sample["food_price"]),
+        "food_rating"      : sample["food_rating"],
+        "service_rating"   : sample["service_rating"],
+        "recommend_rating" : sample["recommend_rating"],
+        "hashtags"         : ((sample.get("hashtags") or [ "" ])[:1])
+    }
+
+    query_compiler = QueryCompiler(collection)
+
+    for num_attributes in range(1, arguments.max_attributes + 1):
+
+        for shape in itertools.combinations(sorted(sample_values), num_attributes):
+
+            explanation = query_compiler.explain(ReviewCondition(**{ attribute_name : sample_values[attribute_name] for attribute_name in shape }))
+
+            flag = (("UNINDEXED") if (explanation["hint"] == QueryCompiler._FALLBACK_HINT) else (""))
+
+            print(f"{'+'.join(shape):<40} | {','.join(explanation['indexes']):<28} | planner {','.join(explanation['planner-choice']):<28} | keys {explanation['keys-examined']} docs {explanation['docs-examined']} {flag}")
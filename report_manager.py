@@ -10,6 +10,9 @@ class ReportManager(CryptoUtils):
     # admin's email address
     _ADMIN_EMAIL = "watersprayer127@gmail.com"#os.environ["FOOD_FELLOW_ADMIN_EMAIL"]
     
+    # removal links expire after this period (in seconds)
+    REMOVAL_EXPIRE_TIME = 7 * 86400
+
     # home page URL
     BASE_SITE_URL = "http://localhost:5000"#os.environ["FOOD_FELLOW_BASE"]
 
@@ -40,7 +43,7 @@ class ReportManager(CryptoUtils):
         subject = "Food-Fellow Review Report"
 
         # pack review ID and encrypt it
-        success, removal_key = self._encrypt_data(self.__create_removal_object(review_id))
+        success, removal_key = self._encrypt_data(self.__create_removal_object(review_id), self.REMOVAL_EXPIRE_TIME)
 
         # encryption failed
         if not (success):
@@ -58,10 +61,10 @@ class ReportManager(CryptoUtils):
 
     def respond_to_report(self, removal_key : str) -> bool:
 
-        # attempt to decrypt the message
+        # attempt to decrypt the message (fails if past expiration time)
         success, removal_obj = self._decrypt_data(removal_key)
 
-        # decryption failure
+        # decryption failure or expired link
         if not (success):
             return False 
 
@@ -0,0 +1,241 @@
+from flask import Response, request
+from bson.objectid import ObjectId
+from datetime import datetime
+from typing import *
+import json, zlib
+
+# optional fast encoder (falls back to the standard library)
+try:
+    import orjson
+except (ImportError):
+    orjson = None
+
+# optional brotli compression (falls back to gzip)
+try:
+    import brotli
+except (ImportError):
+    brotli = None
+
+def _encode_default(value : Any) -> Any:
+
+    # MongoDB IDs are sent as hexadecimal strings
+    if isinstance(value, ObjectId):
+        return str(value)
+
+    # dates are sent in ISO 8601
+    if isinstance(value, datetime):
+        return value.isoformat()
+
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def encode_json(payload : Any) -> bytes:
+
+    # compact UTF-8 JSON (orjson serializes datetimes natively)
+    if (orjson is not None):
+        return orjson.dumps(payload, default = _encode_default)
+
+    return json.dumps(payload, default = _encode_default, separators = (",", ":"), ensure_ascii = False).encode("utf-8")
+
+class _Compressor:
+
+    def __init__(self, encoding : Optional[ str ]) -> None:
+
+        # content coding ("br", "gzip" or None for identity)
+        self.encoding = encoding
+
+        if (encoding == "br"):
+            self.compressor = brotli.Compressor(quality = 4)
+
+        # gzip container (window bits 16 + 15), fast level
+        elif (encoding == "gzip"):
+            self.compressor = zlib.compressobj(4, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data : bytes) -> bytes:
+
+        if (self.encoding == "br"):
+            return self.compressor.process(data) + self.compressor.flush()
+
+        if (self.encoding == "gzip"):
+            return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+        return data
+
+    def finish(self) -> bytes:
+
+        if (self.encoding == "br"):
+            return self.compressor.finish()
+
+        if (self.encoding == "gzip"):
+            return self.compressor.flush(zlib.Z_FINISH)
+
+        return b""
+
+class ResponseEncoder:
+
+    # bodies smaller than this (in bytes) are not worth compressing
+    MIN_COMPRESS_SIZE = 1024
+
+    # arrays longer than this are streamed instead of encoded at once
+    STREAM_THRESHOLD = 50
+
+    # streamed bodies are flushed once this many bytes are encoded
+    CHUNK_SIZE = 16384
+
+    # content type of every JSON response
+    MIME_TYPE = "application/json"
+
+    @staticmethod
+    def negotiate_encoding(accept_encoding : str) -> Optional[ str ]:
+
+        # e.q. "gzip, deflate, br;q=0.9" => { "gzip" : 1.0, "deflate" : 1.0, "br" : 0.9 }
+        qualities = dict()
+
+        for coding in accept_encoding.split(","):
+
+            name, _, parameters = coding.strip().partition(";")
+
+            try:
+                qualities[name.strip().lower()] = float(parameters.strip()[2:]) if (parameters.strip().startswith("q=")) else 1.0
+
+            # ignore malformed weights
+            except (ValueError):
+                continue
+
+        # prefer brotli (smaller) when available, then gzip
+        for encoding in (("br", "gzip") if (brotli is not None) else ("gzip",)):
+            if (qualities.get(encoding, qualities.get("*", 0.0)) > 0.0):
+                return encoding
+
+        return None
+
+    def respond(self, payload : Dict[ str, Any ], stream_key : Optional[ str ] = "data") -> Response:
+
+        encoding = self.negotiate_encoding(request.headers.get("Accept-Encoding", ""))
+
+        # stream long arrays (e.g. review pages) chunk by chunk
+        if ((stream_key in payload) and isinstance(payload[stream_key], list) and (len(payload[stream_key]) > self.STREAM_THRESHOLD)):
+            return self.respond_stream(payload, stream_key, encoding)
+
+        body = encode_json(payload)
+
+        # small bodies are sent as is
+        if (len(body) < self.MIN_COMPRESS_SIZE):
+            encoding = None
+
+        compressor = _Compressor(encoding)
+
+        response = Response(compressor.compress(body) + compressor.finish(), mimetype = self.MIME_TYPE)
+
+        return self._set_headers(response, encoding)
+
+    def respond_stream(self, payload : Dict[ str, Any ], stream_key : str, encoding : Optional[ str ] = None) -> Response:
+
+        def generate_chunks() -> Iterator[ bytes ]:
+
+            compressor = _Compressor(encoding)
+
+            # every other field first, then the array (JSON objects are unordered)
+            head = encode_json({ key : value for key, value in payload.items() if (key != stream_key) })
+
+            buffer = [ head[:-1] + (b"," if (len(head) > 2) else b"") + json.dumps(stream_key).encode("utf-8") + b":[" ]
+
+            buffered_size = len(buffer[0])
+
+            for index, item in enumerate(payload[stream_key]):
+
+                encoded_item = encode_json(item)
+
+                buffer.append(((b",") if (index > 0) else (b"")) + encoded_item)
+
+                buffered_size += len(encoded_item) + 1
+
+                # flush once a chunk is full
+                if (buffered_size >= self.CHUNK_SIZE):
+                    yield compressor.compress(b"".join(buffer))
+                    buffer, buffered_size = [], 0
+
+            buffer.append(b"]}")
+
+            yield compressor.compress(b"".join(buffer)) + compressor.finish()
+
+        return self._set_headers(Response(generate_chunks(), mimetype = self.MIME_TYPE), encoding)
+
+    @staticmethod
+    def _set_headers(response : Response, encoding : Optional[ str ]) -> Response:
+
+        if (encoding is not None):
+            response.headers["Content-Encoding"] = encoding
+
+        # caches must not serve a compressed body to clients that cannot decode it
+        response.headers["Vary"] = "Accept-Encoding"
+
+        return response
+
+# encoder shared by every route
+_response_encoder = ResponseEncoder()
+
+def json_response(payload : Dict[ str, Any ]) -> Response:
+
+    # JSON response (compressed or streamed when worthwhile)
+    return _response_encoder.respond(payload)
+
+if (__name__ == "__main__"):
+
+    # compare bytes and CPU per review page with the previous json.dumps path
+    from datetime import timezone
+    from flask import Flask
+    import gzip, time
+
+    app = Flask(__name__)
+
+    review_page = {
+        "status"      : "retrieve-success",
+        "data"        : [ {
+            "_id" : ObjectId(), "food_name" : f"Tonkotsu Ramen {index}", "restaurant_name" : "Ichiran", "author_name" : "someone@example.com",
+            "food_price" : 120, "food_rating" : 4, "service_rating" : 5, "recommend_rating" : 3, "num_upvotes" : index,
+            "hashtags" : [ "spicy", "noodles" ], "timestamp" : datetime.now(timezone.utc), "upvoted" : False, "bookmarked" : True
+        } for index in range(100) ],
+        "next-cursor" : str(ObjectId())
+    }
+
+    response_encoder = ResponseEncoder()
+
+    def legacy() -> bytes:
+
+        # previous path: str() of every ID, then one json.dumps string (sent as text/html, uncompressed)
+        return json.dumps({ **review_page, "data" : [
+            { **review, "_id" : str(review["_id"]), "timestamp" : str(review["timestamp"]) } for review in review_page["data"]
+        ] }).encode("utf-8")
+
+    def respond(accept_encoding : str, stream : bool) -> bytes:
+
+        response_encoder.STREAM_THRESHOLD = ((0) if (stream) else (10 ** 9))
+
+        with app.test_request_context(headers = { "Accept-Encoding" : accept_encoding }):
+            return b"".join(response_encoder.respond(review_page).response)
+
+    measurements = [
+        ("legacy json.dumps",   legacy                                 ),
+        ("encoder identity",    lambda : respond("",              False)),
+        ("encoder gzip",        lambda : respond("gzip",          False)),
+        ("encoder gzip stream", lambda : respond("gzip",          True )),
+        ("encoder br",          lambda : respond("br, gzip",      False))
+    ]
+
+    NUM_RUNS = 500
+
+    print(f"encoder: {('orjson') if (orjson is not None) else ('json (stdlib)')} | brotli: {('available') if (brotli is not None) else ('unavailable')}")
+
+    for measurement_name, function in measurements:
+
+        body = function()
+
+        start_time = time.process_time()
+
+        for _ in range(NUM_RUNS):
+            function()
+
+        print(f"{measurement_name:<20} | {len(body):7d} bytes | {(time.process_time() - start_time) * 1e6 / NUM_RUNS:8.1f} us CPU")
+
+    # streamed gzip decodes to the same document
+    assert (json.loads(gzip.decompress(respond("gzip", True)))["data"][0]["_id"] == str(review_page["data"][0]["_id"]))
@@ -0,0 +1,235 @@
+from review_manager import ReviewManager, Review
+from aggregate_manager import AggregateManager
+from list_versions import ListVersions
+from change_journal import ChangeJournal
+from time_utils import TimeStamp
+from pymongo.collection import Collection
+from pymongo.errors import BulkWriteError
+from pymongo import MongoClient, ASCENDING
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import *
+import argparse, json, csv, sys, time
+
+# row field => review field, for both directions (row names are the same as the "/write" request body)
+ROW_FIELDS = {
+    "food-name"        : "food_name",
+    "restaurant-name"  : "restaurant_name",
+    "author-name"      : "author_name",
+    "food-price"       : "food_price",
+    "food-rating"      : "food_rating",
+    "service-rating"   : "service_rating",
+    "recommend-rating" : "recommend_rating"
+}
+
+# optional row fields (kept by a round trip, set to their defaults when missing)
+#   Note: Upvotes are stored apart from reviews, so imported reviews start without any.
+OPTIONAL_ROW_FIELDS = ( "hashtags", "timestamp" )
+
+def read_rows(file_path : str) -> Iterator[ Dict[ str, Any ] ]:
+
+    with open(file_path, "r", encoding = "utf-8", newline = "") as file:
+
+        # CSV files have a header row naming the fields
+        if (file_path.lower().endswith(".csv")):
+
+            for row in csv.DictReader(file):
+
+                # hashtags are separated by "|" in CSV files
+                row["hashtags"] = [ hashtag.strip() for hashtag in (row.get("hashtags") or "").split("|") ]
+
+                yield row
+
+            return
+
+        # otherwise one JSON object per line (NDJSON)
+        for line in file:
+
+            if (line.strip() == ""):
+                continue
+
+            yield json.loads(line)
+
+def row_to_review(row : Dict[ str, Any ]) -> Optional[ Review ]:
+
+    # validate fields the same way "/write" does
+    review = Review.from_fields(*(str(row.get(field_name, "")).strip() for field_name in ROW_FIELDS), row.get("hashtags", []))
+
+    # keep the creation time of exported reviews (ISO 8601, or the legacy format)
+    if ((review is not None) and (row.get("timestamp") not in (None, ""))):
+
+        try:
+            review["timestamp"] = TimeStamp.coerce(datetime.fromisoformat(row["timestamp"]))
+
+        except (ValueError):
+            review["timestamp"] = TimeStamp.coerce(row["timestamp"])
+
+    return review
+
+def review_to_row(review_document : Dict[ str, Any ]) -> Dict[ str, Any ]:
+
+    row = { row_field : review_document[review_field] for row_field, review_field in ROW_FIELDS.items() }
+
+    row["hashtags"] = review_document.get("hashtags", [])
+
+    if (review_document.get("timestamp") is not None):
+        row["timestamp"] = TimeStamp.coerce(review_document["timestamp"]).astimezone(timezone.utc).isoformat()
+
+    return row
+
+def insert_reviews(collection        : Collection,
+                   aggregate_manager : AggregateManager,
+                   list_versions     : ListVersions,
+                   change_journal    : ChangeJournal,
+                   reviews           : List[ Review ]) -> List[ Tuple[ int, str ] ]:
+
+    # (position in batch, error message) of rejected reviews
+    failures = []
+
+    # add reviews to database in a single unordered batch (one failure does not stop the rest)
+    try:
+        collection.insert_many(reviews, ordered = False)
+
+    except (BulkWriteError) as error:
+        failures = [ (write_error["index"], write_error["errmsg"]) for write_error in error.details["writeErrors"] ]
+
+    rejected = { index for index, _ in failures }
+
+    inserted = [ review for index, review in enumerate(reviews) if (index not in rejected) ]
+
+    # count inserted reviews towards their restaurants and dishes
+    #   Note: The typeahead index of running workers picks them up on its next rebuild.
+    aggregate_manager.add_reviews(inserted)
+
+    # authors' written lists changed
+    list_versions.bump([ review["author_name"] for review in inserted ], [ "written" ])
+
+    # let running workers index them (search and trending)
+    change_journal.record(review["_id"] for review in inserted)
+
+    return failures
+
+def import_reviews(database : Any, file_path : str, batch_size : int) -> Tuple[ int, int ]:
+
+    # plain collection and aggregate writes (no in-memory index of a ReviewManager is needed)
+    collection = getattr(database.db, ReviewManager._REVIEW_COLLECTION_NAME)
+
+    aggregate_manager, list_versions, change_journal = AggregateManager(database), ListVersions(database), ChangeJournal(database)
+
+    num_imported, num_rejected = 0, 0
+
+    start_time = time.perf_counter()
+
+    # (row number, review) of the batch being built
+    batch = []
+
+    def write_batch() -> None:
+
+        nonlocal num_imported, num_rejected
+
+        failures = insert_reviews(collection, aggregate_manager, list_versions, change_journal, [ review for _, review in batch ])
+
+        # report rows rejected by the database (e.g. document validation)
+        for index, error_message in failures:
+            print(f"row {batch[index][0]}: rejected by database: {error_message}", file = sys.stderr)
+
+        num_imported += len(batch) - len(failures)
+
+        num_rejected += len(failures)
+
+        batch.clear()
+
+        elapsed = time.perf_counter() - start_time
+
+        print(f"imported {num_imported} review(s), rejected {num_rejected} ({num_imported / max(elapsed, 1e-9):.0f} reviews/s)", file = sys.stderr)
+
+    for row_number, row in enumerate(read_rows(file_path), start = 1):
+
+        try:
+            review = row_to_review(row)
+
+        # allow keyboard interrupt
+        except (KeyboardInterrupt):
+            raise
+
+        except (Exception) as error:
+            review, reason = None, repr(error)
+
+        else:
+            reason = "fields unspecified or not numeric"
+
+        # report invalid rows and keep going
+        if (review is None):
+            print(f"row {row_number}: invalid: {reason}", file = sys.stderr)
+            num_rejected += 1
+            continue
+
+        batch.append((row_number, review))
+
+        if (len(batch) >= batch_size):
+            write_batch()
+
+    if (len(batch) > 0):
+        write_batch()
+
+    return (num_imported, num_rejected)
+
+def export_reviews(database : Any, file_path : str, batch_size : int) -> int:
+
+    collection = getattr(database.db, ReviewManager._REVIEW_COLLECTION_NAME)
+
+    num_exported = 0
+
+    # write "-" to standard output
+    file = (sys.stdout if (file_path == "-") else open(file_path, "w", encoding = "utf-8"))
+
+    try:
+
+        # stream reviews (oldest first) without loading the collection into memory
+        review_cursor = collection.find({}, { "_id" : 0, **{ review_field : 1 for review_field in (*ROW_FIELDS.values(), *OPTIONAL_ROW_FIELDS) } })
+
+        for review_document in review_cursor.sort("_id", ASCENDING).batch_size(batch_size):
+
+            # rows have the fields import reads
+            file.write(json.dumps(review_to_row(review_document), ensure_ascii = False) + "\n")
+
+            num_exported += 1
+
+            if (num_exported % (batch_size * 10) == 0):
+                print(f"exported {num_exported} review(s)", file = sys.stderr)
+
+    finally:
+
+        if (file is not sys.stdout):
+            file.close()
+
+    return num_exported
+
+if (__name__ == "__main__"):
+
+    parser = argparse.ArgumentParser(description = "Bulk import or export Food-Fellow reviews.")
+
+    parser.add_argument("command", choices = [ "import", "export" ])
+
+    parser.add_argument("file", help = "NDJSON (or CSV for import) file path, \"-\" exports to standard output")
+
+    parser.add_argument("--mongo-uri", default = "mongodb://localhost:27017/food-fellow")
+
+    parser.add_argument("--batch-size", type = int, default = 1000)
+
+    arguments = parser.parse_args()
+
+    # managers access collections through "database.db" (as with Flask-PyMongo)
+    database = SimpleNamespace(db = MongoClient(arguments.mongo_uri).get_default_database())
+
+    if (arguments.command == "import"):
+
+        num_imported, num_rejected = import_reviews(database, arguments.file, arguments.batch_size)
+
+        print(f"done: imported {num_imported} review(s), rejected {num_rejected}", file = sys.stderr)
+
+        sys.exit(1 if (num_rejected > 0) else 0)
+
+    num_exported = export_reviews(database, arguments.file, arguments.batch_size)
+
+    print(f"done: exported {num_exported} review(s)", file = sys.stderr)
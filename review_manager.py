@@ -1,6 +1,17 @@
-from datetime import datetime, timezone
+from search_engine import SearchEngine
+from aggregate_manager import AggregateManager
+from trending import TrendingBoard
+from typeahead import Typeahead
+from list_versions import ListVersions
+from change_journal import ChangeJournal
+from time_utils import TimeStamp
+from index_utils import IndexUtils
+from cache_utils import LRUCache
+from query_compiler import QueryCompiler
 from pymongo.database import Database
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
 from bson.objectid import ObjectId
+from datetime import timedelta
 from typing import *
 
 class ReviewCondition(dict):
@@ -18,6 +29,11 @@ class ReviewCondition(dict):
         "hashtags"
     }
 
+    # condition attributes matched against a differently named review field
+    _QUERIED_FIELDS = {
+        "food_price_range" : "food_price"
+    }
+
     def __init__(self, food_name        : Optional[ str               ] = None,
                        restaurant_name  : Optional[ str               ] = None,
                        author_name      : Optional[ str               ] = None,
@@ -40,12 +56,65 @@ class ReviewCondition(dict):
             "hashtags"         : hashtags
         })
 
-class Review(dict):
+    @classmethod
+    def from_fields(class_, food_name        : Optional[ str                     ] = None,
+                            restaurant_name  : Optional[ str                     ] = None,
+                            author_name      : Optional[ str                     ] = None,
+                            food_price_range : Optional[ List[ Union[ str, int ] ] ] = None,
+                            food_rating      : Optional[ Union[ str, int ]       ] = None,
+                            service_rating   : Optional[ Union[ str, int ]       ] = None,
+                            recommend_rating : Optional[ Union[ str, int ]       ] = None,
+                            hashtags         : Optional[ List[ str ]             ] = None) -> Optional[ "ReviewCondition" ]:
+
+        # return None if some name fields are not strings (e.g. a JSON object would become a query operator)
+        if not all(isinstance(field, str) for field in [ food_name, restaurant_name, author_name ] if (field is not None)):
+            return None
+
+        # return None if price range is not a (lower, upper) list (a string would unpack into its characters)
+        if ((food_price_range is not None) and not (isinstance(food_price_range, list) and (len(food_price_range) == 2))):
+            return None
+
+        # return None if hashtags are not a list of strings
+        if ((hashtags is not None) and not (isinstance(hashtags, list) and all(isinstance(hashtag, str) for hashtag in hashtags))):
+            return None
+
+        numeric_fields = [ field for field in [ *(food_price_range or []), food_rating, service_rating, recommend_rating ] if (field is not None) ]
+
+        # return None if some numeric fields are not non-negative integers or digit strings (booleans and floats are rejected)
+        if not all(((type(field) is int) and (field >= 0)) or (isinstance(field, str) and field.isdecimal()) for field in numeric_fields):
+            return None
+
+        def optional_int(value):
+            return ((None) if (value is None) else (int(value)))
+
+        # treat empty strings and lists as unspecified
+        return class_(
+            food_name or None, restaurant_name or None, author_name or None,
+            ((tuple(map(int, food_price_range))) if (food_price_range) else (None)),
+            optional_int(food_rating), optional_int(service_rating), optional_int(recommend_rating),
+            (list(filter("".__ne__, hashtags)) or None) if (hashtags is not None) else (None)
+        )
 
-    _TIMESTAMP_FORMAT = "%Y%m%d_%H%M%S"
+class Review(dict):
 
     _HIDDEN_FIELDS = {  "upvoters", "timestamp"  }
 
+    # fields returned by MongoDB for each named view
+    #   1. "card"       => review list entries
+    #   2. "detail"     => full public review
+    #   3. "moderation" => full public review with creation time
+    _VIEW_FIELDS = {
+        "card"       : ( "food_name", "restaurant_name", "author_name", "food_price", "food_rating", 
+                         "service_rating", "recommend_rating", "num_upvotes" ),
+        "detail"     : ( "food_name", "restaurant_name", "author_name", "food_price", "food_rating", 
+                         "service_rating", "recommend_rating", "num_upvotes", "hashtags" ),
+        "moderation" : ( "food_name", "restaurant_name", "author_name", "food_price", "food_rating", 
+                         "service_rating", "recommend_rating", "num_upvotes", "hashtags", "timestamp" )
+    }
+
+    # view used when unspecified
+    DEFAULT_VIEW = "detail"
+
     def __init__(self, food_name        : str,
                        restaurant_name  : str,
                        author_name      : str,
@@ -65,26 +134,164 @@ class Review(dict):
             "food_rating"      : food_rating,
             "service_rating"   : service_rating,
             "recommend_rating" : recommend_rating,
-            "upvoters"         : [],
             "num_upvotes"      : 0,
             "hashtags"         : hashtags,
-            "timestamp"        : datetime.now(timezone.utc).strftime(self._TIMESTAMP_FORMAT)
+            "timestamp"        : TimeStamp.current_time()
         })
 
     @classmethod
-    def simplify(class_, review_document : Dict[ str, Any ]) -> Dict[ str, Any ]:
-        simplified = {
-            key : value for key, value in review_document.items()
-                if key not in class_._HIDDEN_FIELDS
-        }
-        simplified["_id"] = str(simplified["_id"])
-        return simplified
+    def from_fields(class_, food_name        : str,
+                            restaurant_name  : str,
+                            author_name      : str,
+                            food_price       : Union[ str, int ],
+                            food_rating      : Union[ str, int ],
+                            service_rating   : Union[ str, int ],
+                            recommend_rating : Union[ str, int ],
+                            hashtags         : Optional[ List[ str ] ] = None) -> Optional[ "Review" ]:
+
+        numeric_fields = [ str(food_price), str(food_rating), str(service_rating), str(recommend_rating) ]
+
+        # return None if some fields were unspecified (empty)
+        if any(field == "" for field in [ food_name, restaurant_name, author_name, *numeric_fields ]):
+            return None
+
+        # return None if some numeric fields are not numeric
+        if not all(field.isnumeric() for field in numeric_fields):
+            return None
+
+        def bound_range(value):
+            return min(5, max(1, value))
+
+        # drop empty hashtags
+        hashtags = list(filter("".__ne__, ((hashtags) if (hashtags is not None) else ([]))))
+
+        return class_(
+            food_name, restaurant_name, 
+            author_name, abs(int(food_price)), bound_range(int(food_rating)), 
+            bound_range(int(service_rating)), bound_range(int(recommend_rating)), hashtags
+        )
+
+    @classmethod
+    def projection(class_, view : Optional[ str ] = None) -> Dict[ str, int ]:
+
+        if (view is None):
+            view = class_.DEFAULT_VIEW
+
+        # raise an exception on unexpected view name
+        if (view not in class_._VIEW_FIELDS):
+            raise ValueError(f"Invalid review view: {repr(view)}")
+
+        # e.q. { "food_name" : 1, "restaurant_name" : 1 }
+        return { field_name : 1 for field_name in class_._VIEW_FIELDS[view] }
+
+    @classmethod
+    def simplify(class_, review_document : Dict[ str, Any ], view : Optional[ str ] = None) -> Dict[ str, Any ]:
+
+        # drop hidden fields in place (documents come fresh from the driver, and projections already omit most)
+        for field_name in class_._HIDDEN_FIELDS.difference(class_._VIEW_FIELDS.get(view, ())):
+            review_document.pop(field_name, None)
+
+        # IDs double as page cursors, so they are kept as strings
+        review_document["_id"] = str(review_document["_id"])
 
-class ReviewManager:
+        return review_document
+
+class ReviewPage(dict):
+
+    # page size used when unspecified
+    DEFAULT_PAGE_SIZE = 20
+
+    # largest page a client may request
+    MAX_PAGE_SIZE = 100
+
+    def __init__(self, reviews     : List[ Dict[ str, Any ] ],
+                       next_cursor : Optional[ str ] = None,
+                       total       : Optional[ int ] = None) -> None:
+
+        super(ReviewPage, self).__init__()
+
+        self.update({
+            "data"        : reviews,
+            "next-cursor" : next_cursor
+        })
+
+        # only report total count if requested
+        if (total is not None):
+            self["total"] = total
+
+    @classmethod
+    def bound_page_size(class_, page_size : Optional[ int ]) -> int:
+
+        # fall back to default page size if unspecified
+        if (page_size is None):
+            return class_.DEFAULT_PAGE_SIZE
+
+        return min(class_.MAX_PAGE_SIZE, max(1, int(page_size)))
+
+    @staticmethod
+    def decode_cursor(cursor : str) -> ObjectId:
+
+        # cursor token is the ID of the last review on the previous page
+        if not (ObjectId.is_valid(cursor)):
+            raise ValueError(f"Invalid page cursor: {repr(cursor)}")
+
+        return ObjectId(cursor)
+
+    @staticmethod
+    def decode_offset(cursor : str) -> int:
+
+        # cursor token of ranked results is the rank offset
+        if not (str(cursor).isdigit()):
+            raise ValueError(f"Invalid page cursor: {repr(cursor)}")
+
+        return int(cursor)
+
+class ReviewManager(IndexUtils):
 
     # review collection name
     _REVIEW_COLLECTION_NAME = "reviews"
 
+    # upvote collection name
+    _UPVOTE_COLLECTION_NAME = "upvotes"
+
+    # snapshot collection name (shared by worker processes)
+    _SNAPSHOT_COLLECTION_NAME = "snapshots"
+
+    # period (in seconds) a shared typeahead snapshot is reused by starting workers
+    _TYPEAHEAD_SNAPSHOT_PERIOD = 300
+
+    # lower boundaries of price facet bands (the last band is open-ended)
+    _PRICE_BANDS = [ 0, 100, 200, 500, 1000 ]
+
+    # most frequent hashtags counted by the hashtag facet
+    _FACET_HASHTAG_LIMIT = 20
+
+    # rating fields counted by rating facets
+    _FACET_RATING_FIELDS = ( "food_rating", "service_rating", "recommend_rating" )
+
+    # largest number of changed reviews fetched by a single query
+    _CHANGE_BATCH_SIZE = 1000
+
+    # number of filter combinations whose facets are cached
+    _FACET_CACHE_SIZE = 1000
+
+    # period (in seconds) facets are served from cache (counts may lag new reviews meanwhile)
+    _FACET_CACHE_TIME_TO_LIVE = 60
+
+    # indexes required by review queries
+    _INDEXES = {
+        "collection" : [
+            # filter indexes chosen by the query compiler (prefixes also serve single-field lookups)
+            *[ (index_keys, {}) for index_keys in QueryCompiler.SHAPE_INDEXES.values() ],
+            ( [ ("num_upvotes",     DESCENDING) ], {} ),
+            ( [ ("timestamp",       DESCENDING) ], {} )
+        ],
+        "upvotes" : [
+            ( [ ("username", ASCENDING), ("review-id", ASCENDING) ], { "unique" : True } ),
+            ( [ ("review-id", ASCENDING) ], {} )
+        ]
+    }
+
     def __init__(self, database : Database) -> None:
 
         # Food-Fellow (MongoDB) database object
@@ -94,6 +301,128 @@ class ReviewManager:
         #self.collection = self.database[self._REVIEW_COLLECTION_NAME]
         self.collection = getattr(self.database.db, self._REVIEW_COLLECTION_NAME)
 
+        # collection containing one upvote state per (user, review)
+        self.upvotes = getattr(self.database.db, self._UPVOTE_COLLECTION_NAME)
+
+        # IDs of reviews changed by any worker (read before the in-memory indexes below are built)
+        self.change_journal = ChangeJournal(self.database)
+
+        # inverted index used to rank reviews by relevance
+        self.search_engine = SearchEngine()
+
+        # build search index from existing reviews
+        self.refresh_search_index()
+
+        # per-restaurant and per-dish rating aggregates
+        self.aggregate_manager = AggregateManager(self.database)
+
+        # compiles review conditions into cached, hinted queries
+        self.query_compiler = QueryCompiler(self.collection)
+
+        # filter combination => facet counts
+        self.facet_cache = LRUCache(self._FACET_CACHE_SIZE, self._FACET_CACHE_TIME_TO_LIVE)
+
+        # time-decayed top reviews (site-wide, per restaurant, per hashtag)
+        self.trending_board = TrendingBoard()
+
+        # rank existing reviews
+        self.refresh_trending()
+
+        # versions of personal review lists (for conditional requests)
+        self.list_versions = ListVersions(self.database)
+
+        # called with the ID of every removed review (e.g. to expire lists holding it)
+        self.removal_listeners = []
+
+        # collection containing snapshots of in-memory indexes
+        self.snapshots = getattr(self.database.db, self._SNAPSHOT_COLLECTION_NAME)
+
+        # restaurant and food names by prefix
+        self.typeahead = Typeahead()
+
+        # load (or build) name index
+        self.refresh_typeahead(from_snapshot = True)
+
+    def refresh_search_index(self) -> bool:
+
+        # only the searchable fields are needed (also picks up writes bypassing the change journal)
+        #   Note: Returns False if another thread is rebuilding already.
+        return self.search_engine.rebuild(lambda : self.collection.find({}, {
+            "food_name" : 1, "restaurant_name" : 1, "author_name" : 1, "hashtags" : 1, "num_upvotes" : 1
+        }))
+
+    def refresh_trending(self) -> None:
+
+        # only the ranked fields are needed (also restores reviews pushed off boards by lowered scores)
+        self.trending_board.rebuild(self.collection.find({}, {
+            "restaurant_name" : 1, "hashtags" : 1, "num_upvotes" : 1, "timestamp" : 1
+        }))
+
+    def refresh_changes(self) -> int:
+
+        changed_ids = self.change_journal.read_changes()
+
+        # changes may have expired unread (e.g. a long pause), so rebuild from every review instead
+        if (changed_ids is None):
+
+            self.refresh_search_index()
+
+            self.refresh_trending()
+
+            return 0
+
+        changed_ids = list(changed_ids)
+
+        for batch_start in range(0, len(changed_ids), self._CHANGE_BATCH_SIZE):
+
+            batch_ids = changed_ids[batch_start:(batch_start + self._CHANGE_BATCH_SIZE)]
+
+            # current state of changed reviews (searchable and ranked fields)
+            review_documents = { review_document["_id"] : review_document for review_document in self.collection.find(
+                { "_id" : { "$in" : batch_ids } }, {
+                    "food_name" : 1, "restaurant_name" : 1, "author_name" : 1, "hashtags" : 1, "num_upvotes" : 1, "timestamp" : 1
+                }
+            ) }
+
+            for review_id in batch_ids:
+
+                # removed meanwhile
+                if (review_id not in review_documents):
+                    self.search_engine.unindex_review(review_id)
+                    self.trending_board.remove_review(review_id)
+                    continue
+
+                # re-indexing replaces the stale entry (including its upvote count)
+                self.search_engine.index_review(review_documents[review_id])
+
+                self.trending_board.update_review(review_documents[review_id])
+
+        # return number of refreshed reviews
+        return len(changed_ids)
+
+    def refresh_typeahead(self, from_snapshot : Optional[ bool ] = False) -> None:
+
+        if (from_snapshot):
+
+            snapshot_document = self.snapshots.find_one({ "_id" : "typeahead" })
+
+            # starting workers reuse a recent snapshot instead of each reading every aggregate
+            #   Note: Names written after the snapshot was taken reappear on the next (periodic) rebuild.
+            if ((snapshot_document is not None) and (
+                TimeStamp.current_time() - TimeStamp.coerce(snapshot_document["built-at"]) < timedelta(seconds = self._TYPEAHEAD_SNAPSHOT_PERIOD)
+            )):
+                self.typeahead.load_snapshot(snapshot_document["data"])
+                return
+
+        # names weighted by number of reviews (one document per restaurant and per dish)
+        self.typeahead.rebuild(self.aggregate_manager.named_counts())
+
+        self.snapshots.update_one(
+            filter = { "_id"  : "typeahead" },
+            update = { "$set" : { "data" : self.typeahead.snapshot(), "built-at" : TimeStamp.current_time() } },
+            upsert = True
+        )
+
     def add_review(self, review : Review) -> None:
 
         # verify review has been correctly formatted
@@ -102,104 +431,393 @@ class ReviewManager:
         # add review to database
         self.collection.insert_one(document = review)
 
+        # make new review searchable (insertion assigns "_id")
+        self.search_engine.index_review(review)
+
+        # count new review towards its restaurant and dish
+        self.aggregate_manager.add_review(review)
+
+        # let new review compete on trending leaderboards
+        self.trending_board.update_review(review)
+
+        # suggest names of new review
+        self.typeahead.add_review(review)
+
+        # author's written list changed
+        self.list_versions.bump([ review["author_name"] ], [ "written" ])
+
+        # let other workers index new review
+        self.change_journal.record([ review["_id"] ])
+
     def remove_review(self, review_id : ObjectId) -> None:
 
-        # only remove existing reviews
-        if (self.review_exists(review_id)):
+        # remove review according to specified ID (keeping the aggregated fields)
+        review = self.collection.find_one_and_delete(filter = { "_id" : review_id }, projection = {
+            "restaurant_name" : 1, "food_name" : 1, "food_price" : 1, "food_rating" : 1, "service_rating" : 1, "recommend_rating" : 1,
+            "author_name"     : 1
+        })
+
+        # only clean up after existing reviews
+        if (review is not None):
+
+            # stop counting removed review towards its restaurant and dish
+            self.aggregate_manager.remove_review(review)
+
+            # remove upvotes of removed review
+            self.upvotes.delete_many(filter = { "review-id" : review_id })
+
+            # stop returning removed review in search results
+            self.search_engine.unindex_review(review_id)
 
-            # remove review according to specified ID
-            self.collection.delete_one(filter = { "_id" : review_id })
+            # stop ranking removed review
+            self.trending_board.remove_review(review_id)
+
+            # stop suggesting names without reviews
+            self.typeahead.remove_review(review)
+
+            # author's written list changed
+            self.list_versions.bump([ review["author_name"] ], [ "written" ])
+
+            # let other workers unindex removed review
+            self.change_journal.record([ review_id ])
+
+            # other lists holding removed review changed
+            for removal_listener in self.removal_listeners:
+                removal_listener(review_id)
+
+    def fetch_ratings(self, restaurant_name : str, food_name : Optional[ str ] = None) -> Optional[ Dict[ str, Any ] ]:
+
+        # restaurant-wide ratings if no food is specified
+        return self.aggregate_manager.fetch_aggregate(restaurant_name, food_name)
+
+    def suggest_names(self, prefix : str, kind : Optional[ str ] = None, limit : Optional[ int ] = 10) -> List[ Dict[ str, Any ] ]:
+
+        # restaurant and/or food names starting with (a word starting with) the prefix
+        return self.typeahead.suggest(prefix, kind, limit)
 
     def upvote_review(self, username : str, review_id : ObjectId) -> bool:
 
-        # check if user has already upvoted target review
-        upvoted = self.review_upvoted(username, review_id)
+        # flip upvote state atomically, creating it (as upvoted) on first click
+        #   Note: The unique (username, review-id) index prevents duplicate states.
+        upvote_document = self.upvotes.find_one_and_update(
+            filter          = { "username" : username, "review-id" : review_id },
+            update          = [ { "$set" : { "upvoted" : { "$not" : [ { "$ifNull" : [ "$upvoted", False ] } ] } } } ],
+            projection      = { "_id" : 0, "upvoted" : 1 },
+            upsert          = True,
+            return_document = ReturnDocument.AFTER
+        )
+
+        upvoted = upvote_document["upvoted"]
 
-        # condition to find specific review (by IDs)
-        review_filter = { "_id" : review_id }
+        # increment counter if upvoted, decrement it otherwise (returning the ranked fields)
+        review_document = self.collection.find_one_and_update(
+            filter          = { "_id"  : review_id },
+            update          = { "$inc" : { "num_upvotes" : ((1) if (upvoted) else (-1)) } },
+            projection      = { "restaurant_name" : 1, "hashtags" : 1, "num_upvotes" : 1, "timestamp" : 1 },
+            return_document = ReturnDocument.AFTER
+        )
 
-        # remove upvote if upvoted, add it otherwise
-        upvote_update = { (("$pull") if (upvoted) else ("$push")) : { "upvoters" : username } }
+        # re-rank review on trending leaderboards
+        if (review_document is not None):
+            self.trending_board.update_review(review_document)
 
-        # decrement counter if upvoted, increment it otherwise
-        upvote_update.update({ "$inc" : { "num_upvotes" : ((-1) if (upvoted) else (1)) } })
+        # upvoted state is shown on every list of the user
+        self.list_versions.bump([ username ])
 
-        # commit changes to database
-        self.collection.update_one(filter = review_filter, update = upvote_update)
+        # keep popularity used by search ranking in sync
+        self.search_engine.update_upvotes(review_id, ((1) if (upvoted) else (-1)))
+
+        # let other workers re-rank upvoted review
+        self.change_journal.record([ review_id ])
 
         # return (newest) upvote status
         #   1. True  => upvoted
         #   2. False => not upvoted
-        return not upvoted
+        return upvoted
 
     def review_upvoted(self, username : str, review_id : ObjectId) -> bool:
 
-        # fetch review information
-        review_information = self.collection.find_one(filter = { "_id" : review_id })
-
         # check if user has upvoted target review
-        return (username in review_information["upvoters"])
+        return (self.upvotes.find_one(
+            filter     = { "username" : username, "review-id" : review_id, "upvoted" : True }, 
+            projection = { "_id" : 1 }
+        ) is not None)
+
+    def upvoted_reviews(self, username : str, review_ids : List[ ObjectId ]) -> Set[ ObjectId ]:
+
+        # find which of the given reviews user has upvoted (in a single query)
+        return {
+            upvote_document["review-id"] for upvote_document in self.upvotes.find(
+                filter     = { "username" : username, "review-id" : { "$in" : list(review_ids) }, "upvoted" : True },
+                projection = { "_id" : 0, "review-id" : 1 }
+            )
+        }
 
     def review_exists(self, review_id : ObjectId) -> bool:
 
-        # check if review exists in database
-        return (self.collection.find_one(filter = { "_id" : review_id }) is not None)
+        # check if review exists in database (only the ID is returned)
+        return (self.collection.find_one(filter = { "_id" : review_id }, projection = { "_id" : 1 }) is not None)
 
-    def fetch_reviews_by_ids(self, id_list : List[ ObjectId ]) -> List[ Dict[ str, Any ] ]:
+    def _paginate(self, query_condition : Dict[ str, Any ], 
+                        page_size       : Optional[ int  ] = None, 
+                        cursor          : Optional[ str  ] = None, 
+                        with_total      : Optional[ bool ] = False,
+                        view            : Optional[ str  ] = None,
+                        hint            : Optional[ str  ] = None) -> ReviewPage:
+
+        # let the server pick an index unless the caller knows better
+        hint_options = (({ "hint" : hint }) if (hint is not None) else {})
+
+        # count matching reviews on the server without fetching them
+        total = (self.collection.count_documents(query_condition, **hint_options) if (with_total) else None)
+
+        page_size = ReviewPage.bound_page_size(page_size)
+
+        # continue after the last review of the previous page (newest first)
+        if (cursor is not None):
+            query_condition = { "$and" : [ query_condition, { "_id" : { "$lt" : ReviewPage.decode_cursor(cursor) } } ] }
+
+        review_cursor = self.collection.find(query_condition, Review.projection(view)).sort("_id", DESCENDING).limit(page_size + 1)
+
+        if (hint is not None):
+            review_cursor = review_cursor.hint(hint)
+
+        # fetch one extra review to know whether another page exists (only fields of requested view)
+        reviews = [ Review.simplify(review_document, view) for review_document in review_cursor ]
+
+        # next page starts after the last review of this page
+        next_cursor = (reviews[page_size - 1]["_id"] if (len(reviews) > page_size) else None)
+
+        return ReviewPage(reviews[:page_size], next_cursor, total)
+
+    def stream_reviews(self, query_condition : Dict[ str, Any ], 
+                             batch_size      : Optional[ int ] = None, 
+                             view            : Optional[ str ] = None) -> Iterator[ Dict[ str, Any ] ]:
+
+        if (batch_size is None):
+            batch_size = ReviewPage.MAX_PAGE_SIZE
+
+        # yield reviews one by one while the driver fetches them in batches
+        with self.collection.find(query_condition, Review.projection(view)).sort("_id", DESCENDING).batch_size(batch_size) as review_cursor:
+            for review_document in review_cursor:
+                yield Review.simplify(review_document, view)
+
+    def count_reviews(self, review_filter : ReviewCondition) -> int:
+
+        # count matching reviews on the server without fetching them
+        return self.collection.count_documents(self._build_filter(review_filter))
+
+    def fetch_reviews_by_ids(self, id_list    : List[ ObjectId ],
+                                   page_size  : Optional[ int  ] = None,
+                                   cursor     : Optional[ str  ] = None,
+                                   with_total : Optional[ bool ] = False,
+                                   view       : Optional[ str  ] = None) -> ReviewPage:
 
         # find reviews with matching ID, and remove sensitive attributes with "simplify" method
-        return list(map(Review.simplify, self.collection.find({ "_id" : { "$in" : id_list } })))
+        return self._paginate({ "_id" : { "$in" : id_list } }, page_size, cursor, with_total, view)
+
+    def describe_reviews(self, id_list : List[ ObjectId ]) -> Dict[ ObjectId, str ]:
+
+        # e.q. { ObjectId(...) : "Tonkotsu Ramen @ Ichiran" }
+        return {
+            review_document["_id"] : f"{review_document['food_name']} @ {review_document['restaurant_name']}" 
+                for review_document in self.collection.find(
+                    { "_id" : { "$in" : list(id_list) } }, { "food_name" : 1, "restaurant_name" : 1 }
+                )
+        }
+
+    def fetch_reviews_in_order(self, id_list : List[ ObjectId ], view : Optional[ str ] = None) -> List[ Dict[ str, Any ] ]:
+
+        # fetch matching reviews in a single query
+        found_reviews = { review["_id"] : review for review in self.stream_reviews({ "_id" : { "$in" : id_list } }, view = view) }
+
+        # restore order of given IDs (reviews removed meanwhile are skipped)
+        return [ found_reviews[str(review_id)] for review_id in id_list if (str(review_id) in found_reviews) ]
+
+    def _build_filter(self, review_filter : ReviewCondition) -> Dict[ str, Any ]:
+
+        assert isinstance(review_filter, ReviewCondition)
+
+        # compiled once per distinct condition (must not be modified)
+        return self.query_compiler.compile(review_filter)["filter"]
 
-    def fetch_reviews(self, review_filter : ReviewCondition) -> List[ Dict[ str, Any ] ]:
+    def explain_query(self, review_filter : ReviewCondition) -> Dict[ str, Any ]:
 
         assert isinstance(review_filter, ReviewCondition)
 
-        # instantiate query conditions
-        filter_conditions = dict()
+        # shape, hinted index and server plan of the compiled condition
+        return self.query_compiler.explain(review_filter)
 
-        for attribute_name, attribute_value in review_filter.items():
+    def fetch_reviews(self, review_filter : ReviewCondition,
+                            page_size     : Optional[ int  ] = None,
+                            cursor        : Optional[ str  ] = None,
+                            with_total    : Optional[ bool ] = False,
+                            view          : Optional[ str  ] = None) -> ReviewPage:
 
-            # skip if argument unspecified
-            if (attribute_value is None):
-                continue 
+        assert isinstance(review_filter, ReviewCondition)
 
-            # "strict matching" uses direct comparison
-            if (attribute_name in review_filter._STRICT_MATCHING):
+        compiled_query = self.query_compiler.compile(review_filter)
 
-                # e.q. { "field" : "value" }
-                query_rule = attribute_value 
+        # find reviews satisfying the criteria through the index chosen for the condition's shape
+        return self._paginate(compiled_query["filter"], page_size, cursor, with_total, view, compiled_query["hint"])
 
-            # "range matching" uses boundary comparison
-            elif (attribute_name in review_filter._RANGE_MATCHING):
+    def _format_facets(self, facet_document : Dict[ str, Any ]) -> Dict[ str, Any ]:
 
-                # e.q. { "field" : { "$gte" : lower_value, "$lte" : upper_value } }
-                query_rule = {
-                    "$gte" : attribute_value[0],
-                    "$lte" : attribute_value[1]
-                }
+        # (lower, upper) boundaries of each price band (upper is None for the open-ended band)
+        price_bands = list(zip(self._PRICE_BANDS, self._PRICE_BANDS[1:] + [ None ]))
 
-            # item matching checks if everything in target list is included
-            elif (attribute_name in review_filter._ITEM_MATCHING):
+        price_counts = { bucket["_id"] : bucket["count"] for bucket in facet_document["food_price"] }
 
-                # e.q. { "field" : { "$all" : [ value_1, value_2 ] } }
-                query_rule = {
-                    "$all" : list(attribute_value)
-                }
+        facets = {
+            "total"      : ((facet_document["total"][0]["count"]) if (len(facet_document["total"]) > 0) else (0)),
+            "hashtags"   : [ { "value" : bucket["_id"], "count" : bucket["count"] } for bucket in facet_document["hashtags"] ],
+            "food_price" : [ { "min" : lower, "max" : upper, "count" : price_counts.get(lower, 0) } for lower, upper in price_bands ]
+        }
+
+        # ratings are bounded to 1 ~ 5, so every value is listed (including zero counts)
+        for rating_field in self._FACET_RATING_FIELDS:
+            rating_counts = { bucket["_id"] : bucket["count"] for bucket in facet_document[rating_field] }
+            facets[rating_field] = { str(rating) : rating_counts.get(rating, 0) for rating in range(1, 6) }
+
+        return facets
+
+    def fetch_facets(self, review_filter : ReviewCondition,
+                           page_size     : Optional[ int ] = None,
+                           cursor        : Optional[ str ] = None,
+                           view          : Optional[ str ] = None) -> ReviewPage:
+
+        assert isinstance(review_filter, ReviewCondition)
+
+        compiled_query = self.query_compiler.compile(review_filter)
+
+        query_condition = compiled_query["filter"]
+
+        # same combination regardless of attribute and hashtag order
+        found, facets = self.facet_cache.get(compiled_query["key"])
+
+        # popular combination => only the page is fetched
+        if (found):
+
+            review_page = self._paginate(query_condition, page_size, cursor, False, view, compiled_query["hint"])
+
+            review_page.update({ "total" : facets["total"], "facets" : facets })
+
+            return review_page
+
+        page_size = ReviewPage.bound_page_size(page_size)
+
+        page_pipeline = [ { "$limit" : page_size + 1 }, { "$project" : Review.projection(view) } ]
+
+        # continue after the last review of the previous page (newest first)
+        if (cursor is not None):
+            page_pipeline.insert(0, { "$match" : { "_id" : { "$lt" : ReviewPage.decode_cursor(cursor) } } })
+
+        # count every facet and fetch the page in a single round trip
+        facet_document = next(self.collection.aggregate([
+            { "$match" : query_condition },
+            { "$sort"  : { "_id" : DESCENDING } },
+            { "$facet" : {
+                "data"       : page_pipeline,
+                "total"      : [ { "$count" : "count" } ],
+                "hashtags"   : [
+                    { "$unwind" : "$hashtags" },
+                    { "$group"  : { "_id" : "$hashtags", "count" : { "$sum" : 1 } } },
+                    { "$sort"   : { "count" : DESCENDING, "_id" : ASCENDING } },
+                    { "$limit"  : self._FACET_HASHTAG_LIMIT }
+                ],
+                "food_price" : [ { "$bucket" : {
+                    "groupBy" : "$food_price", "boundaries" : self._PRICE_BANDS, "default" : self._PRICE_BANDS[-1]
+                } } ],
+                **{ rating_field : [
+                    { "$group" : { "_id" : f"${rating_field}", "count" : { "$sum" : 1 } } }
+                ] for rating_field in self._FACET_RATING_FIELDS }
+            } }
+        ]))
+
+        facets = self._format_facets(facet_document)
+
+        self.facet_cache.put(compiled_query["key"], facets)
+
+        reviews = [ Review.simplify(review_document, view) for review_document in facet_document["data"] ]
+
+        # next page starts after the last review of this page
+        next_cursor = (reviews[page_size - 1]["_id"] if (len(reviews) > page_size) else None)
+
+        review_page = ReviewPage(reviews[:page_size], next_cursor, facets["total"])
+
+        review_page["facets"] = facets
+
+        return review_page
+
+    def search_reviews(self, search_string : str,
+                             page_size     : Optional[ int ] = None,
+                             cursor        : Optional[ str ] = None,
+                             view          : Optional[ str ] = None) -> ReviewPage:
+
+        page_size = ReviewPage.bound_page_size(page_size)
+
+        # search results are ranked, so the cursor is the rank offset
+        offset = (ReviewPage.decode_offset(cursor) if (cursor is not None) else 0)
+
+        # obtain review IDs ranked by relevance and popularity (one extra to detect another page)
+        ranked_ids = self.search_engine.search(search_string, offset + page_size + 1)
+
+        page_ids = ranked_ids[offset:(offset + page_size)]
+
+        # fetch matching reviews in ranking order
+        reviews = self.fetch_reviews_in_order(page_ids, view)
+
+        next_cursor = (str(offset + page_size) if (len(ranked_ids) > offset + page_size) else None)
+
+        return ReviewPage(reviews, next_cursor)
+
+    def trending_reviews(self, restaurant_name : Optional[ str ] = None,
+                               hashtag         : Optional[ str ] = None,
+                               page_size       : Optional[ int ] = None,
+                               cursor          : Optional[ str ] = None,
+                               view            : Optional[ str ] = None) -> ReviewPage:
+
+        # at most one of restaurant and hashtag narrows the leaderboard
+        assert ((restaurant_name is None) or (hashtag is None))
+
+        if (restaurant_name is not None):
+            board_key = ("restaurant", restaurant_name)
+
+        elif (hashtag is not None):
+            board_key = ("hashtag", hashtag)
+
+        else:
+            board_key = TrendingBoard.GLOBAL_BOARD
+
+        page_size = ReviewPage.bound_page_size(page_size)
+
+        # leaderboards are ranked, so the cursor is the rank offset
+        offset = (ReviewPage.decode_offset(cursor) if (cursor is not None) else 0)
+
+        # obtain review IDs ranked by decayed popularity (one extra to detect another page)
+        ranked_entries = self.trending_board.top(board_key, offset + page_size + 1)
+
+        page_entries = ranked_entries[offset:(offset + page_size)]
+
+        # fetch ranked reviews in ranking order
+        reviews = self.fetch_reviews_in_order([ review_id for review_id, _ in page_entries ], view)
 
-            else:
+        trending_scores = dict(page_entries)
 
-                # raise an exception on unexpected attribute name
-                raise Exception(f"Invalid field name for review searching: {repr(attribute_name)}\n")
+        for review in reviews:
+            review["trending-score"] = round(trending_scores[ObjectId(review["_id"])], 4)
 
-            # apply the rule
-            filter_conditions[attribute_name] = query_rule
+        next_cursor = (str(offset + page_size) if (len(ranked_entries) > offset + page_size) else None)
 
-        # find reviews satisfying the criteria, and remove sensitive attributes with "simplify" method
-        return list(map(Review.simplify, self.collection.find(filter_conditions)))
+        return ReviewPage(reviews, next_cursor)
 
-    def _advanced_query(self, query_condition : dict) -> List[ Dict[ str, Any ] ]:
+    def _advanced_query(self, query_condition : dict,
+                              page_size       : Optional[ int  ] = None,
+                              cursor          : Optional[ str  ] = None,
+                              with_total      : Optional[ bool ] = False,
+                              view            : Optional[ str  ] = None) -> ReviewPage:
 
-        return list(map(Review.simplify, self.collection.find(query_condition)))
+        return self._paginate(query_condition, page_size, cursor, with_total, view)
 
 if (__name__ == "__main__"):
 
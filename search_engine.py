@@ -0,0 +1,239 @@
+from collections import defaultdict
+from bson.objectid import ObjectId
+from typing import *
+import unicodedata, threading, heapq, math, time, re
+
+def tokenize(text : str) -> List[ str ]:
+
+    # decompose accented characters (e.g. "é" => "e" + "´")
+    decomposed = unicodedata.normalize("NFKD", str(text))
+
+    # drop combining marks, then fold case
+    folded = "".join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+    # split on anything that is not a letter or a digit
+    return [ token for token in re.split(r"[\W_]+", folded) if (token != "") ]
+
+class SearchEngine:
+
+    # searchable review fields and their relevance weights
+    _FIELD_WEIGHTS = {
+        "food_name"       : 3.0,
+        "restaurant_name" : 2.0,
+        "hashtags"        : 1.5,
+        "author_name"     : 1.0
+    }
+
+    # BM25 term frequency saturation
+    _BM25_K1 = 1.2
+
+    # BM25 document length normalization
+    _BM25_B = 0.75
+
+    # weight of upvote popularity in the final score
+    _UPVOTE_WEIGHT = 0.25
+
+    # default number of results returned
+    _DEFAULT_TOP_K = 50
+
+    def __init__(self) -> None:
+
+        # guards every index structure below
+        self.lock = threading.RLock()
+
+        # token => { review ID => weighted term frequency }
+        self.postings = defaultdict(dict)
+
+        # review ID => (tokens, weighted document length)
+        self.documents = dict()
+
+        # review ID => number of upvotes
+        self.upvotes = dict()
+
+        # sum of all weighted document lengths
+        self.total_length = 0.0
+
+        # time of the last full rebuild
+        self.built_at = None
+
+        # allows a single rebuild at a time
+        self.rebuild_lock = threading.Lock()
+
+        # writes made while a rebuild reads the collection (None when no rebuild is running)
+        #   Note: They are replayed onto the fresh index, which may not have read them.
+        self.pending_writes = None
+
+    @classmethod
+    def _weighted_terms(class_, review_document : Dict[ str, Any ]) -> Dict[ str, float ]:
+
+        weighted_terms = defaultdict(float)
+
+        for field_name, field_weight in class_._FIELD_WEIGHTS.items():
+
+            field_value = review_document.get(field_name, None)
+
+            # skip if field is missing
+            if (field_value is None):
+                continue
+
+            # hashtags are stored as a list of strings
+            if isinstance(field_value, (list, tuple)):
+                field_value = " ".join(map(str, field_value))
+
+            # accumulate weighted term frequency per token
+            for token in tokenize(field_value):
+                weighted_terms[token] += field_weight
+
+        return weighted_terms
+
+    def index_review(self, review_document : Dict[ str, Any ]) -> None:
+
+        review_id = review_document["_id"]
+
+        weighted_terms = self._weighted_terms(review_document)
+
+        with self.lock:
+
+            if (self.pending_writes is not None):
+                self.pending_writes.append(("index_review", review_document))
+
+            # drop the stale entry if review is re-indexed
+            self._unindex(review_id)
+
+            document_length = sum(weighted_terms.values())
+
+            for token, term_frequency in weighted_terms.items():
+                self.postings[token][review_id] = term_frequency
+
+            self.documents[review_id] = (tuple(weighted_terms), document_length)
+
+            self.upvotes[review_id] = review_document.get("num_upvotes", 0)
+
+            self.total_length += document_length
+
+    def _unindex(self, review_id : ObjectId) -> None:
+
+        # nothing to do for unknown reviews
+        if (review_id not in self.documents):
+            return
+
+        tokens, document_length = self.documents.pop(review_id)
+
+        for token in tokens:
+
+            postings = self.postings[token]
+
+            postings.pop(review_id, None)
+
+            # drop empty posting lists to keep the vocabulary small
+            if (len(postings) == 0):
+                del self.postings[token]
+
+        self.upvotes.pop(review_id, None)
+
+        self.total_length -= document_length
+
+    def unindex_review(self, review_id : ObjectId) -> None:
+
+        with self.lock:
+
+            if (self.pending_writes is not None):
+                self.pending_writes.append(("unindex_review", review_id))
+
+            self._unindex(review_id)
+
+    def update_upvotes(self, review_id : ObjectId, increment : int) -> None:
+
+        with self.lock:
+
+            if (self.pending_writes is not None):
+                self.pending_writes.append(("update_upvotes", review_id, increment))
+
+            # only track indexed reviews
+            if (review_id in self.upvotes):
+                self.upvotes[review_id] = max(0, self.upvotes[review_id] + increment)
+
+    def rebuild(self, review_documents : Callable[ [], Iterable[ Dict[ str, Any ] ] ]) -> bool:
+
+        # another thread is rebuilding already
+        if not (self.rebuild_lock.acquire(blocking = False)):
+            return False
+
+        try:
+
+            # record writes from here on (so the read below cannot miss any)
+            with self.lock:
+                self.pending_writes = []
+
+            # build a fresh index aside, then swap it in
+            fresh_engine = SearchEngine()
+
+            for review_document in review_documents():
+                fresh_engine.index_review(review_document)
+
+            with self.lock:
+
+                # replay recorded writes (re-indexing and unindexing are idempotent)
+                #   Note: An upvote both read and replayed is counted twice until the next rebuild.
+                for method_name, *arguments in self.pending_writes:
+                    getattr(fresh_engine, method_name)(*arguments)
+
+                self.postings     = fresh_engine.postings
+                self.documents    = fresh_engine.documents
+                self.upvotes      = fresh_engine.upvotes
+                self.total_length = fresh_engine.total_length
+                self.built_at     = time.monotonic()
+
+        finally:
+
+            with self.lock:
+                self.pending_writes = None
+
+            self.rebuild_lock.release()
+
+        return True
+
+    def search(self, search_string : str, top_k : Optional[ int ] = None) -> List[ ObjectId ]:
+
+        if (top_k is None):
+            top_k = self._DEFAULT_TOP_K
+
+        # de-duplicate query tokens
+        query_tokens = set(tokenize(search_string))
+
+        scores = defaultdict(float)
+
+        with self.lock:
+
+            num_documents = len(self.documents)
+
+            # nothing to rank against
+            if ((num_documents == 0) or (len(query_tokens) == 0)):
+                return []
+
+            average_length = (self.total_length / num_documents)
+
+            for token in query_tokens:
+
+                postings = self.postings.get(token, None)
+
+                # token does not appear in any review
+                if (postings is None):
+                    continue
+
+                # inverse document frequency (BM25 variant, always positive)
+                inverse_frequency = math.log(1.0 + (num_documents - len(postings) + 0.5) / (len(postings) + 0.5))
+
+                for review_id, term_frequency in postings.items():
+
+                    # length-normalized saturation
+                    normalizer = self._BM25_K1 * (1.0 - self._BM25_B + self._BM25_B * self.documents[review_id][1] / average_length)
+
+                    scores[review_id] += inverse_frequency * (term_frequency * (self._BM25_K1 + 1.0)) / (term_frequency + normalizer)
+
+            # blend relevance with (log-damped) popularity
+            ranked = heapq.nlargest(top_k, scores.items(), key = lambda item : (
+                item[1] * (1.0 + self._UPVOTE_WEIGHT * math.log1p(self.upvotes.get(item[0], 0)))
+            ))
+
+        return [ review_id for review_id, _ in ranked ]
@@ -0,0 +1,187 @@
+from flask import Flask, current_app
+from werkzeug.local import LocalProxy
+from typing import *
+import threading, time, os
+
+# key of the registry in "app.extensions"
+EXTENSION_NAME = "food-fellow-services"
+
+class ServiceRegistry:
+
+    def __init__(self, app : Flask, builders : Dict[ str, Callable[ [ "ServiceRegistry" ], Any ] ]) -> None:
+
+        # application the services are configured by
+        self.app = app
+
+        # component name => function building it (in warm-up order, copied so registries can be extended independently)
+        self.builders = dict(builders)
+
+        # time (in seconds) "create_app" took (reported along with component builds)
+        self.app_elapsed = None
+
+        self.reset()
+
+    def reset(self) -> None:
+
+        # process the components below belong to
+        #   Note: Clients, sockets and threads do not survive a fork, so a child builds its own.
+        self.pid = os.getpid()
+
+        # component name => component
+        self.components = dict()
+
+        # component name => time (in seconds) spent building it (excluding components it required)
+        self.timings = dict()
+
+        # time spent building required components, one entry per build in progress
+        self.nested = []
+
+        # whether every component has been built
+        self.warm = False
+
+        # guards builds (a component may require others while being built)
+        self.lock = threading.RLock()
+
+    def get(self, name : str) -> Any:
+
+        # forked since the components were built => start over
+        if (self.pid != os.getpid()):
+            self.reset()
+
+        component = self.components.get(name, None)
+
+        if (component is not None):
+            return component
+
+        with self.lock:
+
+            # built by another thread meanwhile
+            if (name in self.components):
+                return self.components[name]
+
+            start_time = time.perf_counter()
+
+            self.nested.append(0.0)
+
+            try:
+                component = self.builders[name](self)
+
+            finally:
+                nested_elapsed = self.nested.pop()
+
+            elapsed = time.perf_counter() - start_time
+
+            self.timings[name] = elapsed - nested_elapsed
+
+            # charge the build to the component requiring it only once
+            if (len(self.nested) > 0):
+                self.nested[-1] += elapsed
+
+            self.components[name] = component
+
+        return component
+
+    def __getattr__(self, name : str) -> Any:
+
+        # e.q. services.review_manager
+        if (name in self.__dict__.get("builders", dict())):
+            return self.get(name)
+
+        raise AttributeError(name)
+
+    def register(self, name : str, builder : Callable[ [ "ServiceRegistry" ], Any ]) -> None:
+
+        # add a component (e.g. one only another serving mode needs)
+        self.builders[name] = builder
+
+    def is_warm(self) -> bool:
+
+        # every component of this process has been built
+        return ((self.warm) and (self.pid == os.getpid()))
+
+    def warm_up(self) -> None:
+
+        if (self.is_warm()):
+            return
+
+        for name in self.builders:
+            self.get(name)
+
+        self.warm = True
+
+        self.app.logger.info(self.format_report())
+
+    def startup_report(self) -> Dict[ str, Any ]:
+
+        return {
+            "pid"        : self.pid,
+            "app"        : self.app_elapsed,
+            "components" : { name : self.timings[name] for name in self.builders if (name in self.timings) },
+            "total"      : sum(self.timings.values())
+        }
+
+    def format_report(self) -> str:
+
+        report = self.startup_report()
+
+        # e.q. "startup (pid 42): review_manager 812.4 ms, ..."
+        components = ", ".join(f"{name} {elapsed * 1e3:.1f} ms" for name, elapsed in report["components"].items())
+
+        return f"startup (pid {report['pid']}): create_app {(report['app'] or 0.0) * 1e3:.1f} ms | {components} | total {report['total'] * 1e3:.1f} ms"
+
+def current_services() -> ServiceRegistry:
+
+    # registry of the application handling the current request
+    return current_app.extensions[EXTENSION_NAME]
+
+def service_proxy(name : str) -> LocalProxy:
+
+    # stands for a component of the current application (built on first use)
+    return LocalProxy(lambda : current_services().get(name))
+
+if (__name__ == "__main__"):
+
+    # startup cost of the previous (eager, import-time) wiring against the factory
+    import argparse, subprocess, sys
+
+    parser = argparse.ArgumentParser(description = "Report Food-Fellow startup timings.")
+
+    parser.add_argument("--mongo-uri", default = "mongodb://localhost:27017/food-fellow")
+
+    arguments = parser.parse_args()
+
+    # fresh interpreter each time (modules are only imported once per process)
+    def run_python(code : str) -> float:
+
+        start_time = time.perf_counter()
+
+        subprocess.run([ sys.executable, "-c", code ], check = True, cwd = os.path.dirname(os.path.abspath(__file__)))
+
+        return time.perf_counter() - start_time
+
+    baseline_elapsed = run_python("pass")
+
+    print(f"import app             | {(run_python('import app') - baseline_elapsed) * 1e3:8.1f} ms (interpreter start excluded)")
+
+    from app import create_app
+
+    start_time = time.perf_counter()
+
+    app = create_app({ "MONGO_URI" : arguments.mongo_uri, "SECRET_KEY" : "benchmark", "MAINTENANCE_ENABLED" : False })
+
+    print(f"create_app             | {(time.perf_counter() - start_time) * 1e3:8.1f} ms (no connection opened)")
+
+    services = app.extensions[EXTENSION_NAME]
+
+    # first request of a worker builds every component
+    try:
+
+        services.warm_up()
+
+        for name, elapsed in services.startup_report()["components"].items():
+            print(f"  {name:<20} | {elapsed * 1e3:8.1f} ms")
+
+        print(f"first request (warm-up)| {services.startup_report()['total'] * 1e3:8.1f} ms")
+
+    except (Exception) as error:
+        print(f"warm-up skipped: {error.__class__.__name__}")
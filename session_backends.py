@@ -0,0 +1,322 @@
+from flask import Flask, Request, Response
+from flask.sessions import SessionInterface, SessionMixin, SecureCookieSessionInterface
+from werkzeug.datastructures import CallbackDict
+from pymongo.collection import Collection
+from pymongo import ASCENDING
+from cache_utils import LRUCache
+from index_utils import IndexUtils
+from time_utils import TimeStamp
+from typing import *
+import secrets, re
+
+def session_empty(session : Optional[ SessionMixin ]) -> bool:
+
+    # Flask marks permanent sessions with a "_permanent" key, which is not user data
+    return ((session is None) or all(key == "_permanent" for key in session))
+
+class ServerSession(CallbackDict, SessionMixin):
+
+    def __init__(self, initial : Optional[ Dict[ str, Any ] ] = None, session_id : Optional[ str ] = None, expires_at : Optional[ Any ] = None) -> None:
+
+        def on_update(session : "ServerSession") -> None:
+            session.modified = True
+
+        super(ServerSession, self).__init__(initial, on_update)
+
+        # random, server-issued session ID (stored in the cookie)
+        self.session_id = session_id
+
+        # time the stored session expires (None if not stored yet)
+        self.expires_at = expires_at
+
+        # whether the session has not been stored yet
+        self.new = (expires_at is None)
+
+        self.modified = False
+
+class MongoSessionInterface(SessionInterface, IndexUtils):
+
+    # session collection name
+    _SESSION_COLLECTION_NAME = "sessions"
+
+    # server-issued session IDs (client-chosen IDs are never accepted)
+    _SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{43}$")
+
+    # indexes required by session queries
+    #   Note: MongoDB removes sessions once "expires-at" has passed (checked about once a minute).
+    _INDEXES = {
+        "collection" : [
+            ( [ ("expires-at", ASCENDING) ], { "expireAfterSeconds" : 0 } )
+        ]
+    }
+
+    def __init__(self, collection : Collection, front_cache : Optional[ LRUCache ] = None) -> None:
+
+        # collection containing one document per session
+        self.collection = collection
+
+        # in-process cache of session ID => (session data, expiry) in front of MongoDB
+        #   Note: Its time to live bounds how long a logout on another worker goes unseen here.
+        self.front_cache = front_cache
+
+    def _load(self, session_id : str) -> Optional[ Tuple[ Dict[ str, Any ], Any ] ]:
+
+        if (self.front_cache is not None):
+
+            found, entry = self.front_cache.get(session_id)
+
+            if (found):
+                return entry
+
+        # expired sessions may outlive their expiry until the TTL monitor runs
+        session_document = self.collection.find_one({ "_id" : session_id, "expires-at" : { "$gt" : TimeStamp.current_time() } })
+
+        entry = ((None) if (session_document is None) else ((session_document["data"], TimeStamp.coerce(session_document["expires-at"]))))
+
+        if ((self.front_cache is not None) and (entry is not None)):
+            self.front_cache.put(session_id, entry)
+
+        return entry
+
+    def open_session(self, app : Flask, request : Request) -> ServerSession:
+
+        session_id = request.cookies.get(self.get_cookie_name(app), "")
+
+        entry = (self._load(session_id) if (self._SESSION_ID_PATTERN.match(session_id)) else None)
+
+        # unknown, expired or malformed => fresh session under a new ID
+        if (entry is None):
+            return ServerSession(session_id = secrets.token_urlsafe(32))
+
+        return ServerSession(dict(entry[0]), session_id, entry[1])
+
+    def save_session(self, app : Flask, session : ServerSession, response : Response) -> None:
+
+        cookie_name, cookie_domain, cookie_path = self.get_cookie_name(app), self.get_cookie_domain(app), self.get_cookie_path(app)
+
+        # emptied session (e.g. logout) => forget it
+        if (session_empty(session)):
+
+            if not (session.new):
+
+                self.collection.delete_one({ "_id" : session.session_id })
+
+                if (self.front_cache is not None):
+                    self.front_cache.invalidate(session.session_id)
+
+                response.delete_cookie(cookie_name, domain = cookie_domain, path = cookie_path)
+
+            return
+
+        lifetime = app.permanent_session_lifetime
+
+        # store only when changed or past half of its lifetime (unchanged sessions cost no write)
+        if (session.modified or (session.expires_at is None) or (session.expires_at - TimeStamp.current_time() < lifetime / 2)):
+
+            expires_at = TimeStamp.current_time() + lifetime
+
+            self.collection.update_one(
+                filter = { "_id"  : session.session_id },
+                update = { "$set" : { "data" : dict(session), "expires-at" : expires_at } },
+                upsert = True
+            )
+
+            if (self.front_cache is not None):
+                self.front_cache.put(session.session_id, (dict(session), expires_at))
+
+            response.set_cookie(
+                cookie_name, session.session_id, expires = self.get_expiration_time(app, session),
+                httponly = self.get_cookie_httponly(app), domain = cookie_domain, path = cookie_path,
+                secure = self.get_cookie_secure(app), samesite = self.get_cookie_samesite(app)
+            )
+
+class MigratingSessionInterface(SessionInterface):
+
+    def __init__(self, target : SessionInterface, legacy : SessionInterface) -> None:
+
+        # backend every session is stored in from now on
+        self.target = target
+
+        # backend live sessions are read from (once) until they expire
+        self.legacy = legacy
+
+    def open_session(self, app : Flask, request : Request) -> Optional[ SessionMixin ]:
+
+        session = self.target.open_session(app, request)
+
+        # known to the new backend
+        if ((session is None) or not (session_empty(session))):
+            return session
+
+        legacy_session = self.legacy.open_session(app, request)
+
+        # copy a live legacy session (modifying it makes the new backend store it and reissue the cookie)
+        if not (session_empty(legacy_session)):
+            session.update(dict(legacy_session))
+
+        return session
+
+    def save_session(self, app : Flask, session : SessionMixin, response : Response) -> None:
+
+        self.target.save_session(app, session, response)
+
+class DeferredSessionInterface(SessionInterface):
+
+    def __init__(self, get_interface : Callable[ [], SessionInterface ]) -> None:
+
+        # returns the session interface of the current process (built on first request)
+        #   Note: Building it at startup would open database connections before workers fork.
+        self.get_interface = get_interface
+
+    def open_session(self, app : Flask, request : Request) -> Optional[ SessionMixin ]:
+
+        return self.get_interface().open_session(app, request)
+
+    def save_session(self, app : Flask, session : SessionMixin, response : Response) -> None:
+
+        self.get_interface().save_session(app, session, response)
+
+# session backends selectable through the "SESSION_BACKEND" setting
+SESSION_BACKENDS = ( "cookie", "mongodb" )
+
+# secret keys anyone can read (formerly the default), refused like a missing one
+PUBLIC_SECRET_KEYS = ( "super-duper-secret-key", )
+
+def create_session_interface(app : Flask, database : Any) -> SessionInterface:
+
+    backend = app.config.get("SESSION_BACKEND", "mongodb")
+
+    if (backend not in SESSION_BACKENDS):
+        raise ValueError(f"Invalid session backend: {repr(backend)}")
+
+    # signed cookies (and migrated legacy sessions) could be forged for any username with a known key
+    if ((app.config.get("SECRET_KEY") in (None, "")) or (app.config.get("SECRET_KEY") in PUBLIC_SECRET_KEYS)):
+        raise ValueError("SECRET_KEY is unset or public: set SESSION_SECRET_KEY to a random value (e.g. \"python -c 'import secrets; print(secrets.token_hex(32))'\")")
+
+    # signed stateless cookie (the session only holds the username)
+    if (backend == "cookie"):
+        session_interface = SecureCookieSessionInterface()
+
+    # shared MongoDB store, optionally behind an in-process LRU cache
+    else:
+
+        front_cache_size = app.config.get("SESSION_FRONT_CACHE_SIZE", 10000)
+
+        session_interface = MongoSessionInterface(
+            getattr(database.db, MongoSessionInterface._SESSION_COLLECTION_NAME),
+            ((LRUCache(front_cache_size, app.config.get("SESSION_FRONT_CACHE_TIME_TO_LIVE", 5))) if (front_cache_size > 0) else (None))
+        )
+
+        session_interface.ensure_indexes()
+
+    # keep users of the previous (Flask-Session) backend logged in
+    if (app.config.get("SESSION_MIGRATE_FROM") is not None):
+
+        from flask_session import Session
+
+        legacy_app = Flask(app.import_name)
+
+        legacy_app.config.update(app.config)
+
+        legacy_app.config["SESSION_TYPE"] = app.config["SESSION_MIGRATE_FROM"]
+
+        # Flask-Session only exposes its backends by installing them on an app
+        Session(legacy_app)
+
+        session_interface = MigratingSessionInterface(session_interface, legacy_app.session_interface)
+
+    return session_interface
+
+if (__name__ == "__main__"):
+
+    # per-request session overhead (open + save of a logged-in session) of each backend
+    from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
+    from types import SimpleNamespace
+    from http.cookies import SimpleCookie
+    import argparse, tempfile, time
+
+    parser = argparse.ArgumentParser(description = "Benchmark per-request session overhead.")
+
+    parser.add_argument("--mongo-uri", default = "mongodb://localhost:27017/food-fellow-benchmark")
+
+    parser.add_argument("--num-requests", type = int, default = 2000)
+
+    arguments = parser.parse_args()
+
+    app = Flask(__name__)
+
+    app.config.update(SECRET_KEY = "benchmark", SESSION_FILE_DIR = tempfile.mkdtemp())
+
+    def filesystem_interface() -> SessionInterface:
+
+        legacy_app = Flask(__name__)
+
+        legacy_app.config.update(app.config, SESSION_TYPE = "filesystem")
+
+        from flask_session import Session
+
+        Session(legacy_app)
+
+        return legacy_app.session_interface
+
+    settings = [ ("filesystem (current)", filesystem_interface), ("signed cookie", SecureCookieSessionInterface) ]
+
+    try:
+
+        client = MongoClient(arguments.mongo_uri, serverSelectionTimeoutMS = 2000)
+
+        client.admin.command("ping")
+
+        database = SimpleNamespace(db = client.get_default_database())
+
+        settings += [
+            ("mongodb",                lambda : MongoSessionInterface(database.db.sessions)),
+            ("mongodb + front cache",  lambda : MongoSessionInterface(database.db.sessions, LRUCache(10000, 5)))
+        ]
+
+    except (PyMongoError) as error:
+        print(f"mongodb skipped: {error.__class__.__name__}")
+
+    start_time = time.perf_counter()
+
+    # cost of the benchmark loop itself (request context without a session)
+    for _ in range(arguments.num_requests):
+        with app.test_request_context("/", headers = { "Cookie" : "session=x" }):
+            pass
+
+    print(f"{'(no session)':<22} | {(time.perf_counter() - start_time) * 1e6 / arguments.num_requests:8.1f} us/request")
+
+    for setting_name, make_interface in settings:
+
+        session_interface = make_interface()
+
+        # log in once, keeping the issued cookie
+        with app.test_request_context("/") as context:
+
+            session = session_interface.open_session(app, context.request)
+
+            session["username"] = "someone@example.com"
+
+            response = app.response_class()
+
+            session_interface.save_session(app, session, response)
+
+            cookie = SimpleCookie(response.headers["Set-Cookie"])
+
+        cookie_header = "; ".join(f"{name}={morsel.value}" for name, morsel in cookie.items())
+
+        start_time = time.perf_counter()
+
+        # typical request: read the username, change nothing
+        for _ in range(arguments.num_requests):
+
+            with app.test_request_context("/", headers = { "Cookie" : cookie_header }) as context:
+
+                session = session_interface.open_session(app, context.request)
+
+                assert (session["username"] == "someone@example.com")
+
+                session_interface.save_session(app, session, app.response_class())
+
+        print(f"{setting_name:<22} | {(time.perf_counter() - start_time) * 1e6 / arguments.num_requests:8.1f} us/request")
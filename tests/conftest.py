@@ -0,0 +1,42 @@
+from types import SimpleNamespace
+import pytest, uuid, sys, os
+
+# modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+mongomock = pytest.importorskip("mongomock")
+
+# MongoDB server to run against (e.g. "mongodb://localhost:27017"), mongomock if unset
+#   Note: mongomock does not apply pipeline updates, so tests relying on them only run against a server.
+TEST_MONGO_URI = os.environ.get("FOOD_FELLOW_TEST_MONGO_URI", None)
+
+@pytest.fixture
+def database() -> SimpleNamespace:
+
+    if (TEST_MONGO_URI is None):
+
+        # managers access collections through "database.db" (as with Flask-PyMongo)
+        yield SimpleNamespace(db = mongomock.MongoClient().get_database("food-fellow-test"))
+
+        return
+
+    from pymongo import MongoClient
+
+    client = MongoClient(TEST_MONGO_URI, tz_aware = True)
+
+    # fresh database per test
+    database_name = f"food-fellow-test-{uuid.uuid4().hex[:12]}"
+
+    yield SimpleNamespace(db = client.get_database(database_name))
+
+    client.drop_database(database_name)
+
+    client.close()
+
+@pytest.fixture
+def server_database(database) -> SimpleNamespace:
+
+    if (TEST_MONGO_URI is None):
+        pytest.skip("pipeline updates need a MongoDB server (set FOOD_FELLOW_TEST_MONGO_URI)")
+
+    return database
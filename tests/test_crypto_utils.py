@@ -0,0 +1,83 @@
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from crypto_utils import CryptoUtils, TokenKeyring
+import base64, time, pytest
+
+PAYLOAD = { "username" : "alice@example.com", "password" : "correct horse battery staple" }
+
+def make_keyring(*key_ids : int) -> TokenKeyring:
+
+    # first ID signs
+    return TokenKeyring({ key_id : AESGCM.generate_key(bit_length = 256) for key_id in key_ids }, key_ids[0])
+
+def test_token_round_trip():
+
+    crypto_utils = CryptoUtils(make_keyring(0))
+
+    success, token = crypto_utils._encrypt_data(PAYLOAD, 600)
+
+    assert (success)
+
+    assert (crypto_utils._decrypt_data(token) == (True, PAYLOAD))
+
+def test_expired_token_is_rejected(monkeypatch):
+
+    crypto_utils = CryptoUtils(make_keyring(0))
+
+    _, token = crypto_utils._encrypt_data(PAYLOAD, 60)
+
+    issued_at = time.time()
+
+    # two minutes later
+    monkeypatch.setattr(time, "time", lambda : issued_at + 120)
+
+    assert (crypto_utils._decrypt_data(token) == (False, None))
+
+def test_tampered_token_is_rejected():
+
+    crypto_utils = CryptoUtils(make_keyring(0))
+
+    _, token = crypto_utils._encrypt_data(PAYLOAD, 600)
+
+    raw_token = bytearray(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+
+    # extend the (authenticated) expiry
+    raw_token[5] ^= 0x01
+
+    assert (crypto_utils._decrypt_data(base64.urlsafe_b64encode(bytes(raw_token)).decode("ascii").rstrip("=")) == (False, None))
+
+def test_rotated_keys():
+
+    old_keyring = make_keyring(1)
+
+    _, token = CryptoUtils(old_keyring)._encrypt_data(PAYLOAD, 600)
+
+    # key 2 signs from now on, key 1 still decrypts outstanding tokens
+    rotated_keyring = TokenKeyring({ 2 : AESGCM.generate_key(bit_length = 256), 1 : old_keyring.keys[1] }, 2)
+
+    assert (CryptoUtils(rotated_keyring)._decrypt_data(token) == (True, PAYLOAD))
+
+    _, new_token = CryptoUtils(rotated_keyring)._encrypt_data(PAYLOAD, 600)
+
+    # tokens of a retired key are rejected
+    assert (CryptoUtils(TokenKeyring({ 2 : rotated_keyring.keys[2] }, 2))._decrypt_data(token) == (False, None))
+
+    assert (CryptoUtils(TokenKeyring({ 2 : rotated_keyring.keys[2] }, 2))._decrypt_data(new_token) == (True, PAYLOAD))
+
+def test_keyring_parses_keys_in_signing_order():
+
+    keys_string = ",".join(f"{key_id}:" + base64.urlsafe_b64encode(bytes([ key_id ]) * 32).decode("ascii") for key_id in (3, 2))
+
+    keyring = TokenKeyring.parse(keys_string)
+
+    assert ((keyring.current_id == 3) and (sorted(keyring.keys) == [ 2, 3 ]))
+
+def test_key_file_inside_the_source_directory_is_refused():
+
+    with pytest.raises(ValueError):
+        TokenKeyring.from_file(TokenKeyring.SOURCE_DIRECTORY + "/.token-keys")
+
+def test_key_file_is_created_once(tmp_path):
+
+    file_path = str(tmp_path / "keys" / "token-keys")
+
+    assert (TokenKeyring.from_file(file_path).keys == TokenKeyring.from_file(file_path).keys)
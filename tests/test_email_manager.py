@@ -0,0 +1,35 @@
+from email_manager import MongoOutbox, EmailMessage
+
+def test_outbox_indexes_and_claims_due_messages(database):
+
+    outbox = MongoOutbox(database.db["email-outbox"])
+
+    assert ("email-outbox.status_1_due_1" in outbox.ensure_indexes())
+
+    outbox.put(EmailMessage("alice@example.com", "subject", "body"))
+
+    message = outbox.claim(timeout = 0)
+
+    assert ((message is not None) and (message["status"] == "sending"))
+
+    # claimed, so not handed out again before its lease expires
+    assert (outbox.claim(timeout = 0) is None)
+
+def test_dead_messages_expire(database):
+
+    outbox = MongoOutbox(database.db["email-outbox"])
+
+    outbox.ensure_indexes()
+
+    outbox.put(EmailMessage("alice@example.com", "subject", "body"))
+
+    message = outbox.claim(timeout = 0)
+
+    outbox.bury({ **message, "error" : "mailbox unavailable" })
+
+    # dead letters carry the time the TTL index removes them from
+    assert all((dead_letter["dead-at"] is not None) for dead_letter in outbox.dead_letters())
+
+    assert (len(outbox.dead_letters()) == 1)
+
+    assert (database.db["email-outbox"].index_information()["dead-at_1"]["expireAfterSeconds"] == MongoOutbox._DEAD_LETTER_TIME_TO_LIVE)
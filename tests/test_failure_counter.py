@@ -0,0 +1,63 @@
+from failure_counter import FailureCounter
+import threading, time
+
+def test_failures_are_counted_within_the_window():
+
+    counter = FailureCounter(window_period = 600, bucket_period = 60)
+
+    for second in range(0, 300, 30):
+        counter.add_failure("10.0.0.1", now = 6000 + second)
+
+    assert (counter.count("10.0.0.1", now = 6300) == 10)
+
+    # buckets 100 ~ 102 (two failures each) slid out of the window
+    assert (counter.count("10.0.0.1", now = 6000 + 600 + 120) == 4)
+
+def test_persisted_failures_of_other_workers_are_loaded():
+
+    persisted = { "10.0.0.1" : { 100 : 4 } }
+
+    counter = FailureCounter(window_period = 600, bucket_period = 60, loader = lambda ip_addresses, first_bucket : {
+        ip_address : persisted[ip_address] for ip_address in ip_addresses if (ip_address in persisted)
+    })
+
+    assert (counter.add_failure("10.0.0.1", now = 100 * 60) == 5)
+
+def test_loading_a_new_ip_does_not_block_other_ips():
+
+    fetch_started, release_fetch = threading.Event(), threading.Event()
+
+    def slow_loader(ip_addresses, first_bucket):
+
+        # the botnet address waits on a slow round trip
+        if ("10.0.0.1" in ip_addresses):
+            fetch_started.set()
+            release_fetch.wait(5)
+
+        return {}
+
+    counter = FailureCounter(window_period = 600, loader = slow_loader)
+
+    # one failure already counted for another address
+    counter.add_failure("10.0.0.2")
+
+    slow_thread = threading.Thread(target = counter.add_failure, args = ("10.0.0.1",))
+
+    slow_thread.start()
+
+    assert (fetch_started.wait(5))
+
+    start_time = time.perf_counter()
+
+    # served while the other fetch is still in flight
+    assert (counter.add_failure("10.0.0.2") == 2)
+
+    assert (counter.count("10.0.0.3") == 0)
+
+    assert (time.perf_counter() - start_time < 1.0)
+
+    release_fetch.set()
+
+    slow_thread.join(5)
+
+    assert (counter.count("10.0.0.1") == 1)
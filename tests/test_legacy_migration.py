@@ -0,0 +1,50 @@
+from legacy_migration import migrate_upvoters, recount_upvotes, migrate_bookmarks
+from bson.objectid import ObjectId
+
+def test_upvoters_are_moved_and_recounted(database):
+
+    reviews, upvotes = database.db["reviews"], database.db["upvotes"]
+
+    first_id, second_id = ObjectId(), ObjectId()
+
+    reviews.insert_many([
+        { "_id" : first_id,  "num_upvotes" : 3, "upvoters" : [ "alice@example.com", "bob@example.com", "bob@example.com" ] },
+        { "_id" : second_id, "num_upvotes" : 1 }
+    ])
+
+    # upvoted again after deploy (counted twice), and withdrawn after deploy
+    upvotes.insert_many([
+        { "username" : "carol@example.com", "review-id" : second_id, "upvoted" : True  },
+        { "username" : "alice@example.com", "review-id" : first_id,  "upvoted" : False }
+    ])
+
+    reviews.update_one({ "_id" : second_id }, { "$inc" : { "num_upvotes" : 1 } })
+
+    assert (migrate_upvoters(database.db, batch_size = 1) == 1)
+
+    assert (reviews.count_documents({ "upvoters" : { "$exists" : True } }) == 0)
+
+    # upvotes made since deploy win over the copied ones
+    assert (upvotes.find_one({ "username" : "alice@example.com", "review-id" : first_id })["upvoted"] is False)
+
+    assert (recount_upvotes(database.db, batch_size = 1) == 2)
+
+    assert ({ review["_id"] : review["num_upvotes"] for review in reviews.find() } == { first_id : 1, second_id : 1 })
+
+    # nothing left to do on a re-run
+    assert ((migrate_upvoters(database.db, batch_size = 1), recount_upvotes(database.db, batch_size = 1)) == (0, 0))
+
+def test_bookmarks_are_moved_and_list_versions_bumped(database):
+
+    review_id = ObjectId()
+
+    database.db["users"].insert_one({ "username" : "alice@example.com", "bookmarks" : [ review_id, review_id ] })
+
+    assert (migrate_bookmarks(database.db, batch_size = 10) == 1)
+
+    assert (database.db["bookmarks"].count_documents({ "username" : "alice@example.com", "review-id" : review_id }) == 1)
+
+    assert ("bookmarks" not in database.db["users"].find_one({ "username" : "alice@example.com" }))
+
+    # cached bookmarked pages are stale
+    assert (database.db["list-versions"].find_one({ "_id" : "alice@example.com" })["bookmarked"] == 1)
@@ -0,0 +1,55 @@
+from review_io import import_reviews, export_reviews
+from aggregate_manager import AggregateManager
+from types import SimpleNamespace
+import mongomock, json
+
+ROWS = [
+    { "food-name" : "Ramen", "restaurant-name" : "Ichi", "author-name" : "alice@example.com", "food-price" : 12,
+      "food-rating" : 5, "service-rating" : 4, "recommend-rating" : 5, "hashtags" : [ "noodles", "soup" ], "timestamp" : "2024-01-02T03:04:05+00:00" },
+    { "food-name" : "Gyoza", "restaurant-name" : "Ichi", "author-name" : "bob@example.com", "food-price" : 6,
+      "food-rating" : 3, "service-rating" : 9, "recommend-rating" : 2, "hashtags" : [], "timestamp" : "20230506_070809" }
+]
+
+def write_rows(file_path, rows) -> None:
+
+    with open(file_path, "w", encoding = "utf-8") as file:
+        for row in rows:
+            file.write(json.dumps(row) + "\n")
+
+def read_rows(file_path):
+
+    with open(file_path, "r", encoding = "utf-8") as file:
+        return [ json.loads(line) for line in file ]
+
+def test_export_import_round_trip(database, tmp_path):
+
+    write_rows(tmp_path / "seed.ndjson", ROWS)
+
+    assert (import_reviews(database, str(tmp_path / "seed.ndjson"), batch_size = 1) == (2, 0))
+
+    export_reviews(database, str(tmp_path / "first.ndjson"), batch_size = 1)
+
+    # import the export into another database, then export again
+    other_database = SimpleNamespace(db = mongomock.MongoClient().get_database("food-fellow-other"))
+
+    assert (import_reviews(other_database, str(tmp_path / "first.ndjson"), batch_size = 10) == (2, 0))
+
+    export_reviews(other_database, str(tmp_path / "second.ndjson"), batch_size = 10)
+
+    first_rows, second_rows = read_rows(tmp_path / "first.ndjson"), read_rows(tmp_path / "second.ndjson")
+
+    assert (first_rows == second_rows)
+
+    # ratings are bounded as "/write" does, timestamps are kept
+    assert (first_rows[1]["service-rating"] == 5)
+
+    assert ([ row["timestamp"] for row in first_rows ] == [ "2024-01-02T03:04:05+00:00", "2023-05-06T07:08:09+00:00" ])
+
+    # aggregates are written along with the reviews
+    assert (AggregateManager(other_database).fetch_aggregate("Ichi")["count"] == 2)
+
+def test_import_rejects_invalid_rows(database, tmp_path):
+
+    write_rows(tmp_path / "rows.ndjson", [ { **ROWS[0], "food-price" : "twelve" }, { **ROWS[0], "timestamp" : "yesterday" }, ROWS[1] ])
+
+    assert (import_reviews(database, str(tmp_path / "rows.ndjson"), batch_size = 10) == (1, 2))
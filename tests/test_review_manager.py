@@ -0,0 +1,134 @@
+import pytest
+
+from review_manager import ReviewManager, ReviewCondition, Review
+from change_journal import ChangeJournal
+from trending import TrendingBoard
+from bson.objectid import ObjectId
+from datetime import timedelta
+
+def add_review(review_manager : ReviewManager, food_name : str, author_name : str = "alice@example.com") -> ObjectId:
+
+    review = Review(food_name, "Ichi", author_name, 12, 4, 4, 4, [ "noodles" ])
+
+    review_manager.add_review(review)
+
+    return review["_id"]
+
+def test_upvote_toggles_and_bumps_list_versions(server_database):
+
+    review_manager = ReviewManager(server_database)
+
+    review_id = add_review(review_manager, "Ramen")
+
+    assert (review_manager.upvote_review("bob@example.com", review_id))
+
+    assert (review_manager.review_upvoted("bob@example.com", review_id))
+
+    assert not (review_manager.upvote_review("bob@example.com", review_id))
+
+    assert (review_manager.upvote_review("carol@example.com", review_id))
+
+    assert (review_manager.collection.find_one({ "_id" : review_id })["num_upvotes"] == 1)
+
+    assert (review_manager.upvoted_reviews("carol@example.com", [ review_id, ObjectId() ]) == { review_id })
+
+    # every list of the user shows upvoted states, so cached pages are stale after each click
+    assert (review_manager.list_versions.fetch("bob@example.com", "bookmarked") == 2)
+
+def collect_pages(fetch_page) -> list:
+
+    # follow next-cursor tokens until the last page
+    pages, cursor = [], None
+
+    while True:
+        review_page = fetch_page(cursor)
+
+        pages.append([ review["food_name"] for review in review_page["data"] ])
+
+        if ((cursor := review_page["next-cursor"]) is None):
+            return pages
+
+def test_fetch_cursor_continues_after_the_last_review(database):
+
+    review_manager = ReviewManager(database)
+
+    for food_name in [ "Ramen", "Udon", "Soba", "Pho", "Laksa" ]:
+        add_review(review_manager, food_name)
+
+    add_review(review_manager, "Gyoza", author_name = "bob@example.com")
+
+    review_filter = ReviewCondition(author_name = "alice@example.com")
+
+    # newest first, without repeats or gaps
+    assert (collect_pages(lambda cursor : review_manager.fetch_reviews(review_filter, page_size = 2, cursor = cursor)) == [
+        [ "Laksa", "Pho" ], [ "Soba", "Udon" ], [ "Ramen" ]
+    ])
+
+    # a review written meanwhile does not shift later pages
+    first_page = review_manager.fetch_reviews(review_filter, page_size = 2, with_total = True)
+
+    add_review(review_manager, "Curry")
+
+    assert (first_page["total"] == 5)
+
+    assert ([ review["food_name"] for review in review_manager.fetch_reviews(review_filter, page_size = 2, cursor = first_page["next-cursor"])["data"] ] == [ "Soba", "Udon" ])
+
+def test_search_cursor_is_the_rank_offset(database):
+
+    review_manager = ReviewManager(database)
+
+    for food_name in [ "Ramen", "Ramen Deluxe", "Spicy Ramen" ]:
+        add_review(review_manager, food_name)
+
+    pages = collect_pages(lambda cursor : review_manager.search_reviews("ramen", page_size = 2, cursor = cursor))
+
+    assert ([ len(page) for page in pages ] == [ 2, 1 ])
+
+    assert (sorted(sum(pages, [])) == [ "Ramen", "Ramen Deluxe", "Spicy Ramen" ])
+
+@pytest.mark.parametrize("cursor", [ "not-a-cursor", "-1" ])
+def test_invalid_cursors_are_rejected(database, cursor):
+
+    review_manager = ReviewManager(database)
+
+    with pytest.raises(ValueError):
+        review_manager.fetch_reviews(ReviewCondition(), cursor = cursor)
+
+    with pytest.raises(ValueError):
+        review_manager.search_reviews("ramen", cursor = cursor)
+
+def test_other_workers_refresh_only_changed_reviews(database):
+
+    writer, reader = ReviewManager(database), ReviewManager(database)
+
+    review_id = add_review(writer, "Ramen")
+
+    assert ((reader.search_reviews("ramen")["data"] == []) and (reader.refresh_changes() == 1))
+
+    assert ([ review["food_name"] for review in reader.search_reviews("ramen")["data"] ] == [ "Ramen" ])
+
+    assert (review_id in reader.trending_board.members[TrendingBoard.GLOBAL_BOARD])
+
+    writer.remove_review(review_id)
+
+    reader.refresh_changes()
+
+    assert ((reader.search_reviews("ramen")["data"] == []) and (review_id not in reader.trending_board.members.get(TrendingBoard.GLOBAL_BOARD, {})))
+
+def test_refresh_falls_back_to_rebuild_after_missed_changes(database):
+
+    writer, reader = ReviewManager(database), ReviewManager(database)
+
+    # a write bypassing the journal, read by a worker that has not refreshed for longer than the journal keeps entries
+    writer.collection.insert_one(Review("Udon", "Ichi", "alice@example.com", 12, 4, 4, 4, []))
+
+    reader.change_journal.read_from -= timedelta(seconds = ChangeJournal._TIME_TO_LIVE)
+
+    assert (reader.refresh_changes() == 0)
+
+    assert ([ review["food_name"] for review in reader.search_reviews("udon")["data"] ] == [ "Udon" ])
+
+    # back to incremental reads
+    assert (reader.refresh_changes() == 0)
+
+    assert (reader.change_journal.read_changes() == set())
@@ -0,0 +1,86 @@
+from search_engine import SearchEngine, tokenize
+from bson.objectid import ObjectId
+
+def make_review(**fields):
+
+    return { "_id" : ObjectId(), "food_name" : "", "restaurant_name" : "", "author_name" : "", "hashtags" : [], "num_upvotes" : 0, **fields }
+
+def test_tokenize_folds_case_and_accents():
+
+    assert (tokenize("Crème Brûlée, #DESSERT_time") == [ "creme", "brulee", "dessert", "time" ])
+
+def test_rarer_terms_and_heavier_fields_rank_higher():
+
+    ramen_food, ramen_restaurant, udon = make_review(food_name = "Ramen"), make_review(restaurant_name = "Ramen House"), make_review(food_name = "Udon")
+
+    # many reviews mention noodles, so that term weighs little
+    noodles = [ make_review(food_name = "Noodles", hashtags = [ "noodles" ]) for _ in range(5) ]
+
+    search_engine = SearchEngine()
+
+    search_engine.rebuild(lambda : [ ramen_food, ramen_restaurant, udon, *noodles ])
+
+    # food names weigh more than restaurant names
+    assert (search_engine.search("ramen") == [ ramen_food["_id"], ramen_restaurant["_id"] ])
+
+    # the rare term decides the order
+    assert (search_engine.search("udon noodles")[0] == udon["_id"])
+
+    assert (search_engine.search("sushi") == [])
+
+def test_shorter_documents_rank_higher():
+
+    short, long = make_review(food_name = "Pho"), make_review(food_name = "Pho with extra beef brisket and tendon")
+
+    search_engine = SearchEngine()
+
+    search_engine.rebuild(lambda : [ long, short ])
+
+    assert (search_engine.search("pho") == [ short["_id"], long["_id"] ])
+
+def test_upvotes_break_ties_and_follow_updates():
+
+    first, second = make_review(food_name = "Taco"), make_review(food_name = "Taco", num_upvotes = 3)
+
+    search_engine = SearchEngine()
+
+    search_engine.rebuild(lambda : [ first, second ])
+
+    assert (search_engine.search("taco") == [ second["_id"], first["_id"] ])
+
+    for _ in range(10):
+        search_engine.update_upvotes(first["_id"], 1)
+
+    assert (search_engine.search("taco") == [ first["_id"], second["_id"] ])
+
+def test_removed_reviews_are_not_found():
+
+    review = make_review(food_name = "Bagel")
+
+    search_engine = SearchEngine()
+
+    search_engine.index_review(review)
+
+    search_engine.unindex_review(review["_id"])
+
+    assert ((search_engine.search("bagel") == []) and (len(search_engine.postings) == 0))
+
+def test_writes_during_a_rebuild_are_kept():
+
+    stored, written = make_review(food_name = "Curry"), make_review(food_name = "Curry Bread")
+
+    search_engine = SearchEngine()
+
+    def read_collection():
+
+        # a request thread indexes a review after the collection was read
+        search_engine.index_review(written)
+
+        # a concurrent rebuild is refused
+        assert not (search_engine.rebuild(lambda : []))
+
+        return [ stored ]
+
+    assert (search_engine.rebuild(read_collection))
+
+    assert (set(search_engine.search("curry")) == { stored["_id"], written["_id"] })
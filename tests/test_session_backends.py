@@ -0,0 +1,86 @@
+from session_backends import create_session_interface, MigratingSessionInterface
+from flask.sessions import SecureCookieSessionInterface
+from flask import Flask
+from typing import *
+import pytest
+
+def make_app(**config) -> Flask:
+
+    app = Flask(__name__)
+
+    app.config.update(config)
+
+    return app
+
+@pytest.mark.parametrize("secret_key", [ None, "", "super-duper-secret-key" ])
+def test_cookie_backend_refuses_missing_or_public_secret_key(secret_key):
+
+    with pytest.raises(ValueError):
+        create_session_interface(make_app(SESSION_BACKEND = "cookie", SECRET_KEY = secret_key), None)
+
+def test_mongodb_backend_refuses_missing_secret_key(database):
+
+    with pytest.raises(ValueError):
+        create_session_interface(make_app(SESSION_BACKEND = "mongodb"), database)
+
+def test_cookie_backend_with_secret_key():
+
+    session_interface = create_session_interface(make_app(SESSION_BACKEND = "cookie", SECRET_KEY = "0123456789abcdef"), None)
+
+    assert isinstance(session_interface, SecureCookieSessionInterface)
+
+def request_cookie(app : Flask, session_interface, cookie : Optional[ str ] = None, username : Optional[ str ] = None) -> Tuple[ Any, Optional[ str ] ]:
+
+    # open (and optionally log in) the session of a single request, returning it with the issued cookie
+    with app.test_request_context("/", headers = ({ "Cookie" : f"session={cookie}" } if (cookie is not None) else {})) as context:
+
+        session = session_interface.open_session(app, context.request)
+
+        if (username is not None):
+            session["username"] = username
+
+        response = app.response_class()
+
+        session_interface.save_session(app, session, response)
+
+        issued_cookies = [ header.split(";")[0].split("=", 1)[1] for header in response.headers.getlist("Set-Cookie") ]
+
+        return (session, ((issued_cookies[-1]) if (issued_cookies) else (None)))
+
+def test_legacy_sessions_are_migrated_once(database, tmp_path):
+
+    Session = pytest.importorskip("flask_session").Session
+
+    config = dict(SECRET_KEY = "0123456789abcdef", SESSION_FILE_DIR = str(tmp_path), SESSION_USE_SIGNER = False)
+
+    # log in through the previous (Flask-Session) backend
+    legacy_app = make_app(**config, SESSION_TYPE = "filesystem")
+
+    Session(legacy_app)
+
+    _, legacy_cookie = request_cookie(legacy_app, legacy_app.session_interface, username = "alice@example.com")
+
+    app = make_app(**config, SESSION_BACKEND = "mongodb", SESSION_MIGRATE_FROM = "filesystem")
+
+    session_interface = create_session_interface(app, database)
+
+    assert isinstance(session_interface, MigratingSessionInterface)
+
+    # still logged in, now under a session issued by the new backend
+    session, cookie = request_cookie(app, session_interface, legacy_cookie)
+
+    assert (session["username"] == "alice@example.com")
+
+    assert ((cookie is not None) and (cookie != legacy_cookie))
+
+    assert (database.db.sessions.find_one({ "_id" : cookie })["data"]["username"] == "alice@example.com")
+
+    # later requests are served by the new backend alone
+    session, _ = request_cookie(app, session_interface.target, cookie)
+
+    assert (session["username"] == "alice@example.com")
+
+    # unknown cookies still get an empty session
+    session, cookie = request_cookie(app, session_interface, "forged")
+
+    assert ((dict(session) == {}) and (cookie is None))
@@ -0,0 +1,74 @@
+from user_manager import User, UserManager
+from bson.objectid import ObjectId
+
+def make_user_manager(database) -> UserManager:
+
+    # notifications are not sent by these tests
+    return UserManager(database, gmail_manager = None)
+
+def add_user(database, username : str) -> None:
+
+    database.db.users.insert_one(User(username, { "password_hash" : "", "password_salt" : "" }))
+
+def test_recommendations_are_read_from_the_database_across_workers(database):
+
+    add_user(database, "alice@example.com")
+
+    # two workers, each with its own user cache
+    worker_a, worker_b = make_user_manager(database), make_user_manager(database)
+
+    # worker B caches the user before the recommendation is made
+    assert (worker_b.fetch_recommendations("alice@example.com") == [])
+
+    version = worker_b.list_versions.fetch("alice@example.com", "recommended")
+
+    review_id = ObjectId()
+
+    assert (worker_a.recommend_to_user("alice@example.com", review_id, "bob@example.com"))
+
+    # the version moved, so the page served under it must hold the new review
+    assert (worker_b.list_versions.fetch("alice@example.com", "recommended") == version + 1)
+
+    assert (worker_b.fetch_recommendations("alice@example.com") == [ review_id ])
+
+def test_cache_is_invalidated_after_a_write(database):
+
+    add_user(database, "alice@example.com")
+
+    user_manager = make_user_manager(database)
+
+    assert not (user_manager.recommendations_unread("alice@example.com"))
+
+    user_manager.recommend_to_user("alice@example.com", ObjectId(), "bob@example.com")
+
+    # the same worker sees its own write at once
+    assert (user_manager.recommendations_unread("alice@example.com"))
+
+    user_manager.fetch_recommendations("alice@example.com")
+
+    assert not (user_manager.recommendations_unread("alice@example.com"))
+
+def test_recommendation_is_added_once_despite_a_stale_cache(database):
+
+    add_user(database, "alice@example.com")
+
+    worker_a, worker_b = make_user_manager(database), make_user_manager(database)
+
+    review_id = ObjectId()
+
+    # worker B caches the user before worker A's recommendation
+    assert not (worker_b.recommendations_unread("alice@example.com"))
+
+    assert (worker_a.recommend_to_user("alice@example.com", review_id, "bob@example.com"))
+
+    assert not (worker_b.recommend_to_user("alice@example.com", review_id, "carol@example.com"))
+
+    # no second version bump or digest entry
+    assert (worker_b.list_versions.fetch("alice@example.com", "recommended") == 1)
+
+    assert (database.db["pending-digests"].find_one({ "username" : "alice@example.com" })["count"] == 1)
+
+    assert (worker_b.fetch_recommendations("alice@example.com") == [ review_id ])
+
+    # already read recommendations are not added again either
+    assert not (worker_a.recommend_to_user("alice@example.com", review_id, "carol@example.com"))
@@ -3,23 +3,37 @@ from typing import *
 
 class TimeStamp:
 
+    # format of timestamps written before dates were stored natively
     TIMESTAMP_FORMAT = "%Y%m%d_%H%M%S"
 
     @classmethod
     def current_time(class_) -> datetime:
 
-        # obtain current time (in UTC), format it into timestamp, then parse it
-        #   Note: This is done so arithmetic operations could be allowed.
-        return class_.string2time(class_.time2string(datetime.now(timezone.utc)))
+        # obtain current time (in UTC, full precision)
+        #   Note: Stored as a BSON date, so MongoDB can compare and index it.
+        return datetime.now(timezone.utc)
 
     @classmethod
     def time2string(class_, time_object : datetime) -> str:
 
-        # format time object into timestamp
+        # format time object into (legacy) timestamp
         return time_object.strftime(class_.TIMESTAMP_FORMAT)
 
     @classmethod 
     def string2time(class_, time_string : str) -> datetime:
 
-        # parse timestamp into time object
-        return datetime.strptime(time_string, class_.TIMESTAMP_FORMAT)
\ No newline at end of file
+        # parse (legacy) timestamp into time object (in UTC)
+        return datetime.strptime(time_string, class_.TIMESTAMP_FORMAT).replace(tzinfo = timezone.utc)
+
+    @classmethod
+    def coerce(class_, time_value : Union[ str, datetime ]) -> datetime:
+
+        # legacy documents store strings
+        if isinstance(time_value, str):
+            return class_.string2time(time_value)
+
+        # MongoDB returns naive datetimes (in UTC) unless the client is timezone-aware
+        if (time_value.tzinfo is None):
+            return time_value.replace(tzinfo = timezone.utc)
+
+        return time_value
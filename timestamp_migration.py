@@ -0,0 +1,86 @@
+from pymongo.database import Database
+from pymongo import MongoClient, UpdateOne, ASCENDING
+from time_utils import TimeStamp
+from typing import *
+import argparse, sys
+
+# (collection name, field name) of timestamps once stored as "%Y%m%d_%H%M%S" strings
+TIMESTAMP_FIELDS = (
+    ("reviews",    "timestamp"),
+    ("ip-history", "timestamp")
+)
+
+# collection keeping one checkpoint per migrated field
+CHECKPOINT_COLLECTION_NAME = "migrations"
+
+def migrate_field(database : Database, collection_name : str, field_name : str, batch_size : int) -> Tuple[ int, int ]:
+
+    collection, checkpoints = database[collection_name], database[CHECKPOINT_COLLECTION_NAME]
+
+    checkpoint_id = f"native-timestamps:{collection_name}.{field_name}"
+
+    # resume after the last converted document of a previous (interrupted) run
+    checkpoint = (checkpoints.find_one({ "_id" : checkpoint_id }) or dict())
+
+    num_converted, num_invalid = 0, 0
+
+    while (True):
+
+        batch_filter = { field_name : { "$type" : "string" } }
+
+        if ("last-id" in checkpoint):
+            batch_filter["_id"] = { "$gt" : checkpoint["last-id"] }
+
+        # documents still storing strings, in ID order
+        batch = list(collection.find(batch_filter, { field_name : 1 }).sort("_id", ASCENDING).limit(batch_size))
+
+        if (len(batch) == 0):
+            break
+
+        updates = []
+
+        for document in batch:
+
+            try:
+                time_object = TimeStamp.string2time(document[field_name])
+
+            # leave unparsable values for manual inspection
+            except (ValueError):
+                num_invalid += 1
+                continue
+
+            # only convert if unchanged since read (safe to re-run)
+            updates.append(UpdateOne(
+                filter = { "_id" : document["_id"], field_name : document[field_name] },
+                update = { "$set" : { field_name : time_object } }
+            ))
+
+        if (len(updates) > 0):
+            num_converted += collection.bulk_write(updates, ordered = False).modified_count
+
+        checkpoint["last-id"] = batch[-1]["_id"]
+
+        # persist progress after every batch
+        checkpoints.update_one({ "_id" : checkpoint_id }, { "$set" : { "last-id" : checkpoint["last-id"] } }, upsert = True)
+
+        print(f"{collection_name}.{field_name}: converted {num_converted}, invalid {num_invalid}", file = sys.stderr)
+
+    return (num_converted, num_invalid)
+
+if (__name__ == "__main__"):
+
+    parser = argparse.ArgumentParser(description = "Convert string timestamps into native BSON dates.")
+
+    parser.add_argument("--mongo-uri", default = "mongodb://localhost:27017/food-fellow")
+
+    parser.add_argument("--batch-size", type = int, default = 1000)
+
+    arguments = parser.parse_args()
+
+    database = MongoClient(arguments.mongo_uri).get_default_database()
+
+    for collection_name, field_name in TIMESTAMP_FIELDS:
+
+        num_converted, num_invalid = migrate_field(database, collection_name, field_name, arguments.batch_size)
+
+        print(f"done: {collection_name}.{field_name} converted {num_converted}, invalid {num_invalid}", file = sys.stderr)
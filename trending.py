@@ -0,0 +1,190 @@
+from time_utils import TimeStamp
+from bson.objectid import ObjectId
+from typing import *
+import threading, bisect, math, time
+
+class TrendingBoard:
+
+    # period (in seconds) after which a review's trending score halves
+    _HALF_LIFE = 86400
+
+    # number of entries kept per leaderboard (more than served, so removals rarely empty the tail)
+    _BOARD_SIZE = 200
+
+    # (board type, board name) of the site-wide leaderboard
+    GLOBAL_BOARD = ("global", None)
+
+    def __init__(self, half_life : Optional[ float ] = None, board_size : Optional[ int ] = None) -> None:
+
+        if (half_life is not None):
+            self._HALF_LIFE = half_life
+
+        if (board_size is not None):
+            self._BOARD_SIZE = board_size
+
+        # guards every leaderboard below
+        self.lock = threading.Lock()
+
+        # board key => [ (negated rank key, review ID) ] (best first)
+        self.rankings = dict()
+
+        # board key => { review ID => rank key } of ranked reviews
+        self.members = dict()
+
+        # review ID => board keys it is ranked on
+        self.placements = dict()
+
+    @classmethod
+    def board_keys(class_, review_document : Dict[ str, Any ]) -> List[ Tuple[ str, Optional[ str ] ] ]:
+
+        # every review competes site-wide, within its restaurant, and within each of its hashtags
+        return [ class_.GLOBAL_BOARD, ("restaurant", review_document["restaurant_name"]) ] + [
+            ("hashtag", hashtag) for hashtag in dict.fromkeys(review_document.get("hashtags", None) or [])
+        ]
+
+    def _rank_key(self, num_upvotes : int, timestamp : Any) -> float:
+
+        # score(t) = (upvotes + 1) * 2 ^ (-(t - timestamp) / half life)
+        #   Note: Taking log2 and dropping the shared "-t / half life" term leaves a key that never changes
+        #         with time, so rankings stay valid between updates (only displayed scores decay).
+        return math.log2(max(num_upvotes, 0) + 1) + TimeStamp.coerce(timestamp).timestamp() / self._HALF_LIFE
+
+    def score(self, rank_key : float, now : Optional[ float ] = None) -> float:
+
+        # decayed score at the specified time
+        return 2 ** (rank_key - ((time.time()) if (now is None) else (now)) / self._HALF_LIFE)
+
+    def _discard(self, board_key : Tuple[ str, Optional[ str ] ], review_id : ObjectId) -> None:
+
+        ranking, members = self.rankings[board_key], self.members[board_key]
+
+        # locate entry by its (unique) sort key
+        del ranking[bisect.bisect_left(ranking, (-members.pop(review_id), review_id))]
+
+        placements = self.placements[review_id]
+
+        placements.discard(board_key)
+
+        # forget reviews no longer ranked anywhere
+        if (len(placements) == 0):
+            del self.placements[review_id]
+
+        # drop empty leaderboards
+        if (len(ranking) == 0):
+            del self.rankings[board_key], self.members[board_key]
+
+    def _offer(self, board_key : Tuple[ str, Optional[ str ] ], review_id : ObjectId, rank_key : float) -> None:
+
+        ranking, members = self.rankings.setdefault(board_key, []), self.members.setdefault(board_key, dict())
+
+        entry = (-rank_key, review_id)
+
+        # full leaderboard and review ranks below all of it
+        if ((len(ranking) >= self._BOARD_SIZE) and (entry > ranking[-1])):
+            return
+
+        bisect.insort(ranking, entry)
+
+        members[review_id] = rank_key
+
+        self.placements.setdefault(review_id, set()).add(board_key)
+
+        # evict the lowest entry once over capacity
+        if (len(ranking) > self._BOARD_SIZE):
+            self._discard(board_key, ranking[-1][1])
+
+    def update_review(self, review_document : Dict[ str, Any ]) -> None:
+
+        review_id = review_document["_id"]
+
+        rank_key = self._rank_key(review_document.get("num_upvotes", 0), review_document["timestamp"])
+
+        with self.lock:
+
+            # re-rank on every leaderboard the review competes on
+            #   Note: A review pushed off a board by a lowered score is restored by the next rebuild.
+            for board_key in self.board_keys(review_document):
+
+                if (review_id in self.members.get(board_key, ())):
+                    self._discard(board_key, review_id)
+
+                self._offer(board_key, review_id, rank_key)
+
+    def remove_review(self, review_id : ObjectId) -> None:
+
+        with self.lock:
+
+            for board_key in list(self.placements.get(review_id, ())):
+                self._discard(board_key, review_id)
+
+    def rebuild(self, review_documents : Iterable[ Dict[ str, Any ] ]) -> None:
+
+        # build into a fresh board, so readers keep the old rankings meanwhile
+        trending_board = TrendingBoard(self._HALF_LIFE, self._BOARD_SIZE)
+
+        for review_document in review_documents:
+            trending_board.update_review(review_document)
+
+        with self.lock:
+            self.rankings, self.members, self.placements = trending_board.rankings, trending_board.members, trending_board.placements
+
+    def top(self, board_key : Tuple[ str, Optional[ str ] ], top_n : int) -> List[ Tuple[ ObjectId, float ] ]:
+
+        with self.lock:
+            entries = self.rankings.get(board_key, [])[:top_n]
+
+        now = time.time()
+
+        # (review ID, decayed score) from best to worst
+        return [ (review_id, self.score(-negated_key, now)) for negated_key, review_id in entries ]
+
+if (__name__ == "__main__"):
+
+    # compare incremental updates against rebuilding from scratch
+    from datetime import datetime, timedelta, timezone
+    import random
+
+    random.seed(0)
+
+    now = datetime.now(timezone.utc)
+
+    reviews = {
+        ObjectId() : {
+            "num_upvotes" : random.randrange(100), "timestamp" : now - timedelta(seconds = random.randrange(30 * 86400)),
+            "restaurant_name" : f"restaurant {random.randrange(50)}", "hashtags" : [ f"tag {random.randrange(20)}" ]
+        } for _ in range(50000)
+    }
+
+    for review_id, review_document in reviews.items():
+        review_document["_id"] = review_id
+
+    trending_board = TrendingBoard()
+
+    start_time = time.perf_counter()
+    trending_board.rebuild(reviews.values())
+    print(f"rebuild        | {(time.perf_counter() - start_time) * 1e3:8.2f} ms for {len(reviews)} reviews")
+
+    review_ids = list(reviews)
+
+    start_time = time.perf_counter()
+
+    for _ in range(10000):
+        review_document = reviews[random.choice(review_ids)]
+        review_document["num_upvotes"] += 1
+        trending_board.update_review(review_document)
+
+    print(f"upvote update  | {(time.perf_counter() - start_time) * 1e6 / 10000:8.2f} us")
+
+    start_time = time.perf_counter()
+
+    for _ in range(10000):
+        trending_board.top(TrendingBoard.GLOBAL_BOARD, 20)
+
+    print(f"top 20 read    | {(time.perf_counter() - start_time) * 1e6 / 10000:8.2f} us")
+
+    # incremental rankings agree with a full rebuild (upvotes only increased)
+    rebuilt_board = TrendingBoard()
+    rebuilt_board.rebuild(reviews.values())
+
+    assert ([ review_id for review_id, _ in trending_board.top(TrendingBoard.GLOBAL_BOARD, 20) ] ==
+            [ review_id for review_id, _ in rebuilt_board.top(TrendingBoard.GLOBAL_BOARD, 20) ])
@@ -0,0 +1,255 @@
+from search_engine import tokenize
+from typing import *
+import threading, bisect, heapq, json, zlib
+
+class Typeahead:
+
+    # kinds of suggested names
+    KINDS = ( "restaurant", "food" )
+
+    # snapshot format version
+    _SNAPSHOT_VERSION = 1
+
+    # results of prefixes up to this length are cached (longer prefixes match few names)
+    _CACHED_PREFIX_LENGTH = 3
+
+    # number of suggestions kept per cached prefix
+    _CACHED_LIMIT = 20
+
+    def __init__(self) -> None:
+
+        # guards every structure below
+        self.lock = threading.Lock()
+
+        # kind => { name key => number of reviews }
+        self.counts = { kind : dict() for kind in self.KINDS }
+
+        # kind => { name key => { spelling => number of reviews } }
+        self.spellings = { kind : dict() for kind in self.KINDS }
+
+        # kind => sorted [ (prefix key, name key) ], one per word the name starts at
+        #   Note: "tonkotsu ramen" is found by both "ton" and "ram".
+        self.keys = { kind : [] for kind in self.KINDS }
+
+        # (kind, prefix) => [ (name key, number of reviews) ] best first
+        self.cache = dict()
+
+    @staticmethod
+    def name_key(name : str) -> str:
+
+        # accent- and case-insensitive, words separated by single spaces
+        return " ".join(tokenize(name))
+
+    @staticmethod
+    def _prefix_keys(name_key : str) -> List[ str ]:
+
+        words = name_key.split(" ")
+
+        # name from every word onwards
+        return [ " ".join(words[index:]) for index in range(len(words)) ]
+
+    def _invalidate(self, kind : str, name_key : str) -> None:
+
+        # drop cached prefixes the name is listed under
+        for prefix_key in self._prefix_keys(name_key):
+            for length in range(1, min(len(prefix_key), self._CACHED_PREFIX_LENGTH) + 1):
+                self.cache.pop((kind, prefix_key[:length]), None)
+
+    def _add(self, kind : str, name : str, count : int) -> None:
+
+        name_key = self.name_key(name)
+
+        # skip names without letters or digits
+        if (name_key == ""):
+            return
+
+        counts, spellings = self.counts[kind], self.spellings[kind]
+
+        # new name => becomes searchable
+        if (name_key not in counts):
+
+            counts[name_key] = 0
+
+            for prefix_key in self._prefix_keys(name_key):
+                bisect.insort(self.keys[kind], (prefix_key, name_key))
+
+        counts[name_key] += count
+
+        name_spellings = spellings.setdefault(name_key, dict())
+
+        name_spellings[name] = name_spellings.get(name, 0) + count
+
+        if (name_spellings[name] <= 0):
+            del name_spellings[name]
+
+        # last review removed => no longer suggested
+        if (counts[name_key] <= 0):
+
+            del counts[name_key], spellings[name_key]
+
+            for prefix_key in self._prefix_keys(name_key):
+                keys = self.keys[kind]
+                del keys[bisect.bisect_left(keys, (prefix_key, name_key))]
+
+        self._invalidate(kind, name_key)
+
+    def add_review(self, review_document : Dict[ str, Any ], count : Optional[ int ] = 1) -> None:
+
+        with self.lock:
+
+            # each review counts towards its restaurant and its food
+            self._add("restaurant", review_document["restaurant_name"], count)
+            self._add("food",       review_document["food_name"],       count)
+
+    def remove_review(self, review_document : Dict[ str, Any ]) -> None:
+
+        self.add_review(review_document, -1)
+
+    def _matches(self, kind : str, prefix : str, limit : int) -> List[ Tuple[ str, int ] ]:
+
+        keys, counts = self.keys[kind], self.counts[kind]
+
+        # contiguous range of keys starting with the prefix
+        start = bisect.bisect_left(keys, (prefix,))
+        stop  = bisect.bisect_left(keys, (prefix + "\uffff",))
+
+        # a name may match at several of its words
+        name_keys = { name_key for _, name_key in keys[start:stop] }
+
+        # most reviewed names first (ties in alphabetical order)
+        return heapq.nsmallest(limit, ((name_key, counts[name_key]) for name_key in name_keys), key = lambda item : (-item[1], item[0]))
+
+    def suggest(self, prefix : str, kind : Optional[ str ] = None, limit : Optional[ int ] = 10) -> List[ Dict[ str, Any ] ]:
+
+        prefix = self.name_key(prefix)
+
+        if (prefix == ""):
+            return []
+
+        suggestions = []
+
+        with self.lock:
+
+            for suggested_kind in (self.KINDS if (kind is None) else (kind,)):
+
+                if (len(prefix) <= self._CACHED_PREFIX_LENGTH):
+
+                    # short prefixes match the most names, so their rankings are cached
+                    matches = self.cache.get((suggested_kind, prefix), None)
+
+                    if (matches is None):
+                        matches = self.cache[(suggested_kind, prefix)] = self._matches(suggested_kind, prefix, self._CACHED_LIMIT)
+
+                    matches = matches[:limit]
+
+                else:
+                    matches = self._matches(suggested_kind, prefix, limit)
+
+                spellings = self.spellings[suggested_kind]
+
+                # show the most common spelling of each name
+                suggestions.extend({
+                    "name"  : max(spellings[name_key].items(), key = lambda item : item[1])[0],
+                    "kind"  : suggested_kind,
+                    "count" : count
+                } for name_key, count in matches)
+
+        # merge kinds by number of reviews
+        return sorted(suggestions, key = lambda suggestion : -suggestion["count"])[:limit]
+
+    def rebuild(self, named_counts : Iterable[ Tuple[ str, str, int ] ]) -> None:
+
+        # build into a fresh index, so readers keep the old one meanwhile
+        counts, spellings = { kind : dict() for kind in self.KINDS }, { kind : dict() for kind in self.KINDS }
+
+        for kind, name, count in named_counts:
+
+            name_key = self.name_key(name)
+
+            # skip names without letters or digits
+            if ((name_key == "") or (count <= 0)):
+                continue
+
+            counts[kind][name_key] = counts[kind].get(name_key, 0) + count
+
+            name_spellings = spellings[kind].setdefault(name_key, dict())
+
+            name_spellings[name] = name_spellings.get(name, 0) + count
+
+        # sort once instead of inserting name by name
+        keys = {
+            kind : sorted((prefix_key, name_key) for name_key in counts[kind] for prefix_key in self._prefix_keys(name_key))
+                for kind in self.KINDS
+        }
+
+        with self.lock:
+            self.counts, self.spellings, self.keys, self.cache = counts, spellings, keys, dict()
+
+    def snapshot(self) -> bytes:
+
+        with self.lock:
+
+            # [ spelling, number of reviews ] per kind (prefix keys are derived again on load)
+            snapshot = {
+                "version" : self._SNAPSHOT_VERSION,
+                **{ kind : [ [ spelling, count ] for name_spellings in self.spellings[kind].values() for spelling, count in name_spellings.items() ] for kind in self.KINDS }
+            }
+
+        # compact JSON, compressed
+        return zlib.compress(json.dumps(snapshot, separators = (",", ":"), ensure_ascii = False).encode("utf-8"))
+
+    def load_snapshot(self, snapshot : bytes) -> None:
+
+        snapshot = json.loads(zlib.decompress(snapshot).decode("utf-8"))
+
+        # raise an exception on unexpected format
+        if (snapshot.get("version") != self._SNAPSHOT_VERSION):
+            raise ValueError(f"Unsupported typeahead snapshot version: {repr(snapshot.get('version'))}")
+
+        self.rebuild((kind, spelling, count) for kind in self.KINDS for spelling, count in snapshot[kind])
+
+if (__name__ == "__main__"):
+
+    # measure suggestion latency and snapshot size on synthetic names
+    import random, time
+
+    random.seed(0)
+
+    words = [ "".join(random.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(random.randint(3, 9))) for _ in range(5000) ]
+
+    typeahead = Typeahead()
+
+    start_time = time.perf_counter()
+
+    typeahead.rebuild(
+        (kind, " ".join(random.choice(words) for _ in range(random.randint(1, 3))), random.randint(1, 200))
+            for kind in Typeahead.KINDS for _ in range(50000)
+    )
+
+    print(f"rebuild        | {(time.perf_counter() - start_time) * 1e3:8.2f} ms for {sum(map(len, typeahead.counts.values()))} names")
+
+    NUM_RUNS = 2000
+
+    for prefix_length in (1, 2, 3, 4, 6):
+
+        prefixes = [ random.choice(words)[:prefix_length] for _ in range(NUM_RUNS) ]
+
+        # cold (fresh cache) then warm
+        typeahead.cache.clear()
+
+        for run_name in ("cold", "warm"):
+
+            start_time = time.perf_counter()
+
+            for prefix in prefixes:
+                typeahead.suggest(prefix)
+
+            print(f"prefix {prefix_length} {run_name:<5} | {(time.perf_counter() - start_time) * 1e6 / NUM_RUNS:8.2f} us")
+
+    snapshot = typeahead.snapshot()
+
+    start_time = time.perf_counter()
+
+    Typeahead().load_snapshot(snapshot)
+
+    print(f"snapshot       | {len(snapshot) / 1024:8.1f} KiB, loaded in {(time.perf_counter() - start_time) * 1e3:.2f} ms")
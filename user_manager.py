@@ -1,64 +1,66 @@
+from password_hasher import PasswordHasher, PasswordPool, ScryptHasher, hasher_for
+from cache_utils import LRUCache, RequestMemo
+from list_versions import ListVersions
+from digest_manager import DigestManager
 from email_manager import GmailManager
+from index_utils import IndexUtils
 from pymongo.database import Database
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import DuplicateKeyError
 from bson.objectid import ObjectId
-import hashlib, random 
 from typing import *
 
-def generate_random_salt(length : int) -> str:
-
-    # verify length variable is positive integer
-    assert (isinstance(length, int) and (length > 0))
-
-    # generate random string containing uppercase alphabets
-    return "".join(chr(random.randint(65, 90)) for _ in range(length))
-
-def hash_password_and_salt(password : str, salt : str) -> str:
-
-    # verify password and salt are non-empty strings
-    assert ((len(password) > 0) and (len(salt) > 0))
-
-    # initialize SHA-256 hashing object
-    hash_object = hashlib.sha256()
-
-    # concatenate password with salt, encode into binary, then hash
-    hash_object.update(f"{password}{salt}".encode("utf-8"))
-
-    # obtain hexidecimal digest
-    return hash_object.hexdigest()
-
 class User(dict):
 
-    def __init__(self, username      : str, 
-                       password      : str, 
-                       salt_length   : Optional[ int ] = 30) -> None:
+    def __init__(self, username        : str, 
+                       password_record : Dict[ str, Any ]) -> None:
 
         super(User, self).__init__()
 
-        # generate random salt string
-        random_salt = generate_random_salt(salt_length)
-
-        # hash password and salt
-        password_hash = hash_password_and_salt(password, random_salt)
-        
         # initialize user document structure
+        #   Note: "password_record" holds algorithm, parameters, salt and hash (see PasswordHasher.hash).
         self.update({
             "username"           : username,
-            "password_salt"      : random_salt,
-            "password_hash"      : password_hash,
-            "bookmarks"          : [],
+            **password_record,
             "recommended"        : [],
             "unread_recommended" : []
         })
 
-class UserManager:
+class UserManager(IndexUtils):
 
     # user collection name
     _USER_COLLECTION_NAME = "users"
 
-    # salt string length
-    _SALT_LENGTH = 30
-
-    def __init__(self, database : Database, gmail_manager : GmailManager) -> None:
+    # bookmark collection name
+    _BOOKMARK_COLLECTION_NAME = "bookmarks"
+
+    # indexes required by user queries
+    _INDEXES = {
+        "collection" : [
+            ( [ ("username", ASCENDING) ], { "unique" : True } )
+        ],
+        "bookmarks" : [
+            ( [ ("username", ASCENDING), ("review-id", ASCENDING) ], { "unique" : True } ),
+            ( [ ("username", ASCENDING), ("_id", DESCENDING) ], {} ),
+            ( [ ("review-id", ASCENDING) ], {} )
+        ]
+    }
+
+    # hasher used for new passwords (older hashes are upgraded on login)
+    _PASSWORD_HASHER = ScryptHasher()
+
+    # largest number of cached user documents
+    _CACHE_SIZE = 10000
+
+    # cached user documents are refetched after this period (in seconds)
+    #   Note: This bounds how long writes made by other workers stay unseen.
+    _CACHE_TIME_TO_LIVE = 30
+
+    def __init__(self, database        : Database, 
+                       gmail_manager   : GmailManager, 
+                       digest_manager  : Optional[ DigestManager  ] = None,
+                       password_hasher : Optional[ PasswordHasher ] = None,
+                       password_pool   : Optional[ PasswordPool   ] = None) -> None:
 
         # Food-Fellow (MongoDB) database object
         self.database = database 
@@ -66,106 +68,224 @@ class UserManager:
         # used to send email notification
         self.gmail_manager = gmail_manager
 
+        # used to coalesce recommendation notifications
+        self.digest_manager = ((DigestManager(database, gmail_manager)) if (digest_manager is None) else (digest_manager))
+
         # collection containing user information
         #self.collection = self.database[self._USER_COLLECTION_NAME]
         self.collection = getattr(self.database.db, self._USER_COLLECTION_NAME)
 
+        # collection containing one document per (user, bookmarked review)
+        self.bookmarks = getattr(self.database.db, self._BOOKMARK_COLLECTION_NAME)
+
+        # versions of personal review lists (for conditional requests)
+        self.list_versions = ListVersions(self.database)
+
+        # hashes new passwords
+        self.password_hasher = ((self._PASSWORD_HASHER) if (password_hasher is None) else (password_hasher))
+
+        # runs hashing off the request thread, bounding concurrent hashes
+        self.password_pool = ((PasswordPool()) if (password_pool is None) else (password_pool))
+
+        # user documents shared across requests
+        self.cache = LRUCache(self._CACHE_SIZE, self._CACHE_TIME_TO_LIVE)
+
+        # user documents already fetched by the current request
+        self.memo = RequestMemo()
+
+    def begin_request(self) -> None:
+
+        self.memo.begin()
+
+    def end_request(self) -> None:
+
+        self.memo.end()
+
+    def cache_stats(self) -> Dict[ str, int ]:
+
+        return self.cache.stats()
+
+    def _fetch_user(self, username : str, fresh : Optional[ bool ] = False) -> Optional[ Dict[ str, Any ] ]:
+
+        # already fetched by current request
+        found, user_document = self.memo.get(username)
+
+        if (found and not (fresh)):
+            return user_document
+
+        # stored document when specified (the cached copy may miss writes made by other workers)
+        found, user_document = (((False, None)) if (fresh) else (self.cache.get(username)))
+
+        # fetch from database on cache miss
+        if not (found):
+
+            user_document = self.collection.find_one({ "username" : username })
+
+            # missing users are not shared, since another worker may activate them
+            if (user_document is not None):
+                self.cache.put(username, user_document)
+
+        self.memo.put(username, user_document)
+
+        return user_document
+
+    def _invalidate_user(self, username : str) -> None:
+
+        # next read fetches the updated document
+        self.memo.invalidate(username)
+
+        self.cache.invalidate(username)
+
     def add_user(self, username : str, password : str) -> None:
 
-        # add new user to database (using default salt length)
-        self.collection.insert_one(document = User(username, password, self._SALT_LENGTH))
+        # hash password in the password pool
+        password_record = self.password_pool.run(self.password_hasher.hash, password)
+
+        # add new user to database
+        self.collection.insert_one(document = User(username, password_record))
+
+        # drop memoized "missing user" entry
+        self._invalidate_user(username)
 
     def user_exists(self, username : str) -> bool:
 
         # check if username exists in database
-        return (self.collection.find_one(filter = { "username" : username }) is not None)
+        return (self._fetch_user(username) is not None)
 
-    def fetch_bookmarks(self, username : str) -> List[ ObjectId ]:
+    def fetch_bookmarks(self, username  : str, 
+                              page_size : Optional[ int ] = 20, 
+                              cursor    : Optional[ str ] = None) -> Tuple[ List[ ObjectId ], Optional[ str ] ]:
 
-        # fetch review IDs bookmarked by user
-        return self.collection.find_one(filter = { "username" : username })["bookmarks"]
+        bookmark_filter = { "username" : username }
+
+        # continue after the last bookmark of the previous page (newest first)
+        if (cursor is not None):
+
+            if not (ObjectId.is_valid(cursor)):
+                raise ValueError(f"Invalid page cursor: {repr(cursor)}")
+
+            bookmark_filter["_id"] = { "$lt" : ObjectId(cursor) }
+
+        # fetch one extra bookmark to know whether another page exists
+        bookmark_documents = list(self.bookmarks.find(
+            bookmark_filter, { "review-id" : 1 }).sort("_id", DESCENDING).limit(page_size + 1)
+        )
+
+        # next page starts after the last bookmark of this page
+        next_cursor = (str(bookmark_documents[page_size - 1]["_id"]) if (len(bookmark_documents) > page_size) else None)
+
+        # return review IDs bookmarked by user and the cursor of the next page
+        return ([ document["review-id"] for document in bookmark_documents[:page_size] ], next_cursor)
+
+    def count_bookmarks(self, username : str) -> int:
+
+        # count bookmarks on the server without fetching them
+        return self.bookmarks.count_documents({ "username" : username })
 
     def bookmark_to_user(self, username : str, review_id : ObjectId) -> bool:
 
-        # condition to find specific user
-        username_filter = { "username" : username }
+        # condition to find specific bookmark
+        bookmark_filter = { "username" : username, "review-id" : review_id }
 
-        # check if review already bookmarked
-        bookmarked = self.bookmarked_to_user(username, review_id)
+        # remove bookmark if bookmarked
+        if (self.bookmarks.find_one_and_delete(bookmark_filter, projection = { "_id" : 1 }) is not None):
 
-        # remove bookmark if bookmarked, add it otherwise
-        bookmark_update = { (("$pull") if (bookmarked) else ("$push")) : { "bookmarks" : review_id } } 
+            # bookmarked state is shown on every list of the user (bumped after the change, so no stale page gets the new version)
+            self.list_versions.bump([ username ])
 
-        # commit change to database
-        self.collection.update_one(filter = username_filter, update = bookmark_update)
+            return False
+
+        # add bookmark otherwise
+        try:
+            self.bookmarks.insert_one(document = bookmark_filter)
+
+        # concurrent click already added it
+        except (DuplicateKeyError):
+            pass
+
+        self.list_versions.bump([ username ])
 
         # return bookmark newest state
         #   1. bookmarked     => True
         #   2. not bookmarked => False
-        return not bookmarked
+        return True
 
     def recommend_to_user(self, username : str, review_id : ObjectId, recommender : str) -> bool:
 
-        # check if review already recommended
-        if (self._recommended_to_user(username, review_id)):
-
-            # return False to indicate no changes are made
-            return False 
-
-        # commit recommendation update to database
-        self.collection.update_one(
-            filter = { "username" : username                             },
-            update = { "$push"    : { "unread_recommended" : review_id } }
+        # commit recommendation update to database unless already recommended (checked by the write itself, so concurrent
+        # recommendations and stale cached documents cannot add it twice)
+        update_result = self.collection.update_one(
+            filter = { "username" : username, "recommended" : { "$ne" : review_id }, "unread_recommended" : { "$ne" : review_id } },
+            update = { "$addToSet" : { "unread_recommended" : review_id } }
         )
 
-        subject = "Food-Fellow: A New Recommendation"
+        # return False to indicate no changes are made
+        if (update_result.modified_count == 0):
+            return False
 
-        body = f"{recommender} has recommended a review to you!"
+        self._invalidate_user(username)
 
-        self.gmail_manager.send(username, subject, body)
+        # recipient's recommended list changed
+        self.list_versions.bump([ username ], [ "recommended" ])
+
+        # buffer notification, sent later as part of a digest
+        self.digest_manager.add_recommendation(username, review_id, recommender)
 
         # return True to indicate changes are made
         return True 
 
+    def review_removed(self, review_id : ObjectId) -> None:
+
+        # users holding removed review in their bookmarked list
+        self.list_versions.bump((
+            bookmark_document["username"] for bookmark_document in self.bookmarks.find({ "review-id" : review_id }, { "_id" : 0, "username" : 1 })
+        ), [ "bookmarked" ])
+
+        # users holding removed review in their recommended list (removal is rare, so this is not indexed)
+        self.list_versions.bump((
+            user_document["username"] for user_document in self.collection.find(
+                { "$or" : [ { "recommended" : review_id }, { "unread_recommended" : review_id } ] }, { "_id" : 0, "username" : 1 }
+            )
+        ), [ "recommended" ])
+
     def bookmarked_to_user(self, username : str, review_id : ObjectId) -> bool:
 
         # check if user bookmarked target review
-        return (review_id in self.collection.find_one({ "username" : username })["bookmarks"])
+        return (self.bookmarks.find_one({ "username" : username, "review-id" : review_id }, { "_id" : 1 }) is not None)
 
-    def _recommended_to_user(self, username : str, review_id : ObjectId) -> bool:
+    def bookmarked_reviews(self, username : str, review_ids : List[ ObjectId ]) -> Set[ ObjectId ]:
 
-        # fetch user information
-        user_document = self.collection.find_one({ "username" : username })
-
-        # check if review has been previously recommended
-        #   1. True  => recommended
-        #   2. False => not recommended
-        return (
-            (review_id in user_document["recommended"       ]) or 
-            (review_id in user_document["unread_recommended"])
-        )
+        # find which of the given reviews user has bookmarked (in a single query)
+        return {
+            bookmark_document["review-id"] for bookmark_document in self.bookmarks.find(
+                { "username" : username, "review-id" : { "$in" : list(review_ids) } }, { "_id" : 0, "review-id" : 1 }
+            )
+        }
 
     def _mark_recommendations(self, username : str) -> None:
 
-        # fetch user information
-        user_document = self.collection.find_one({ "username" : username })
-
-        # obtain unread recommendations
-        unread_recommendations = user_document["unread_recommended"]
-
-        # move recommendations from unread to read
-        self.collection.update_one(
-            filter = { "username" : username },
-            update = { 
-                "$push" : { "recommended"        : { "$each" : unread_recommendations } } ,
-                "$set"  : { "unread_recommended" : []                                   }
-            }
+        # move unread recommendations in front of read ones on the server, in one update
+        #   Note: Built from the stored document (never from the cache), so recommendations pushed meanwhile are kept.
+        update_result = self.collection.update_one(
+            filter = { "username" : username, "unread_recommended.0" : { "$exists" : True } },
+            update = [ { "$set" : {
+                "recommended"        : { "$concatArrays" : [ "$unread_recommended", "$recommended" ] },
+                "unread_recommended" : []
+            } } ]
         )
 
+        # nothing to mark
+        if (update_result.modified_count == 0):
+            return
+
+        # listed order (unread, then read) is unchanged, so the list version is not bumped
+        self._invalidate_user(username)
+
     def fetch_recommendations(self, username : str, mark_read : Optional[ bool ] = True) -> List[ ObjectId ]:
 
-        # fetch user information
-        user_document = self.collection.find_one({ "username" : username })
+        # fetch stored user information
+        #   Note: The page is tagged with the stored list version, so it must not be built from an older cached copy.
+        user_document = self._fetch_user(username, fresh = True)
 
         # join recommended reviews whether read or unread
         recommendations = (
@@ -183,12 +303,36 @@ class UserManager:
     def recommendations_unread(self, username : str) -> bool:
 
         # check whether user has unread recommendations
-        return (len(self.collection.find_one({ "username" : username })["unread_recommended"]) > 0)
+        return (len(self._fetch_user(username)["unread_recommended"]) > 0)
+
+    def verify_password(self, username : str, password : str) -> bool:
+
+        # fetch user information
+        user_document = self._fetch_user(username)
+
+        # user does not exist
+        if (user_document is None):
+            return False
+
+        # verify with the algorithm and parameters the hash was created with (in the password pool)
+        if not (self.password_pool.run(hasher_for(user_document).verify, password, user_document)):
+            return False
+
+        # upgrade outdated hashes while the plain password is known
+        if (self.password_hasher.needs_rehash(user_document)):
+
+            password_record = self.password_pool.run(self.password_hasher.hash, password)
+
+            self.collection.update_one(filter = { "username" : username }, update = { "$set" : password_record })
+
+            self._invalidate_user(username)
+
+        return True
 
     def fetch_password_and_salt(self, username : str) -> Tuple[ str, str ]:
 
         # fetch user information
-        user_document = self.collection.find_one({ "username" : username })
+        user_document = self._fetch_user(username)
 
         # return password hash and salt
         return (